@@ -0,0 +1,63 @@
+"""
+Throughput of the birthday digest job with a simulated SMTP server.
+
+Streams ``--users`` synthetic users with three upcoming birthdays each through BirthdayDigest, sending every
+digest to a fake mailer that takes ``--latency`` seconds per message, for an increasing concurrency. The
+last column projects how long a million users would take at that rate.
+
+    python benchmarks/birthday_digest.py --users 20000 --latency 0.02
+"""
+import argparse
+import asyncio
+import time
+from collections import namedtuple
+from datetime import datetime
+from unittest.mock import patch
+
+from src.services.birthday_digest import BirthdayDigest
+
+UserRow = namedtuple("UserRow", "id username email")
+ContactRow = namedtuple("ContactRow", "name surname birthday")
+CONTACTS = [ContactRow("John", "Doe", datetime(1990, 1, 2)), ContactRow("Jane", "Roe", datetime(1985, 1, 3)),
+            ContactRow("Bob", "Smith", datetime(2000, 1, 4))]
+
+
+class FakeMailer:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def send(self, message) -> None:
+        message.as_bytes()
+        await asyncio.sleep(self.latency)
+
+
+def stream(users: int):
+    async def rows(*args, **kwargs):
+        for user_id in range(1, users + 1):
+            yield UserRow(user_id, f"user{user_id}", f"user{user_id}@example.com"), CONTACTS
+    return rows
+
+
+async def run(users: int, latency: float, concurrency: int) -> float:
+    digest = BirthdayDigest(FakeMailer(latency), concurrency=concurrency)
+    with patch("src.services.birthday_digest.stream_birthdays_by_user", stream(users)):
+        start = time.perf_counter()
+        await digest.run(None)
+    return users / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    print(f"{args.users} users, {args.latency * 1000:.0f} ms per message")
+    print(f"{'concurrency':>11} {'users/s':>10} {'1M users, min':>14}")
+    for concurrency in (1, 10, 50, 100, 200):
+        throughput = await run(args.users if concurrency > 1 else args.users // 100, args.latency, concurrency)
+        print(f"{concurrency:>11} {throughput:>10.1f} {1_000_000 / throughput / 60:>14.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Load test of password verification, the CPU-bound part of POST /api/auth/login.
+
+Runs ``--logins`` concurrent bcrypt verifications through BoundedExecutor with an increasing number of
+workers and reports throughput and the worst event-loop stall observed by a 10 ms heartbeat task. The
+``inline`` row is the previous behaviour: verifying directly inside the coroutine.
+
+    python benchmarks/login_throughput.py --logins 64
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from passlib.context import CryptContext
+
+from src.services.workers import BoundedExecutor
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+PASSWORD = "123456789"
+HASHED = pwd_context.hash(PASSWORD)
+
+
+def verify() -> bool:
+    return pwd_context.verify(PASSWORD, HASHED)
+
+
+async def heartbeat(stalls: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        stalls.append(time.perf_counter() - start - 0.01)
+
+
+async def run(logins: int, executor: BoundedExecutor | None) -> tuple[float, float]:
+    async def login():
+        if executor is None:
+            return verify()
+        return await executor.run(verify)
+
+    stalls, stop = [], asyncio.Event()
+    beat = asyncio.create_task(heartbeat(stalls, stop))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await asyncio.gather(*[login() for _ in range(logins)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+    return logins / elapsed, max(stalls, default=0.0)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--kind", choices=("thread", "process"), default="thread")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    print(f"{cores} cores, {args.logins} concurrent logins, {args.kind} pool")
+    print(f"{'workers':>8} {'logins/s':>10} {'max loop stall ms':>18}")
+    throughput, stall = await run(args.logins, None)
+    print(f"{'inline':>8} {throughput:>10.1f} {stall * 1000:>18.1f}")
+    workers = 1
+    while True:
+        executor = BoundedExecutor("bench", max_workers=workers, max_pending=args.logins, kind=args.kind)
+        throughput, stall = await run(args.logins, executor)
+        executor.shutdown()
+        print(f"{workers:>8} {throughput:>10.1f} {stall * 1000:>18.1f}")
+        if workers >= cores:
+            break
+        workers = min(workers * 2, cores)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""
+Latency of creating a user, the database part of POST /api/auth/signup, with and without a Gravatar lookup.
+
+The ``inline`` row is hypothetical, not the previous behaviour: signup used to store a Gravatar URL built
+locally, without any request, and so never waited for Gravatar but often stored a URL with no image behind
+it. The row measures what storing a real avatar during the request would cost, a GET to Gravatar before
+inserting the user. The ``deferred`` row is the current behaviour: the user is inserted with the placeholder
+avatar and queued for the background resolver, which downloads and stores the image later. Gravatar is
+simulated with a mock transport whose latency is log-normal around ``--latency-ms`` with a slow tail of
+``--tail-ms`` for 2% of the calls, so no request leaves the machine. Users are written to a temporary
+SQLite file; SQLite serialises writers with a sleeping busy handler, so at high ``--concurrency`` the
+deferred row mostly measures that lock rather than the request.
+
+    python benchmarks/signup_latency.py --signups 500 --concurrency 4
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.database.models import Base
+from src.repository.users import create_user
+from src.schemas import UserModel
+from src.services.avatars import avatar_service
+from src.services.gravatar import GravatarResolver, gravatar_hash
+
+
+def gravatar_transport(latency_ms: float, tail_ms: float) -> httpx.AsyncBaseTransport:
+    class SlowGravatar(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+            delay = tail_ms if random.random() < 0.02 else random.lognormvariate(0, 0.5) * latency_ms
+            await asyncio.sleep(delay / 1000)
+            return httpx.Response(404)
+    return SlowGravatar()
+
+
+async def run(signups: int, concurrency: int, inline: bool, client: httpx.AsyncClient) -> list[float]:
+    tmp = tempfile.NamedTemporaryFile(suffix=".db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp.name}", poolclass=NullPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+    # never started, so the storage is not used
+    resolver = GravatarResolver("/placeholder.svg", avatar_service.storage, session_factory=sessions)
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def signup(n: int) -> None:
+        body = UserModel(username=f"user{n}", email=f"user{n}@example.com", password="hashed")
+        async with slots:
+            start = time.perf_counter()
+            if inline:
+                await client.get(f"{GravatarResolver.base_url}{gravatar_hash(body.email)}",
+                                 params={"d": "404", "s": "256"})
+            async with sessions() as db:
+                user = await create_user(body, db)
+            if not inline:
+                resolver.submit(user.id, user.email)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*[signup(n) for n in range(signups)])
+    await engine.dispose()
+    tmp.close()
+    return latencies
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--signups", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--tail-ms", type=float, default=1500)
+    args = parser.parse_args()
+
+    client = httpx.AsyncClient(transport=gravatar_transport(args.latency_ms, args.tail_ms))
+    print(f"{args.signups} signups, {args.concurrency} concurrent, Gravatar ~{args.latency_ms:.0f} ms "
+          f"with a {args.tail_ms:.0f} ms tail")
+    print(f"{'mode':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for mode in ("inline", "deferred"):
+        latencies = await run(args.signups, args.concurrency, mode == "inline", client)
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        print(f"{mode:>8} {cuts[49] * 1000:>8.1f} {cuts[98] * 1000:>8.1f} {max(latencies) * 1000:>8.1f}")
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
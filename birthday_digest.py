@@ -0,0 +1,56 @@
+"""
+Sends the daily birthday reminder digests; schedule it once a day, e.g. with cron:
+
+    0 7 * * * cd /app && python birthday_digest.py
+
+A run that stops at the time budget prints ``last_user_id``; pass it as ``--after-user-id`` to resume.
+"""
+import argparse
+import asyncio
+import json
+
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.db import AsyncSessionLocal, async_engine
+from src.services.birthday_digest import BirthdayDigest
+from src.services.email import Mailer, email_queue
+from src.services.redis_pool import redis_manager
+
+
+def report(snapshot: dict) -> None:
+    print(f"Birthday digest: {snapshot['users']} users, {snapshot['sent']} sent, {snapshot['queued']} queued, "
+          f"{snapshot['failed']} failed, {snapshot['users_per_second']} users/s")
+
+
+async def main(args: argparse.Namespace):
+    """
+    Runs the birthday digest job once with the command line options.
+    """
+    redis = redis_manager.connect()
+    try:
+        await redis.ping()
+        email_queue.redis = redis
+    except RedisError as e:
+        print(f"Redis is unavailable, failed digests will not be retried: {e!r}")
+    mailer = Mailer.from_settings(size=args.concurrency)
+    digest = BirthdayDigest(mailer, days=args.days, concurrency=args.concurrency, budget=args.budget,
+                            batch_size=settings.birthday_digest_batch_size, queue=email_queue,
+                            progress_interval=settings.birthday_digest_progress_interval, report=report)
+    try:
+        async with AsyncSessionLocal() as db:
+            snapshot = await digest.run(db, after_user_id=args.after_user_id)
+        print(json.dumps(snapshot, indent=2))
+    finally:
+        await mailer.close()
+        await redis_manager.close()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send birthday reminder digests.")
+    parser.add_argument("--days", type=int, default=settings.birthday_digest_days)
+    parser.add_argument("--budget", type=float, default=settings.birthday_digest_budget)
+    parser.add_argument("--concurrency", type=int, default=settings.birthday_digest_concurrency)
+    parser.add_argument("--after-user-id", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,31 @@
+import asyncio
+import os
+import signal
+import socket
+
+from src.services.email import EmailWorker, Mailer, email_queue
+from src.services.redis_pool import redis_manager
+
+
+async def main():
+    """
+    Runs an email worker: sends the emails queued by the API until SIGINT or SIGTERM.
+    Start as many worker processes as needed with ``python email_worker.py``.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    email_queue.redis = redis_manager.connect()
+    mailer = Mailer.from_settings()
+    worker = EmailWorker(email_queue, mailer)
+    try:
+        await worker.run(f"{socket.gethostname()}-{os.getpid()}", stop)
+    finally:
+        print(f"Email worker stopped: {worker.sent} sent, {worker.retried} retried, {worker.dead} dead-lettered")
+        await mailer.close()
+        await redis_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,13 +1,66 @@
-import redis.asyncio as redis
+import asyncio
+from contextlib import asynccontextmanager
 
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import FastAPI
-from fastapi_limiter import FastAPILimiter
+from redis.exceptions import RedisError
 
 from src.conf.config import settings
-from src.routes import contacts, auth, users
+from src.database.db import async_engine
+from src.routes import contacts, auth, users, internal, metrics
+from src.services.auth import auth_service
+from src.services.avatars import avatar_executor, avatar_service, image_executor
+from src.services.cache import response_cache, user_cache
+from src.services.contacts_io import import_executor
+from src.services.email import email_queue
+from src.services.gravatar import gravatar_resolver
+from src.services.metrics import MetricsMiddleware, http_metrics
+from src.services.rate_limit import RateLimitHeadersMiddleware, rate_limiter
+from src.services.redis_pool import redis_manager
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Manages the application lifetime.
+    On startup it creates the shared async Redis connection pool and hands the client to the rate limiter,
+    the user and response caches, the email queue, the avatar job store and the Gravatar resolver, which it
+    starts; an unreachable Redis is reported but does not stop the application, which then rate limits with
+    per-worker buckets until Redis answers again. On shutdown it stops the background tasks, closes the pool,
+    stops the worker pools and disposes of the database engine.
+    """
+    r = redis_manager.connect()
+    try:
+        await asyncio.wait_for(r.ping(), settings.redis_socket_timeout)
+    except (RedisError, OSError, asyncio.TimeoutError) as e:
+        print(f"Redis is unavailable, rate limiting locally: {e!r}")
+        rate_limiter.trip()
+    rate_limiter.redis = r
+    user_cache.redis = r
+    response_cache.redis = r
+    email_queue.redis = r
+    avatar_service.jobs.redis = r
+    gravatar_resolver.redis = r
+    rate_limiter.start()
+    gravatar_resolver.start()
+    yield
+    await gravatar_resolver.stop()
+    await rate_limiter.stop()
+    rate_limiter.redis = None
+    user_cache.redis = None
+    response_cache.redis = None
+    email_queue.redis = None
+    avatar_service.jobs.redis = None
+    gravatar_resolver.redis = None
+    await redis_manager.close()
+    auth_service.hash_executor.shutdown()
+    import_executor.shutdown()
+    avatar_executor.shutdown()
+    image_executor.shutdown()
+    await async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ["*"]
 
@@ -17,27 +70,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "RateLimit-Policy", "Retry-After"],
 )
+app.add_middleware(RateLimitHeadersMiddleware)
+app.add_middleware(MetricsMiddleware, metrics=http_metrics)
 
 app.include_router(contacts.router, prefix='/api')
 app.include_router(auth.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
+app.include_router(internal.router, prefix='/api')
+app.include_router(metrics.router)
 
 
-@app.on_event("startup")
-async def startup():
-    """
-    This function is executed when the application starts.
-    It connects to Redis and initializes the FastAPI Limiter for rate-limiting.
-    """
-    try:
-        r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
-                              decode_responses=True)
-        await FastAPILimiter.init(r)
-    except Exception as e:
-        print(f"Error connecting to Redis: {e}")
-        raise e
-
 @app.get("/")
 def read_root():
     """
@@ -45,3 +89,7 @@ def read_root():
     Returns a simple message.
     """
     return {"message": "Hello World"}
+
+
+# after every route is declared, so each one gets its metrics series
+http_metrics.register(app.routes)
@@ -0,0 +1,40 @@
+"""add per-user contact change sequence
+
+Revision ID: 365f4412f8b4
+Revises: 7a2e5c9d13f4
+Create Date: 2026-10-17 19:41:27.530119
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '365f4412f8b4'
+down_revision: Union[str, None] = '7a2e5c9d13f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('contacts', sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('contact_tombstones', sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+    op.drop_index('ix_contacts_user_id_updated_at', table_name='contacts')
+    op.create_index('ix_contacts_user_id_change_seq', 'contacts', ['user_id', 'change_seq'], unique=False)
+    op.drop_index('ix_contact_tombstones_user_id_deleted_at', table_name='contact_tombstones')
+    op.create_index('ix_contact_tombstones_user_id_change_seq', 'contact_tombstones', ['user_id', 'change_seq'],
+                    unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contact_tombstones_user_id_change_seq', table_name='contact_tombstones')
+    op.create_index('ix_contact_tombstones_user_id_deleted_at', 'contact_tombstones', ['user_id', 'deleted_at'],
+                    unique=False)
+    op.drop_index('ix_contacts_user_id_change_seq', table_name='contacts')
+    op.create_index('ix_contacts_user_id_updated_at', 'contacts', ['user_id', 'updated_at'], unique=False)
+    op.drop_column('contact_tombstones', 'change_seq')
+    op.drop_column('contacts', 'change_seq')
+    op.drop_column('users', 'change_seq')
@@ -0,0 +1,26 @@
+"""add user plan
+
+Revision ID: 7a2e5c9d13f4
+Revises: 3f6c1d8a9b20
+Create Date: 2026-10-17 17:02:41.905113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a2e5c9d13f4'
+down_revision: Union[str, None] = '3f6c1d8a9b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('plan', sa.String(length=20), server_default='free', nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'plan')
@@ -0,0 +1,35 @@
+"""add contacts search trgm index
+
+Revision ID: 9d0f3b6a2e58
+Revises: c4a81f0e6d27
+Create Date: 2026-10-17 13:20:07.118364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d0f3b6a2e58'
+down_revision: Union[str, None] = 'c4a81f0e6d27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must match src.repository.contacts.SEARCH_DOCUMENT
+SEARCH_DOCUMENT = ("lower(name || ' ' || surname || ' ' || email || ' ' || phone || ' ' "
+                   "|| coalesce(description, ''))")
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(f"CREATE INDEX ix_contacts_search_trgm ON contacts USING gin (({SEARCH_DOCUMENT}) gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_contacts_search_trgm', table_name='contacts')
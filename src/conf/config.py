@@ -1,3 +1,6 @@
+import os
+from typing import Dict, List
+
 from pydantic_settings import BaseSettings
 
 
@@ -7,15 +10,85 @@ class Settings(BaseSettings):
     postgres_password: str
     postgres_port: int
     sqlalchemy_database_url: str
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = -1
+    db_pool_pre_ping: bool = False
     secret_key: str
     algorithm: str
+    # shared secret for /metrics and the /api/_internal endpoints (X-Internal-Token header);
+    # they are disabled when unset
+    internal_token: str | None = None
+    password_hash_workers: int = os.cpu_count() or 1
+    password_hash_max_pending: int = 256
+    password_hash_executor: str = "thread"
     mail_username: str
     mail_password: str
     mail_from: str
     mail_port: int
     mail_server: str
+    mail_from_name: str = "Desired Name"
+    mail_ssl_tls: bool = True
+    mail_starttls: bool = False
+    mail_timeout: float = 30
+    email_queue_max_attempts: int = 5
+    email_queue_backoff: float = 30
+    email_queue_max_backoff: float = 3600
+    email_queue_batch_size: int = 50
+    email_queue_concurrency: int = 5
+    email_queue_claim_idle: float = 300
+    birthday_digest_days: int = 7
+    birthday_digest_budget: float = 3600
+    birthday_digest_concurrency: int = 50
+    birthday_digest_batch_size: int = 1000
+    birthday_digest_progress_interval: float = 10
+    contacts_import_batch_size: int = 1000
+    contacts_import_max_rows: int = 100_000
+    contacts_import_max_errors: int = 1000
+    contacts_import_workers: int = os.cpu_count() or 1
+    contacts_import_executor: str = "thread"
     redis_host: str
     redis_port: int
+    redis_max_connections: int = 50
+    redis_pool_timeout: float = 5
+    redis_socket_timeout: float = 5
+    user_cache_ttl: int = 300
+    user_cache_local_ttl: float = 10
+    user_cache_local_size: int = 1024
+    rate_limit_default_plan: str = "free"
+    rate_limit_plans: Dict[str, Dict[str, str]] = {
+        # "sync" covers /contacts/changes, paged back to back: 120 pages of 1000 changes per minute
+        "free": {"read": "10/minute", "search": "5/minute", "write": "5/minute", "bulk": "2/minute",
+                 "sync": "120/minute"},
+        "pro": {"read": "100/minute", "search": "50/minute", "write": "50/minute", "bulk": "10/minute",
+                "sync": "600/minute"},
+    }
+    rate_limit_workers: int = 1
+    rate_limit_redis_timeout: float = 0.05
+    rate_limit_breaker_cooldown: float = 5
+    rate_limit_reconcile_interval: float = 5
+    response_cache_ttl: int = 300
+    response_cache_disabled_routes: List[str] = []
+    autocomplete_max_bytes: int = 64 * 1024 * 1024
+    autocomplete_ttl: float = 300
+    avatar_storage: str = "local"
+    avatar_local_dir: str = "media/avatars"
+    avatar_local_url: str = "/api/users/avatars"
+    avatar_max_bytes: int = 5 * 1024 * 1024
+    avatar_upload_workers: int = 4
+    avatar_upload_max_pending: int = 32
+    avatar_sizes: List[int] = [64, 128, 256]
+    avatar_default_size: int = 256
+    avatar_max_pixels: int = 40_000_000
+    avatar_image_workers: int = os.cpu_count() or 1
+    avatar_image_max_pending: int = 32
+    avatar_cache_bytes: int = 32 * 1024 * 1024
+    avatar_placeholder_url: str = "/api/users/avatars/placeholder.svg"
+    gravatar_batch_size: int = 50
+    gravatar_concurrency: int = 10
+    gravatar_cache_ttl: int = 7 * 86400
+    gravatar_timeout: float = 5
     cloudinary_name: str
     cloudinary_api_key: str
     cloudinary_api_secret: str
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, func, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, func, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.sqltypes import DateTime
 from sqlalchemy.ext.declarative import declarative_base
@@ -14,10 +14,41 @@ class Contact(Base):
     email = Column(String(255), nullable=False, unique=True)
     phone = Column(String(20), nullable=False)
     birthday = Column(DateTime, default=None)
+    # month * 100 + day of the birthday, so recurring birthdays can be looked up through an index
+    birthday_key = Column(Integer, default=None)
     description = Column(String(255), default="")
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), server_default=func.now())
+    # the owner's change sequence number of the last write to the contact, see User.change_seq
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
     user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None)
     user = relationship('User', backref="contacts")
 
+    # Every repository query is scoped by user_id, so each filter pattern gets a composite index led by it.
+    __table_args__ = (
+        Index('ix_contacts_user_id_id', 'user_id', 'id'),
+        Index('ix_contacts_user_id_name', 'user_id', 'name'),
+        Index('ix_contacts_user_id_surname', 'user_id', 'surname'),
+        Index('ix_contacts_user_id_email', 'user_id', 'email'),
+        Index('ix_contacts_user_id_birthday_key', 'user_id', 'birthday_key'),
+        Index('ix_contacts_user_id_change_seq', 'user_id', 'change_seq'),
+    )
+
+
+class ContactTombstone(Base):
+    """
+    Records a deleted contact so that delta sync can report the deletion.
+    """
+    __tablename__ = "contact_tombstones"
+    id = Column(Integer, primary_key=True)
+    contact_id = Column(Integer, nullable=False)
+    user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    deleted_at = Column(DateTime, default=func.now(), server_default=func.now())
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        Index('ix_contact_tombstones_user_id_change_seq', 'user_id', 'change_seq'),
+    )
+
 
 class User(Base):
     __tablename__ = "users"
@@ -29,3 +60,8 @@ class User(Base):
     avatar = Column(String(255), nullable=True)
     refresh_token = Column(String(255), nullable=True)
     confirmed = Column(Boolean, default=False)
+    # selects the rate limits of the user, see Settings.rate_limit_plans
+    plan = Column(String(20), default="free", server_default="free")
+    # sequence number of the last write to the user's contacts; taken with a row lock held until commit, so
+    # numbers become visible in order
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
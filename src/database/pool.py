@@ -0,0 +1,142 @@
+import time
+
+from sqlalchemy import Engine, event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.util.queue import AsyncAdaptedQueue, Empty
+
+from src.services.metrics import Histogram
+
+
+class PoolMonitor:
+    """
+    Collects connection pool statistics from SQLAlchemy pool events.
+
+    Checkout wait time (time spent waiting for a pooled connection to be returned) and connect time (opening
+    a new connection) are recorded separately by :class:`InstrumentedAsyncPool`, because SQLAlchemy fires no
+    event before a connection is requested.
+    """
+
+    def __init__(self):
+        self.engine: Engine | None = None
+        self.checkout_latency = Histogram()
+        self.connect_latency = Histogram()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.max_checked_out = 0
+
+    def attach(self, engine: Engine) -> None:
+        """
+        Subscribes to the pool events of the given engine.
+
+        :param engine: The (sync) engine whose pool is monitored; pass ``async_engine.sync_engine`` for async engines.
+        :type engine: Engine
+        """
+        self.engine = engine
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+        if self.engine is not None:
+            self.max_checked_out = max(self.max_checked_out, self.engine.pool.checkedout())
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        self.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self.invalidations += 1
+
+    def observe_wait(self, seconds: float, timed_out: bool = False) -> None:
+        """
+        Records the time a caller waited for a connection.
+
+        :param seconds: Time spent waiting for the pool, in seconds.
+        :type seconds: float
+        :param timed_out: Whether the wait ended with a pool timeout.
+        :type timed_out: bool
+        """
+        self.checkout_latency.observe(seconds)
+        if timed_out:
+            self.timeouts += 1
+
+    def observe_connect(self, seconds: float) -> None:
+        """
+        Records the time taken to open a new connection for the pool.
+
+        :param seconds: Time spent connecting, in seconds.
+        :type seconds: float
+        """
+        self.connect_latency.observe(seconds)
+
+    def snapshot(self) -> dict:
+        """
+        Returns the current pool state and the counters collected so far.
+
+        :return: Pool occupancy, event counters and the checkout latency histogram.
+        :rtype: dict
+        """
+        state = {}
+        pool = self.engine.pool if self.engine is not None else None
+        if isinstance(pool, QueuePool):
+            state = {
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+                "timeout": pool.timeout(),
+            }
+        return {
+            **state,
+            "max_checked_out": self.max_checked_out,
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "invalidations": self.invalidations,
+            "timeouts": self.timeouts,
+            "checkout_latency_seconds": self.checkout_latency.snapshot(),
+            "connect_latency_seconds": self.connect_latency.snapshot(),
+        }
+
+
+pool_monitor = PoolMonitor()
+
+
+class TimedAsyncAdaptedQueue(AsyncAdaptedQueue):
+    """
+    The queue of idle connections of the asyncio pool, timing how long each checkout waits for a connection
+    to be returned. A non-blocking get that finds the queue empty (the pool then opens an overflow connection)
+    records no wait; a blocking get that times out is counted as a pool timeout.
+    """
+
+    def get(self, block: bool = True, timeout: float | None = None):
+        start = time.perf_counter()
+        try:
+            connection = super().get(block, timeout)
+        except Empty:
+            pool_monitor.observe_wait(time.perf_counter() - start if block else 0.0, timed_out=block)
+            raise
+        pool_monitor.observe_wait(time.perf_counter() - start)
+        return connection
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """
+    The default asyncio queue pool, timing checkout waits and new connections separately.
+    """
+
+    _queue_class = TimedAsyncAdaptedQueue
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        try:
+            return super()._create_connection()
+        finally:
+            pool_monitor.observe_connect(time.perf_counter() - start)
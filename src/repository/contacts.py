@@ -1,13 +1,23 @@
-from datetime import datetime, timedelta
-from typing import List, Optional
+import base64
+import json
+import calendar
+import difflib
+import re
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
 
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import Row, and_, or_, bindparam, case, delete, func, insert, literal_column, select, false, \
+    true, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
 
-from src.database.models import Contact, User
-from src.schemas import ContactResponse, ContactUpdate, ContactModel, ContactBase
+from src.database.models import Contact, ContactTombstone, User
+from src.schemas import ContactResponse, ContactUpdate, ContactModel, ContactBase, ContactOperation
+from src.services.autocomplete import autocomplete_index
 
-async def read_contacts(skip: int, limit: int, user: User, db: Session) -> List[Contact]:
+async def read_contacts(skip: int, limit: int, user: User, db: AsyncSession) -> List[Contact]:
     """
     Retrieves a list of contacts for a specific user with specified pagination parameters.
 
@@ -18,13 +28,172 @@ async def read_contacts(skip: int, limit: int, user: User, db: Session) -> List[
     :param user: The user to retrieve contacts for.
     :type user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A list of contacts.
     :rtype: List[Contact]
     """
-    return db.query(Contact).filter(Contact.user_id == user.id).offset(skip).limit(limit).all()
+    stmt = select(Contact).filter(Contact.user_id == user.id).offset(skip).limit(limit)
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
 
-async def create_contact(body: ContactModel, user: User, db: Session) -> Contact:
+def encode_cursor(last_id: int) -> str:
+    """
+    Encodes the keyset position of the last returned contact into an opaque cursor.
+
+    :param last_id: The ID of the last contact on the page.
+    :type last_id: int
+    :return: An URL-safe cursor string.
+    :rtype: str
+    """
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Decodes a cursor produced by :func:`encode_cursor`.
+
+    :param cursor: The opaque cursor string.
+    :type cursor: str
+    :return: The ID of the last contact of the previous page.
+    :rtype: int
+    :raises ValueError: If the cursor is malformed.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return int(payload["id"])
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid cursor") from e
+
+async def read_contacts_page(cursor: Optional[str], limit: int, user: User, db: AsyncSession) -> Tuple[List[Contact], Optional[str]]:
+    """
+    Retrieves a page of contacts for a specific user using keyset pagination on ``(user_id, id)``.
+    Unlike offset pagination, every page costs the same regardless of how deep it is.
+
+    :param cursor: The cursor returned with the previous page, or None for the first page.
+    :type cursor: Optional[str]
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
+    :param user: The user to retrieve contacts for.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: A list of contacts and the cursor of the next page (None on the last page).
+    :rtype: Tuple[List[Contact], Optional[str]]
+    :raises ValueError: If the cursor is malformed.
+    """
+    stmt = select(Contact).filter(Contact.user_id == user.id)
+    if cursor:
+        stmt = stmt.filter(Contact.id > decode_cursor(cursor))
+    stmt = stmt.order_by(Contact.id).limit(limit + 1)
+    result = await db.execute(stmt)
+    contacts = result.scalars().all()
+    if len(contacts) > limit:
+        contacts = contacts[:limit]
+        return contacts, encode_cursor(contacts[-1].id)
+    return contacts, None
+
+async def next_change_seq(user_id: int, db: AsyncSession) -> int:
+    """
+    Takes the next change sequence number of a user's contacts; call it first in every transaction that writes
+    the user's contacts and stamp the written rows and tombstones with it.
+
+    The increment locks the user's row until the transaction ends, so writers of the same user are serialized
+    and a sequence number is only visible once all lower ones are committed or rolled back. Delta sync can
+    therefore resume after the last number it delivered without missing slow transactions.
+
+    :param user_id: The owner of the contacts being written.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The new sequence number.
+    :rtype: int
+    """
+    users = User.__table__
+    stmt = update(users).where(users.c.id == user_id).values(change_seq=users.c.change_seq + 1) \
+        .returning(users.c.change_seq)
+    return await db.scalar(stmt)
+
+def encode_sync_token(change_seq: int, last_id: int) -> str:
+    """
+    Encodes a delta sync position into an opaque token.
+
+    :param change_seq: The change sequence number of the last change delivered.
+    :type change_seq: int
+    :param last_id: The contact ID of the last change delivered, ordering changes of the same write.
+    :type last_id: int
+    :return: An URL-safe token string.
+    :rtype: str
+    """
+    payload = {"seq": change_seq, "id": last_id}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def decode_sync_token(token: str) -> Tuple[int, int]:
+    """
+    Decodes a token produced by :func:`encode_sync_token`.
+
+    :param token: The opaque token string.
+    :type token: str
+    :return: The change sequence number and contact ID of the last change delivered.
+    :rtype: Tuple[int, int]
+    :raises ValueError: If the token is malformed.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return int(payload["seq"]), int(payload["id"])
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid sync token") from e
+
+async def read_changes(since: Optional[str], limit: int, user: User,
+                       db: AsyncSession) -> Tuple[List[Contact], List[int], str, bool]:
+    """
+    Retrieves the contacts of a user created, updated or deleted after a sync token, in commit order.
+    Live contacts are found through ``(user_id, change_seq)`` and deletions through the
+    ``contact_tombstones`` index, merged in one keyset-paginated query (see :func:`next_change_seq`).
+
+    :param since: The token returned by the previous sync, or None for a full sync (deletions are then omitted).
+    :type since: Optional[str]
+    :param limit: The maximum number of changes to return.
+    :type limit: int
+    :param user: The user to retrieve changes for.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: Changed contacts, IDs of deleted contacts, the token for the next sync and whether more changes
+        are pending.
+    :rtype: Tuple[List[Contact], List[int], str, bool]
+    :raises ValueError: If the token is malformed.
+    """
+    position = decode_sync_token(since) if since else None
+
+    def after(change_seq, contact_id):
+        if position is None:
+            return true()
+        return or_(change_seq > position[0], and_(change_seq == position[0], contact_id > position[1]))
+
+    changes = [select(Contact.id.label("contact_id"), Contact.change_seq, false().label("deleted"))
+               .filter(Contact.user_id == user.id, after(Contact.change_seq, Contact.id))]
+    if position is not None:
+        changes.append(select(ContactTombstone.contact_id, ContactTombstone.change_seq, true())
+                       .filter(ContactTombstone.user_id == user.id,
+                               after(ContactTombstone.change_seq, ContactTombstone.contact_id)))
+    merged = union_all(*changes).subquery()
+    stmt = select(merged).order_by(merged.c.change_seq, merged.c.contact_id).limit(limit + 1)
+    rows = (await db.execute(stmt)).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    last = (rows[-1].change_seq, rows[-1].contact_id) if rows else position
+    next_token = encode_sync_token(*(last or (0, 0)))
+
+    updated_ids = [row.contact_id for row in rows if not row.deleted]
+    contacts = []
+    if updated_ids:
+        result = await db.execute(select(Contact).filter(Contact.id.in_(updated_ids)))
+        by_id = {contact.id: contact for contact in result.scalars().all()}
+        contacts = [by_id[contact_id] for contact_id in updated_ids if contact_id in by_id]
+    deleted = [row.contact_id for row in rows if row.deleted]
+    return contacts, deleted, next_token, has_more
+
+async def create_contact(body: ContactModel, user: User, db: AsyncSession) -> Contact:
     """
     Creates a new contact for a specific user with data entered by this user.
 
@@ -33,18 +202,84 @@ async def create_contact(body: ContactModel, user: User, db: Session) -> Contact
     :param user: The user to create contact for.
     :type user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: a created contact.
     :rtype: Contact
     """
-    contact = Contact(name=body.name, surname=body.surname, email=body.email, phone=body.phone, birthday=body.birthday,
-                      description=body.description, user_id=user.id)
-    db.add(contact)
-    db.commit()
-    db.refresh(contact)
+    change_seq = await next_change_seq(user.id, db)
+    stmt = insert(Contact).values(**contact_values(body, user.id), change_seq=change_seq).returning(Contact)
+    contact = await db.scalar(stmt)
+    await db.commit()
+    autocomplete_index.add(user.id, contact.id, contact.name, contact.surname)
     return contact
 
-async def get_contact(contact_id: int, user: User, db: Session) -> Contact | None:
+EXPORT_COLUMNS = ("name", "surname", "email", "phone", "birthday", "description")
+
+async def stream_contacts(user: User, db: AsyncSession, batch_size: int = 1000) -> AsyncIterator[Sequence[Row]]:
+    """
+    Streams all contacts of a user as plain rows of :data:`EXPORT_COLUMNS` from a server-side cursor,
+    ``batch_size`` rows at a time, without building ORM objects.
+
+    The rows are read on a dedicated connection of the session's engine, so the stream outlives the
+    request-scoped session and can feed a streaming response.
+
+    :param user: The user to export contacts for.
+    :type user: User
+    :param db: The database session; only its engine is used.
+    :type db: AsyncSession
+    :param batch_size: The number of rows fetched per round-trip.
+    :type batch_size: int
+    :return: Batches of rows ordered by contact ID.
+    :rtype: AsyncIterator[Sequence[Row]]
+    """
+    table = Contact.__table__
+    stmt = select(*[table.c[column] for column in EXPORT_COLUMNS]) \
+        .where(table.c.user_id == user.id).order_by(table.c.id)
+    async with db.bind.connect() as conn:
+        result = await conn.stream(stmt.execution_options(yield_per=batch_size))
+        async for partition in result.partitions(batch_size):
+            yield partition
+
+def contact_values(body: ContactModel, user_id: int) -> dict:
+    """
+    Builds the column values of a new contact, as used by bulk inserts.
+
+    :param body: The validated contact data.
+    :type body: ContactModel
+    :param user_id: The ID of the owner of the contact.
+    :type user_id: int
+    :return: A dictionary of ``contacts`` column values.
+    :rtype: dict
+    """
+    return {"name": body.name, "surname": body.surname, "email": body.email, "phone": body.phone,
+            "birthday": body.birthday, "birthday_key": birthday_key(body.birthday),
+            "description": body.description, "user_id": user_id}
+
+async def import_contacts(rows: List[dict], db: AsyncSession) -> set[str]:
+    """
+    Inserts a chunk of contacts with a single multi-row ``INSERT ... ON CONFLICT DO NOTHING`` and commits it.
+    Rows whose email already exists are skipped.
+
+    :param rows: Column values built by :func:`contact_values`, all for the same user.
+    :type rows: List[dict]
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The emails of the contacts that were inserted.
+    :rtype: set[str]
+    """
+    change_seq = await next_change_seq(rows[0]["user_id"], db)
+    dialect = db.get_bind().dialect.name
+    dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = dialect_insert(Contact.__table__).values([{**row, "change_seq": change_seq} for row in rows]) \
+        .on_conflict_do_nothing(index_elements=["email"])
+    result = await db.execute(stmt.returning(Contact.__table__.c.email))
+    inserted = set(result.scalars().all())
+    await db.commit()
+    if inserted:
+        autocomplete_index.discard(rows[0]["user_id"])
+    return inserted
+
+async def get_contact(contact_id: int, user: User, db: AsyncSession) -> Contact | None:
     """
     Retrieves a single contact with the specified ID for a specific user.
 
@@ -53,16 +288,18 @@ async def get_contact(contact_id: int, user: User, db: Session) -> Contact | Non
     :param user: The user to get contact for.
     :type user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: a requested contact or None if it does not exist.
     :rtype: Contact | None
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
-    return contact
+    stmt = select(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id))
+    contact = await db.execute(stmt)
+    return contact.scalar_one_or_none()
 
-async def update_contact(contact_id: int, body: ContactUpdate, user: User, db: Session) -> Contact | None:
+async def update_contact(contact_id: int, body: ContactUpdate, user: User, db: AsyncSession) -> Contact | None:
     """
-    Updates a single contact with the specified ID for a specific user.
+    Updates a single contact with the specified ID for a specific user with one ``UPDATE ... RETURNING``.
+    Only the fields set in the request are changed (see :func:`contact_update_values`).
 
     :param contact_id: The ID of the contact to update.
     :type contact_id: int
@@ -71,49 +308,188 @@ async def update_contact(contact_id: int, body: ContactUpdate, user: User, db: S
     :param user: The user to update contact for.
     :type user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: an updated contact or None if it does not exist.
     :rtype: Contact | None
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
+    values = contact_update_values(body)
+    if not values:
+        return await get_contact(contact_id, user, db)
+    change_seq = await next_change_seq(user.id, db)
+    stmt = update(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)) \
+        .values(**values, change_seq=change_seq).returning(Contact)
+    contact = await db.scalar(stmt.execution_options(synchronize_session=False, populate_existing=True))
     if contact:
-        contact.name = body.name
-        contact.surname = body.surname
-        contact.email = body.email
-        contact.phone = body.phone
-        contact.birthday = body.birthday
-        contact.description = body.description
-
-        db.commit()
+        await db.commit()
+        autocomplete_index.add(user.id, contact.id, contact.name, contact.surname)
     return contact
 
-async def remove_contact(contact_id: int, user: User, db: Session) -> Contact | None:
+async def remove_contact(contact_id: int, user: User, db: AsyncSession) -> Contact | None:
     """
-    Removes a single contact with the specified ID for a specific user.
+    Removes a single contact with the specified ID for a specific user with one ``DELETE ... RETURNING``,
+    recording its tombstone in the same transaction.
 
     :param contact_id: The ID of the contact to remove.
     :type contact_id: int
     :param user: The user to remove contact for.
     :type user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: Removed contact or None if it does not exist.
     :rtype: Contact | None
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
+    change_seq = await next_change_seq(user.id, db)
+    stmt = delete(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).returning(Contact)
+    contact = await db.scalar(stmt)
     if contact:
-        db.delete(contact)
-        db.commit()
+        db.expunge(contact)
+        db.add(ContactTombstone(contact_id=contact.id, user_id=user.id, change_seq=change_seq))
+        await db.commit()
+        autocomplete_index.remove(user.id, contact.id)
     return contact
 
-async def search_contacts(user: User, db: Session, name: Optional[str], surname: Optional[str], email: Optional[str]) -> List[Contact] | None:
+# Columns that cannot be cleared, so None in an update request means "keep the stored value"
+_REQUIRED_FIELDS = ("name", "surname", "email", "phone")
+
+def contact_update_values(body: ContactUpdate) -> dict:
+    """
+    Builds the column values written by a partial update of a contact: only fields present in the request are
+    written, and None is ignored for required fields, so it never overwrites the stored value.
+    ``birthday_key`` follows ``birthday``.
+
+    :param body: The data for the contact to update.
+    :type body: ContactUpdate
+    :return: A dictionary of ``contacts`` column values, empty if there is nothing to change.
+    :rtype: dict
+    """
+    values = {field: value for field, value in body.model_dump(exclude_unset=True).items()
+              if value is not None or field not in _REQUIRED_FIELDS}
+    if "birthday" in values:
+        values["birthday_key"] = birthday_key(values["birthday"])
+    return values
+
+async def apply_batch(operations: List[ContactOperation], user: User, db: AsyncSession) -> List[dict]:
+    """
+    Applies a list of create, update and delete operations in a single transaction with one statement per
+    kind: a multi-row ``INSERT ... RETURNING``, an executemany ``UPDATE`` by primary key and owner and a
+    ``DELETE ... WHERE id IN (...) RETURNING``, plus the tombstones of the deleted contacts. All written rows
+    share one change sequence number.
+
+    Operations that cannot succeed are rejected up front and the rest are still applied: contacts that do not
+    exist or belong to another user (404), contacts referenced more than once and emails that are taken or
+    repeated in the batch (409).
+
+    :param operations: The operations to apply.
+    :type operations: List[ContactOperation]
+    :param user: The user owning the contacts.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: One result per operation, in input order, with ``index``, ``op``, ``status``, ``id``,
+        ``contact`` and ``error`` keys.
+    :rtype: List[dict]
+    :raises IntegrityError: If a concurrent change violates a constraint; nothing is applied then.
+    :raises StaleDataError: If a contact to update was deleted or changed owner concurrently; nothing is
+        applied then.
+    """
+    results: List[dict | None] = [None] * len(operations)
+
+    def reject(index: int, status: int, error: str):
+        op = operations[index]
+        results[index] = {"index": index, "op": op.op, "status": status, "id": getattr(op, "id", None),
+                          "error": error}
+
+    references = Counter(op.id for op in operations if op.op != "create")
+    for index, op in enumerate(operations):
+        if op.op != "create" and references[op.id] > 1:
+            reject(index, 409, "Contact is referenced more than once in the batch")
+
+    referenced = [op.id for index, op in enumerate(operations) if op.op != "create" and results[index] is None]
+    if referenced:
+        stmt = select(Contact.id).filter(Contact.id.in_(referenced), Contact.user_id == user.id)
+        owned = set((await db.execute(stmt)).scalars().all())
+        for index, op in enumerate(operations):
+            if op.op != "create" and results[index] is None and op.id not in owned:
+                reject(index, 404, "Contact not found")
+
+    emails = {index: op.data.email for index, op in enumerate(operations)
+              if op.op != "delete" and results[index] is None and op.data.email is not None}
+    if emails:
+        repeated = Counter(emails.values())
+        stmt = select(Contact.email, Contact.id).filter(Contact.email.in_(set(emails.values())))
+        taken = dict((await db.execute(stmt)).all())
+        for index, email in emails.items():
+            owner = taken.get(email)
+            if repeated[email] > 1:
+                reject(index, 409, "Email is repeated in the batch")
+            elif owner is not None and owner != getattr(operations[index], "id", None):
+                reject(index, 409, "Contact with this email already exists")
+
+    pending = [(index, op) for index, op in enumerate(operations) if results[index] is None]
+    creates = [(index, op) for index, op in pending if op.op == "create"]
+    updates = [(index, op) for index, op in pending if op.op == "update"]
+    deletes = [(index, op) for index, op in pending if op.op == "delete"]
+
+    if not pending:
+        return results
+    try:
+        change_seq = await next_change_seq(user.id, db)
+        if creates:
+            stmt = insert(Contact).returning(Contact, sort_by_parameter_order=True)
+            created = (await db.scalars(stmt, [{**contact_values(op.data, user.id), "change_seq": change_seq}
+                                               for _, op in creates])).all()
+            for (index, op), contact in zip(creates, created):
+                results[index] = {"index": index, "op": op.op, "status": 201, "id": contact.id, "contact": contact}
+        if updates:
+            # executemany needs the same columns in every row, so partial updates are grouped by their columns
+            groups: dict[tuple, List[dict]] = {}
+            for _, op in updates:
+                if values := contact_update_values(op.data):
+                    groups.setdefault(tuple(sorted(values)), []).append({"b_id": op.id, **values,
+                                                                          "change_seq": change_seq})
+            contacts = Contact.__table__
+            stmt = update(contacts).where(contacts.c.id == bindparam("b_id"), contacts.c.user_id == user.id)
+            for rows in groups.values():
+                result = await db.execute(stmt, rows)
+                if db.get_bind().dialect.supports_sane_multi_rowcount and result.rowcount != len(rows):
+                    raise StaleDataError(f"Batch update matched {result.rowcount} of {len(rows)} contacts")
+            stmt = select(Contact).filter(Contact.id.in_([op.id for _, op in updates]), Contact.user_id == user.id)
+            updated = {contact.id: contact for contact in
+                       (await db.scalars(stmt.execution_options(populate_existing=True))).all()}
+            for index, op in updates:
+                if op.id in updated:
+                    results[index] = {"index": index, "op": op.op, "status": 200, "id": op.id,
+                                      "contact": updated[op.id]}
+                else:
+                    reject(index, 404, "Contact not found")
+        if deletes:
+            stmt = delete(Contact).where(Contact.id.in_([op.id for _, op in deletes]), Contact.user_id == user.id)
+            deleted = set((await db.scalars(stmt.returning(Contact.id)
+                                            .execution_options(synchronize_session=False))).all())
+            if deleted:
+                await db.execute(insert(ContactTombstone),
+                                 [{"contact_id": contact_id, "user_id": user.id, "change_seq": change_seq}
+                                  for contact_id in deleted])
+            for index, op in deletes:
+                if op.id in deleted:
+                    results[index] = {"index": index, "op": op.op, "status": 200, "id": op.id}
+                else:
+                    reject(index, 404, "Contact not found")
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    autocomplete_index.discard(user.id)
+    return results
+
+async def search_contacts(user: User, db: AsyncSession, name: Optional[str], surname: Optional[str], email: Optional[str]) -> List[Contact] | None:
     """
     Searches for contacts for specified users based on the specified parameters.
 
     :param user: The user to search contacts for.
     :type user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param name: The name of the searched contact(s).
     :type name: Optional[str]
     :param surname: The surname of the searched contact(s).
@@ -123,22 +499,165 @@ async def search_contacts(user: User, db: Session, name: Optional[str], surname:
     :return: List of searched contacts or None if they do not found.
     :rtype: List[Contact] | None
     """
-    query = db.query(Contact)
+    stmt = select(Contact).filter(Contact.user_id == user.id)
     if name:
-        query = query.filter(and_(Contact.name == name, Contact.user_id == user.id))
+        stmt = stmt.filter(Contact.name == name)
     if surname:
-        query = query.filter(and_(Contact.surname == surname, Contact.user_id == user.id))
+        stmt = stmt.filter(Contact.surname == surname)
     if email:
-        query = query.filter(and_(Contact.email == email, Contact.user_id == user.id))
-    contacts = query.all()
-    return contacts
+        stmt = stmt.filter(Contact.email == email)
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
+
+_SPACE = literal_column("' '")
+# Must stay identical to the expression of the ix_contacts_search_trgm index (see its migration),
+# otherwise PostgreSQL cannot use the index.
+SEARCH_DOCUMENT = func.lower(Contact.name + _SPACE + Contact.surname + _SPACE + Contact.email + _SPACE
+                             + Contact.phone + _SPACE + func.coalesce(Contact.description, literal_column("''")))
+
+async def read_contact_names(user: User, db: AsyncSession) -> List[Tuple[int, str, str]]:
+    """
+    Retrieves the ID, name and surname of every contact of a user, used to build the autocomplete index.
+
+    :param user: The user to retrieve contact names for.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: ``(id, name, surname)`` rows.
+    :rtype: List[Tuple[int, str, str]]
+    """
+    stmt = select(Contact.id, Contact.name, Contact.surname).filter(Contact.user_id == user.id)
+    result = await db.execute(stmt)
+    return [tuple(row) for row in result.all()]
+
+async def autocomplete_contacts(user: User, db: AsyncSession, q: str, limit: int = 10) -> List[Tuple[int, str, str]]:
+    """
+    Suggests contacts whose name, surname or full name starts with ``q`` from the in-process
+    autocomplete index, which is built from :func:`read_contact_names` on the first lookup of a user.
+
+    :param user: The user to suggest contacts for.
+    :type user: User
+    :param db: The database session, only used when the index has to be built.
+    :type db: AsyncSession
+    :param q: The typed prefix.
+    :type q: str
+    :param limit: The maximum number of suggestions.
+    :type limit: int
+    :return: ``(id, name, surname)`` of the matching contacts.
+    :rtype: List[Tuple[int, str, str]]
+    """
+    q = q.strip()
+    if not q:
+        return []
+    return await autocomplete_index.search(user.id, q, limit, lambda: read_contact_names(user, db))
+
+def _fuzzy_score(q: str, contact: Contact) -> float:
+    """
+    Scores a contact for the non-PostgreSQL fallback: prefix matches rank above substring matches,
+    which rank above typo-tolerant word matches. Returns 0 for no match.
+    """
+    best = 0.0
+    for value in (contact.name, contact.surname, contact.email, contact.phone, contact.description):
+        value = (value or "").lower()
+        if not value:
+            continue
+        if value.startswith(q):
+            return 2.0
+        if q in value:
+            best = max(best, 1.5)
+            continue
+        for word in re.findall(r"\w+", value):
+            ratio = max(difflib.SequenceMatcher(None, q, word).ratio(),
+                        difflib.SequenceMatcher(None, q, word[:len(q)]).ratio())
+            if ratio >= 0.7:
+                best = max(best, ratio)
+    return best
 
-async def read_birthdays(db: Session, user: User, days: int) -> List[Contact] | None:
+async def fuzzy_search_contacts(user: User, db: AsyncSession, q: str, limit: int = 20) -> List[Contact]:
+    """
+    Searches contacts of a user by a free-text query matched against name, surname, email, phone and
+    description, tolerating prefixes, substrings and typos, most relevant first.
+
+    On PostgreSQL the query uses the ``pg_trgm`` GIN index on :data:`SEARCH_DOCUMENT`: substring matches
+    (``LIKE``) and word similarity (``%>``) are ranked by ``word_similarity`` with a boost for name,
+    surname and email prefixes. Other databases (SQLite in tests) rank the user's contacts in Python.
+
+    :param user: The user to search contacts for.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    :param q: The search query.
+    :type q: str
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
+    :return: Matching contacts ordered by relevance.
+    :rtype: List[Contact]
+    """
+    q = q.strip().lower()
+    if not q:
+        return []
+    if db.get_bind().dialect.name != "postgresql":
+        result = await db.execute(select(Contact).filter(Contact.user_id == user.id))
+        scored = [(score, contact) for contact in result.scalars().all() if (score := _fuzzy_score(q, contact))]
+        scored.sort(key=lambda item: (-item[0], item[1].id))
+        return [contact for _, contact in scored[:limit]]
+
+    pattern = q.replace("/", "//").replace("%", "/%").replace("_", "/_")
+    prefix = or_(func.lower(Contact.name).startswith(q, autoescape=True),
+                 func.lower(Contact.surname).startswith(q, autoescape=True),
+                 func.lower(Contact.email).startswith(q, autoescape=True))
+    rank = func.word_similarity(q, SEARCH_DOCUMENT) + case((prefix, 1.0), else_=0.0)
+    stmt = select(Contact).filter(
+        Contact.user_id == user.id,
+        or_(SEARCH_DOCUMENT.like(f"%{pattern}%", escape="/"), SEARCH_DOCUMENT.op("%>")(q)),
+    ).order_by(rank.desc(), Contact.id).limit(limit)
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
+
+def birthday_key(birthday: date | None) -> int | None:
+    """
+    Computes the recurring-birthday key ``month * 100 + day`` stored in ``Contact.birthday_key``.
+
+    :param birthday: The birthday (the year is ignored).
+    :type birthday: date | None
+    :return: The key, e.g. 1231 for December 31st, or None if there is no birthday.
+    :rtype: int | None
+    """
+    if birthday is None:
+        return None
+    return birthday.month * 100 + birthday.day
+
+def birthday_key_ranges(start: date, days: int) -> List[Tuple[int, int]]:
+    """
+    Translates the window ``[start, start + days]`` into inclusive ``birthday_key`` ranges.
+    A window crossing New Year is split in two, and February 29th birthdays are celebrated
+    on March 1st in common years.
+
+    :param start: The first day of the window.
+    :type start: date
+    :param days: The length of the window in days.
+    :type days: int
+    :return: One or two inclusive ``(low, high)`` key ranges.
+    :rtype: List[Tuple[int, int]]
+    """
+    if days >= 365:
+        return [(101, 1231)]
+    end = start + timedelta(days=days)
+    low, high = birthday_key(start), birthday_key(end)
+    if low == 301 and not calendar.isleap(start.year):
+        low = 229
+    if start.year == end.year:
+        return [(low, high)]
+    return [(low, 1231), (101, high)]
+
+async def read_birthdays(db: AsyncSession, user: User, days: int) -> List[Contact] | None:
     """
     Searches for users whose birthdays are within the next days specified by the user.
+    The lookup uses the indexed ``(user_id, birthday_key)`` pair, so it handles year wrap
+    and returns contacts ordered by upcoming birthday.
 
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param user: The user to search contacts for.
     :type user: User
     :param days: Number of days to search for birthdays.
@@ -147,11 +666,72 @@ async def read_birthdays(db: Session, user: User, days: int) -> List[Contact] |
     :rtype: List[Contact] | None
     """
     today = datetime.now().date()
-    end_date = today + timedelta(days=days)
-    contacts = db.query(Contact).filter(and_(
-        Contact.birthday >= today,
-        Contact.birthday <= end_date,
-        Contact.user_id == user.id
-    )).all()
-
-    return contacts
+    ranges = birthday_key_ranges(today, days)
+    stmt = select(Contact).filter(and_(
+        Contact.user_id == user.id,
+        or_(*[Contact.birthday_key.between(low, high) for low, high in ranges])
+    )).order_by(case((Contact.birthday_key < ranges[0][0], 1), else_=0), Contact.birthday_key)
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
+
+def next_birthday(birthday: date, today: date) -> date:
+    """
+    Returns the next occurrence of a birthday on or after ``today``; February 29th birthdays
+    are celebrated on March 1st in common years.
+
+    :param birthday: The birthday (the year and the time of day are ignored).
+    :type birthday: date
+    :param today: The current date.
+    :type today: date
+    :return: The date of the next birthday.
+    :rtype: date
+    """
+    for year in (today.year, today.year + 1):
+        if birthday.month == 2 and birthday.day == 29 and not calendar.isleap(year):
+            upcoming = date(year, 3, 1)
+        else:
+            upcoming = date(year, birthday.month, birthday.day)
+        if upcoming >= today:
+            return upcoming
+
+async def stream_birthdays_by_user(start: date, days: int, db: AsyncSession, after_user_id: int = 0,
+                                   batch_size: int = 1000) -> AsyncIterator[Tuple[Row, List[Row]]]:
+    """
+    Streams the contacts with a birthday within ``[start, start + days]`` of all confirmed users,
+    grouped by user in ascending user ID order.
+
+    One set-based query over ``birthday_key`` serves every user; rows are fetched from a server-side
+    cursor ``batch_size`` at a time, so memory stays flat however many users there are.
+
+    :param start: The first day of the window.
+    :type start: date
+    :param days: The length of the window in days.
+    :type days: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param after_user_id: Only users with a greater ID are included, to resume an interrupted run.
+    :type after_user_id: int
+    :param batch_size: The number of rows fetched per round-trip.
+    :type batch_size: int
+    :return: ``(user, contacts)`` pairs: the user's ``id``, ``username`` and ``email``, and the ``name``,
+        ``surname`` and ``birthday`` of the contacts ordered by upcoming birthday.
+    :rtype: AsyncIterator[Tuple[Row, List[Row]]]
+    """
+    ranges = birthday_key_ranges(start, days)
+    stmt = select(
+        User.id, User.username, User.email, Contact.name, Contact.surname, Contact.birthday,
+    ).join(User, User.id == Contact.user_id).filter(
+        User.confirmed.is_(True),
+        Contact.user_id > after_user_id,
+        or_(*[Contact.birthday_key.between(low, high) for low, high in ranges]),
+    ).order_by(Contact.user_id, Contact.birthday_key).execution_options(yield_per=batch_size)
+    result = await db.stream(stmt)
+    user, contacts = None, []
+    async for row in result:
+        if user is not None and row.id != user.id:
+            yield user, sorted(contacts, key=lambda contact: next_birthday(contact.birthday, start))
+            contacts = []
+        user = row
+        contacts.append(row)
+    if user is not None:
+        yield user, sorted(contacts, key=lambda contact: next_birthday(contact.birthday, start))
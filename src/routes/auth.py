@@ -1,23 +1,25 @@
 from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.schemas import UserModel, UserResponse, TokenModel, RequestEmail
 from src.repository import users as repository_users
 from src.services.auth import auth_service
 from src.services.email import send_email
+from src.services.gravatar import gravatar_resolver
 
 router = APIRouter(prefix='/auth', tags=["auth"])
 security = HTTPBearer()
 
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: AsyncSession = Depends(get_db)):
     """
     Registers a new user and sends a confirmation email to the user's provided email address.
     The user's password is hashed before being stored in the database, and a background task is used
-    to send a confirmation email with a verification token.
+    to send a confirmation email with a verification token. The user starts with a placeholder avatar
+    that is replaced by their Gravatar, if they have one, in the background.
 
     :param body: The data required to create a new user.
     :type body: UserModel
@@ -26,7 +28,7 @@ async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Re
     :param request: Request object, used to get the base URL for generating the confirmation link.
     :type request: Request
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The created user and a message indicating the success of the operation.
     :rtype: dict
     :raises HTTPException: If the email is already registered (409 Conflict).
@@ -34,21 +36,22 @@ async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Re
     exist_user = await repository_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     new_user = await repository_users.create_user(body, db)
+    gravatar_resolver.submit(new_user.id, new_user.email)
     background_tasks.add_task(send_email, new_user.email, new_user.username, request.base_url)
     return {"user": new_user, "detail": "User successfully created. Check your email for confirmation."}
 
 
 @router.post("/login", response_model=TokenModel)
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     Authenticates a user and generates an access token and refresh token.
 
     :param body: The login credentials, including username (email) and password.
     :type body: OAuth2PasswordRequestForm
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A dictionary containing the access token, refresh token, and token type (Bearer).
     :rtype: dict
     :raises HTTPException: If the email is invalid, the email is not confirmed, or the password is incorrect (401 Unauthorized).
@@ -58,7 +61,7 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
-    if not auth_service.verify_password(body.password, user.password):
+    if not await auth_service.verify_password(body.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
     # Generate JWT
     access_token = await auth_service.create_access_token(data={"sub": user.email})
@@ -68,14 +71,14 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
 
 
 @router.get('/refresh_token', response_model=TokenModel)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: AsyncSession = Depends(get_db)):
     """
     Refreshes an access token using a valid refresh token.
 
     :param credentials: The credentials containing the refresh token.
     :type credentials: HTTPAuthorizationCredentials
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A dictionary containing the new access token, refresh token, and token type (Bearer).
     :rtype: dict
     :raises HTTPException: If the refresh token is invalid or expired (401 Unauthorized).
@@ -94,14 +97,14 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(sec
 
 
 @router.get('/confirmed_email/{token}')
-async def confirmed_email(token: str, db: Session = Depends(get_db)):
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     """
     Confirms the user's email address by verifying the provided token.
 
     :param token: The email confirmation token.
     :type token: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A message indicating the success or failure of the email confirmation process.
     :rtype: dict
     :raises HTTPException: If the verification token is invalid or the email does not exist (400 Bad Request).
@@ -118,7 +121,7 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
 
 @router.post('/request_email')
 async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: Session = Depends(get_db)):
+                        db: AsyncSession = Depends(get_db)):
     """
     Requests a new email confirmation for an unconfirmed email address.
 
@@ -129,7 +132,7 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     :param request: Request object, used to get the base URL for generating the confirmation link.
     :type request: Request
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A message indicating the success or failure of the email confirmation request.
     :rtype: dict
     :raises HTTPException: If the email is already confirmed.
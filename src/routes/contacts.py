@@ -1,44 +1,80 @@
-from typing import List
+from datetime import date
+from typing import List, Optional, Union
 
-from fastapi import APIRouter, HTTPException, Depends, status, Query
-from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
 
 from src.database.db import get_db
 from src.database.models import User
-from src.schemas import ContactUpdate, ContactModel, ContactResponse
+from src.schemas import ContactUpdate, ContactModel, ContactResponse, ContactPage, ContactImportReport, \
+    ContactSuggestion, ContactChanges, ContactBatch, ContactBatchResponse
 from src.repository import contacts as repository_contacts
 from src.services.auth import auth_service
+from src.services.cache import response_cache
+from src.services.rate_limit import RateLimit
+from src.services.contacts_io import EXPORTERS, PARSERS, run_import
+from src.services.workers import WorkerPoolBusy
 
 router = APIRouter(prefix='/contacts', tags=["contacts"])
 
+CONTACT = TypeAdapter(ContactResponse)
+CONTACT_LIST = TypeAdapter(List[ContactResponse])
+CONTACT_PAGE = TypeAdapter(ContactPage)
 
-@router.get("/", response_model=List[ContactResponse], description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def read_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db),
+
+@router.get("/", response_model=Union[List[ContactResponse], ContactPage],
+            description='No more than 10 requests per minute on the free plan',
+            dependencies=[Depends(RateLimit("read"))])
+async def read_contacts(request: Request, skip: int = 0, limit: int = Query(100, ge=1),
+                        cursor: Optional[str] = Query(None, description="Opaque cursor for keyset pagination. "
+                                                                        "Pass an empty value for the first page"),
+                        db: AsyncSession = Depends(get_db),
                         current_user: User = Depends(auth_service.get_current_user)):
     """
     Retrieves a list of contacts for the current user with specified pagination parameters.
 
+    When ``cursor`` is passed (empty for the first page), keyset pagination is used and the response is a page
+    object with ``items`` and ``next_cursor``; otherwise the plain list paginated by ``skip``/``limit`` is returned.
+
+    :param request: The incoming request; a matching ``If-None-Match`` is answered with 304 Not Modified.
+    :type request: Request
     :param skip: The number of contacts to skip. Default is 0.
     :type skip: int
     :param limit: The maximum number of contacts to return. Default is 100, but can be adjusted.
     :type limit: int
+    :param cursor: The cursor returned with the previous page in keyset pagination mode.
+    :type cursor: Optional[str]
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The currently authenticated user.
     :type current_user: User
-    :return: A list of contacts belonging to the current user.
-    :rtype: List[ContactResponse]
-    :raises HTTPException: If an error occurs while fetching contacts from the database.
+    :return: A list of contacts belonging to the current user, or a page of them in keyset pagination mode.
+    :rtype: List[ContactResponse] | ContactPage
+    :raises HTTPException: If the cursor is invalid (400 Bad Request).
     """
-    contacts = await repository_contacts.read_contacts(skip, limit, current_user, db)
-    return contacts
+    async def load_page():
+        try:
+            contacts, next_cursor = await repository_contacts.read_contacts_page(cursor, limit, current_user, db)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        return {"items": contacts, "next_cursor": next_cursor}
+
+    if cursor is not None:
+        return await response_cache.fetch("read_contacts", current_user, db, {"cursor": cursor, "limit": limit},
+                                          load_page, CONTACT_PAGE, request)
+    return await response_cache.fetch("read_contacts", current_user, db, {"skip": skip, "limit": limit},
+                                      lambda: repository_contacts.read_contacts(skip, limit, current_user, db),
+                                      CONTACT_LIST, request)
 
 
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED,
-             description='No more than 5 requests per minute', dependencies=[Depends(RateLimiter(times=5, seconds=60))])
-async def create_contact(body: ContactModel, db: Session = Depends(get_db),
+             description='No more than 5 requests per minute on the free plan',
+             dependencies=[Depends(RateLimit("write"))])
+async def create_contact(body: ContactModel, db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
     Creates a new contact for the currently authenticated user.
@@ -47,7 +83,7 @@ async def create_contact(body: ContactModel, db: Session = Depends(get_db),
     :param body: The contact data to create.
     :type body: ContactModel
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The currently authenticated user.
     :type current_user: User
     :return: The created contact information.
@@ -57,34 +93,203 @@ async def create_contact(body: ContactModel, db: Session = Depends(get_db),
     return await repository_contacts.create_contact(body, current_user, db)
 
 
-@router.get("/{contact_id}", response_model=ContactResponse, dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def read_contact(contact_id: int, db: Session = Depends(get_db),
+@router.post("/batch", response_model=ContactBatchResponse,
+             description='No more than 5 requests per minute on the free plan',
+             dependencies=[Depends(RateLimit("write"))])
+async def batch_contacts(body: ContactBatch, db: AsyncSession = Depends(get_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Applies up to 500 create, update and delete operations for the currently authenticated user in one
+    transaction. Each operation gets its own result: 201 for a created contact, 200 for an updated or deleted
+    one, 404 if the contact does not exist and 409 on an email conflict; rejected operations do not prevent
+    the others from being applied. The number of requests allowed per minute is limited to 5.
+
+    :param body: The operations to apply.
+    :type body: ContactBatch
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The currently authenticated user.
+    :type current_user: User
+    :return: The per-operation results in request order.
+    :rtype: ContactBatchResponse
+    :raises HTTPException: If a concurrent change conflicts with the batch; nothing is applied (409 Conflict).
+    """
+    try:
+        results = await repository_contacts.apply_batch(body.operations, current_user, db)
+    except (IntegrityError, StaleDataError):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="The batch conflicts with a concurrent change, nothing was applied")
+    return {"results": results}
+
+
+@router.post("/import", response_model=ContactImportReport,
+             description='No more than 2 requests per minute on the free plan',
+             dependencies=[Depends(RateLimit("bulk"))])
+async def import_contacts(request: Request,
+                          format: Optional[str] = Query(None, pattern="^(csv|ndjson)$",
+                                                        description="Upload format; detected from Content-Type "
+                                                                    "when omitted"),
+                          db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Imports contacts in bulk from a CSV (with a header row) or NDJSON request body.
+    The body is parsed as it streams in, rows are validated like single contacts and inserted in chunks;
+    rows with invalid data or an email that already exists are reported and skipped.
+    The number of requests allowed per minute is limited to 2.
+
+    :param request: The request whose body is streamed.
+    :type request: Request
+    :param format: ``csv`` or ``ndjson``; taken from the Content-Type header when omitted.
+    :type format: Optional[str]
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The currently authenticated user.
+    :type current_user: User
+    :return: The number of processed, imported and failed rows with per-row errors.
+    :rtype: ContactImportReport
+    :raises HTTPException: If the format cannot be determined (415 Unsupported Media Type) or the import
+        workers are busy with other imports (503 Service Unavailable).
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        if "csv" in content_type:
+            format = "csv"
+        elif "ndjson" in content_type or "jsonlines" in content_type:
+            format = "ndjson"
+        else:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                                detail="Send text/csv or application/x-ndjson, or pass ?format=")
+    rows = PARSERS[format](request.stream())
+    try:
+        return await run_import(rows, current_user, db)
+    except WorkerPoolBusy:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Too many imports in progress, try again later", headers={"Retry-After": "5"})
+
+
+@router.get("/export", response_class=StreamingResponse,
+            description='No more than 2 requests per minute on the free plan',
+            dependencies=[Depends(RateLimit("bulk"))])
+async def export_contacts(format: str = Query("csv", pattern="^(csv|ndjson|vcard)$", description="Export format"),
+                          db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Exports all contacts of the currently authenticated user as CSV, NDJSON or vCard.
+    Rows are streamed from a server-side cursor straight into the response, so memory use does not depend
+    on the size of the address book. The number of requests allowed per minute is limited to 2.
+
+    :param format: ``csv``, ``ndjson`` or ``vcard``. Default is ``csv``.
+    :type format: str
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The currently authenticated user.
+    :type current_user: User
+    :return: A streaming response with the exported contacts as an attachment.
+    :rtype: StreamingResponse
+    """
+    exporter, media_type = EXPORTERS[format]
+    extension = "vcf" if format == "vcard" else format
+    return StreamingResponse(exporter(repository_contacts.stream_contacts(current_user, db)), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="contacts.{extension}"'})
+
+
+@router.get("/changes", response_model=ContactChanges,
+            description='No more than 120 requests per minute on the free plan',
+            dependencies=[Depends(RateLimit("sync"))])
+async def read_changes(since: Optional[str] = Query(None, description="Sync token returned by the previous sync; "
+                                                                       "omit it for a full sync"),
+                       limit: int = Query(500, ge=1, le=1000),
+                       db: AsyncSession = Depends(get_db),
+                       current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Returns the contacts of the currently authenticated user created, updated or deleted since a sync token,
+    so clients can sync incrementally. While ``has_more`` is true the client should call again with
+    ``next_token`` right away; otherwise it stores ``next_token`` for the next sync. Changes are returned in
+    commit order, so slow writes are never skipped; a contact changed again is delivered again, so changes must
+    be applied idempotently. Timestamp-based tokens from earlier versions are rejected with 400, and the client
+    then starts over with a full sync. Requests count against the ``sync`` rate limit rule,
+    separate from other reads, which allows 120 requests per minute on the free plan: enough to page through
+    100,000 changes at ``limit=1000`` within a minute.
+
+    :param since: The sync token from the previous response.
+    :type since: Optional[str]
+    :param limit: The maximum number of changes to return. Default is 500.
+    :type limit: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The currently authenticated user.
+    :type current_user: User
+    :return: Changed contacts, IDs of deleted contacts and the next sync token.
+    :rtype: ContactChanges
+    :raises HTTPException: If the sync token is invalid (400 Bad Request).
+    """
+    try:
+        updated, deleted, next_token, has_more = await repository_contacts.read_changes(since, limit, current_user, db)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+    return {"updated": updated, "deleted": deleted, "next_token": next_token, "has_more": has_more}
+
+
+@router.get("/autocomplete", response_model=List[ContactSuggestion])
+async def autocomplete_contacts(q: str = Query(..., min_length=1, max_length=100, description="Typed prefix"),
+                                limit: int = Query(10, ge=1, le=50),
+                                db: AsyncSession = Depends(get_db),
+                                current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Suggests contacts of the currently authenticated user whose name, surname or full name starts with ``q``.
+    Lookups are served from an in-process prefix index, so the endpoint is not rate limited and can be
+    called on every keystroke.
+
+    :param q: The typed prefix (case-insensitive).
+    :type q: str
+    :param limit: The maximum number of suggestions. Default is 10.
+    :type limit: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The currently authenticated user.
+    :type current_user: User
+    :return: Suggested contacts.
+    :rtype: List[ContactSuggestion]
+    """
+    suggestions = await repository_contacts.autocomplete_contacts(current_user, db, q, limit)
+    return [ContactSuggestion(id=contact_id, name=name, surname=surname) for contact_id, name, surname in suggestions]
+
+
+@router.get("/{contact_id}", response_model=ContactResponse, dependencies=[Depends(RateLimit("read"))])
+async def read_contact(request: Request, contact_id: int, db: AsyncSession = Depends(get_db),
                        current_user: User = Depends(auth_service.get_current_user)):
     """
     Retrieves a specific contact for the currently authenticated user by contact ID.
     The number of requests allowed per minute is limited to 10.
 
+    :param request: The incoming request; a matching ``If-None-Match`` is answered with 304 Not Modified.
+    :type request: Request
     :param contact_id: The ID of the contact to retrieve.
     :type contact_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The currently authenticated user.
     :type current_user: User
     :return: The requested contact information.
     :rtype: ContactResponse
     :raises HTTPException: If the contact is not found (404 Not Found).
     """
-    contact = await repository_contacts.get_contact(contact_id, current_user, db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
-    return contact
+    async def load():
+        contact = await repository_contacts.get_contact(contact_id, current_user, db)
+        if contact is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+        return contact
 
+    return await response_cache.fetch("read_contact", current_user, db, {"contact_id": contact_id}, load, CONTACT,
+                                      request)
 
-@router.put("/{contact_id}", response_model=ContactResponse, dependencies=[Depends(RateLimiter(times=5, seconds=60))])
-async def update_contact(body: ContactUpdate, contact_id: int, db: Session = Depends(get_db),
+
+@router.put("/{contact_id}", response_model=ContactResponse, dependencies=[Depends(RateLimit("write"))])
+async def update_contact(body: ContactUpdate, contact_id: int, db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
     Updates an existing contact for the currently authenticated user by contact ID.
+    Only the fields present in the body are changed; null leaves name, surname, email and phone as they are.
     The number of requests allowed per minute is limited to 5.
 
     :param body: The contact data to update (including the contact's name, surname, email, etc.).
@@ -92,7 +297,7 @@ async def update_contact(body: ContactUpdate, contact_id: int, db: Session = Dep
     :param contact_id: The ID of the contact to update.
     :type contact_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The currently authenticated user.
     :type current_user: User
     :return: The updated contact information.
@@ -106,7 +311,7 @@ async def update_contact(body: ContactUpdate, contact_id: int, db: Session = Dep
 
 
 @router.delete("/{contact_id}", response_model=ContactResponse)
-async def remove_contact(contact_id: int, db: Session = Depends(get_db),
+async def remove_contact(contact_id: int, db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
     Deletes a contact for the currently authenticated user by contact ID.
@@ -114,7 +319,7 @@ async def remove_contact(contact_id: int, db: Session = Depends(get_db),
     :param contact_id: The ID of the contact to delete.
     :type contact_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The currently authenticated user.
     :type current_user: User
     :return: The deleted contact information.
@@ -127,55 +332,71 @@ async def remove_contact(contact_id: int, db: Session = Depends(get_db),
     return contact
 
 
-@router.get("/search/", response_model=List[ContactResponse], dependencies=[Depends(RateLimiter(times=5, seconds=60))])
-async def search_contacts(current_user: User = Depends(auth_service.get_current_user),
-                          db: Session = Depends(get_db),
+@router.get("/search/", response_model=List[ContactResponse], dependencies=[Depends(RateLimit("search"))])
+async def search_contacts(request: Request, current_user: User = Depends(auth_service.get_current_user),
+                          db: AsyncSession = Depends(get_db),
                           name: str = Query(None, description="First name of the contact", max_length=50),
                           surname: str = Query(None, description="Surname of the contact", max_length=150),
-                          email: str = Query(None, description="Email of the contact", max_length=255)):
+                          email: str = Query(None, description="Email of the contact", max_length=255),
+                          q: str = Query(None, description="Free-text query: prefix, substring or approximate "
+                                                           "match on any field", min_length=1, max_length=100),
+                          limit: int = Query(20, ge=1, le=100, description="Maximum number of results for q")):
     """
     Searches for contacts for the currently authenticated user based on provided search criteria.
+    With ``q``, a fuzzy search across name, surname, email, phone and description is performed and
+    results are ordered by relevance; otherwise name, surname and email must match exactly.
     The number of requests allowed per minute is limited to 5.
 
+    :param request: The incoming request; a matching ``If-None-Match`` is answered with 304 Not Modified.
+    :type request: Request
     :param current_user: The currently authenticated user.
     :type current_user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param name: The first name of the contact to search for.
     :type name: str
     :param surname: The surname of the contact to search for.
     :type surname: str
     :param email: The email address of the contact to search for.
     :type email: str
+    :param q: The free-text query for fuzzy search.
+    :type q: str
+    :param limit: The maximum number of fuzzy search results. Default is 20.
+    :type limit: int
     :return: A list of contacts matching the search criteria.
     :rtype: List[ContactResponse]
     :raises HTTPException: If no contacts are found (404 Not Found).
     """
-    contacts = await repository_contacts.search_contacts(current_user, db, name, surname, email)
-    if contacts is None:
-        return {"message": "No contacts found"}
-    return contacts
+    async def load():
+        if q:
+            return await repository_contacts.fuzzy_search_contacts(current_user, db, q, limit)
+        return await repository_contacts.search_contacts(current_user, db, name, surname, email)
+
+    params = {"q": q, "limit": limit} if q else {"name": name, "surname": surname, "email": email}
+    return await response_cache.fetch("search_contacts", current_user, db, params, load, CONTACT_LIST, request)
 
 
 @router.get("/birthdays/", response_model=List[ContactResponse],
-            dependencies=[Depends(RateLimiter(times=5, seconds=60))])
-async def read_birthdays(current_user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db),
+            dependencies=[Depends(RateLimit("search"))])
+async def read_birthdays(request: Request, current_user: User = Depends(auth_service.get_current_user), db: AsyncSession = Depends(get_db),
                          days: int = Query(7, ge=1, le=365, description="Number of days ahead to check birthdays")):
     """
     Retrieves a list of contacts with upcoming birthdays for the currently authenticated user within a specified
     number of days. The number of requests allowed per minute is limited to 5.
 
+    :param request: The incoming request; a matching ``If-None-Match`` is answered with 304 Not Modified.
+    :type request: Request
     :param current_user: The currently authenticated user.
     :type current_user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param days: The number of days ahead to check birthdays. Defaults to 7 days.
     :type days: int
     :return: A list of contacts with upcoming birthdays within the specified range.
     :rtype: List[ContactResponse]
     :raises HTTPException: If no contacts have birthdays within the specified period (404 Not Found).
     """
-    contacts = await repository_contacts.read_birthdays(db, current_user, days)
-    if contacts is None:
-        return {"message": "No birthdays found in this period"}
-    return contacts
+    params = {"days": days, "today": date.today()}
+    return await response_cache.fetch("read_birthdays", current_user, db, params,
+                                      lambda: repository_contacts.read_birthdays(db, current_user, days), CONTACT_LIST,
+                                      request)
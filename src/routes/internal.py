@@ -0,0 +1,136 @@
+import secrets
+
+from fastapi import APIRouter, Depends, HTTPException, Security, status
+from fastapi.security import APIKeyHeader
+
+from src.conf.config import settings
+from src.database.pool import pool_monitor
+from src.services.auth import auth_service
+from src.services.avatars import LocalStorage, avatar_executor, avatar_service, image_executor
+from src.services.cache import response_cache
+from src.services.contacts_io import import_executor
+from src.services.email import email_queue
+from src.services.gravatar import gravatar_resolver
+from src.services.rate_limit import rate_limiter
+from src.services.redis_pool import redis_manager
+
+internal_token_header = APIKeyHeader(name="X-Internal-Token", auto_error=False)
+
+
+async def require_internal_token(token: str | None = Security(internal_token_header)) -> None:
+    """
+    Guards the internal endpoints with the shared secret ``internal_token``.
+
+    :param token: The ``X-Internal-Token`` request header.
+    :type token: str | None
+    :raises HTTPException: If no token is configured (404) or the header does not match it (401).
+    """
+    if not settings.internal_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if token is None or not secrets.compare_digest(token.encode(), settings.internal_token.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid internal token")
+
+
+router = APIRouter(prefix='/_internal', tags=["internal"], include_in_schema=False,
+                   dependencies=[Depends(require_internal_token)])
+
+
+@router.get("/pool")
+async def pool_status():
+    """
+    Reports the state of the database connection pool: checked-out connections, overflow,
+    checkout counters, timeouts and the checkout wait-time histogram.
+
+    :return: A snapshot of the pool statistics.
+    :rtype: dict
+    """
+    return pool_monitor.snapshot()
+
+
+@router.get("/redis")
+async def redis_status():
+    """
+    Reports the state of the shared Redis connection pool: connections in use, idle connections
+    and the acquire wait-time histogram.
+
+    :return: A snapshot of the Redis pool statistics.
+    :rtype: dict
+    """
+    return redis_manager.snapshot()
+
+
+@router.get("/workers")
+async def workers_status():
+    """
+    Reports the load of the worker pools that keep CPU-bound work off the event loop:
+    calls in flight, queue depth, rejections and call latency.
+
+    :return: A snapshot per worker pool.
+    :rtype: dict
+    """
+    return {
+        "password_hashing": auth_service.hash_executor.snapshot(),
+        "contacts_import": import_executor.snapshot(),
+        "avatar_upload": avatar_executor.snapshot(),
+        "avatar_images": image_executor.snapshot(),
+    }
+
+
+@router.get("/cache")
+async def cache_status():
+    """
+    Reports hit, miss and error counters of the contacts response cache per route.
+
+    :return: A snapshot of the response cache statistics.
+    :rtype: dict
+    """
+    return response_cache.snapshot()
+
+
+@router.get("/rate-limit")
+async def rate_limit_status():
+    """
+    Reports allowed and rejected requests per rate limit rule, including rejections answered
+    from the in-process block cache without asking Redis.
+
+    :return: A snapshot of the rate limiter statistics.
+    :rtype: dict
+    """
+    return rate_limiter.snapshot()
+
+
+@router.get("/email")
+async def email_status():
+    """
+    Reports the email queue: jobs waiting, being sent, waiting for a retry and dead-lettered.
+
+    :return: A snapshot of the email queue.
+    :rtype: dict
+    """
+    return await email_queue.stats()
+
+
+@router.get("/avatars")
+async def avatars_status():
+    """
+    Reports the in-memory cache of avatar files served by the local storage backend.
+
+    :return: Entries, size and hit counters of the cache, or ``{"enabled": False}`` for other backends.
+    :rtype: dict
+    """
+    storage = avatar_service.storage
+    if not isinstance(storage, LocalStorage):
+        return {"enabled": False}
+    return {"enabled": True, **storage.cache.snapshot()}
+
+
+@router.get("/gravatar")
+async def gravatar_status():
+    """
+    Reports the background Gravatar resolver: users waiting, resolved, found, lookups sent to Gravatar,
+    lookups that failed or whose image could not be stored, and users dropped because the queue was full.
+
+    :return: A snapshot of the resolver statistics.
+    :rtype: dict
+    """
+    return gravatar_resolver.snapshot()
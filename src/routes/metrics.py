@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from src.routes.internal import require_internal_token
+from src.services.metrics import http_metrics
+from src.services.rate_limit import rate_limiter
+from src.services.redis_pool import redis_manager
+
+router = APIRouter(tags=["metrics"], include_in_schema=False, dependencies=[Depends(require_internal_token)])
+
+
+class PrometheusResponse(PlainTextResponse):
+    media_type = "text/plain; version=0.0.4"
+
+
+@router.get("/metrics", response_class=PrometheusResponse)
+async def metrics():
+    """
+    Exposes the application metrics in the Prometheus text format: per-route request latency, requests
+    in flight, responses by status class and database queries, database query latency, Redis commands
+    and rate limit decisions. Like the internal endpoints, it requires the ``X-Internal-Token`` header
+    and does not exist when no ``internal_token`` is configured.
+
+    :return: The metrics.
+    :rtype: PrometheusResponse
+    """
+    lines = http_metrics.expose() + redis_manager.expose() + rate_limiter.expose()
+    lines.append("")
+    return PrometheusResponse("\n".join(lines))
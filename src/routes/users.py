@@ -1,14 +1,15 @@
-from fastapi import APIRouter, Depends, status, UploadFile, File
-from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Path, Query, Request, status, UploadFile, File
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.database.models import User
 from src.repository import users as repository_users
 from src.services.auth import auth_service
-from src.conf.config import settings
-from src.schemas import UserDb
+from src.services.avatars import PLACEHOLDER_SVG, AvatarStorageError, LocalStorage, avatar_service
+from src.services.images import THUMBNAIL_MEDIA_TYPE, InvalidImage
+from src.services.workers import WorkerPoolBusy
+from src.schemas import AvatarJob, UserDb
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -26,32 +27,112 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
     return current_user
 
 
-@router.patch('/avatar', response_model=UserDb)
-async def update_avatar_user(file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user),
-                             db: Session = Depends(get_db)):
+@router.patch('/avatar', response_model=UserDb,
+              responses={202: {"model": AvatarJob, "description": "The upload continues in the background"}})
+async def update_avatar_user(request: Request, background_tasks: BackgroundTasks, file: UploadFile = File(),
+                             defer: bool = Query(False, description="Upload in the background and answer 202 "
+                                                                    "with a status URL"),
+                             current_user: User = Depends(auth_service.get_current_user),
+                             db: AsyncSession = Depends(get_db)):
     """
     Updates the avatar's profile picture of the currently authenticated user.
-    The avatar image will be uploaded to Cloudinary, resized, and the public URL will be saved to the user's profile.
+    The image is stored by the configured storage backend (local thumbnails rendered in a process pool,
+    or Cloudinary), off the event loop, and the public URL is saved to the user's profile. With ``defer``
+    the upload runs after the response, which is 202 Accepted with a ``Location`` to poll.
 
+    :param request: The incoming request.
+    :type request: Request
+    :param background_tasks: Runs deferred uploads.
+    :type background_tasks: BackgroundTasks
     :param file: The avatar image file to upload.
     :type file: UploadFile
+    :param defer: Whether to upload in the background.
+    :type defer: bool
     :param current_user: The currently authenticated user.
     :type current_user: User
     :param db: The database session.
-    :type db: Session
-    :return: The updated user information including the new avatar URL.
-    :rtype: UserDb
-    :raises HTTPException: If there is an error during the avatar upload process or user update.
-    """
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-
-    r = cloudinary.uploader.upload(file.file, public_id=f'NotesApp/{current_user.username}', overwrite=True)
-    src_url = cloudinary.CloudinaryImage(f'NotesApp/{current_user.username}')\
-                        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
+    :type db: AsyncSession
+    :return: The updated user information including the new avatar URL, or the deferred job.
+    :rtype: UserDb | JSONResponse
+    :raises HTTPException: If the file is not a valid image (415) or too large (413), the storage backend fails (502)
+        or too many uploads are in progress (503).
+    """
+    content_length = request.headers.get("content-length")
+    data = await avatar_service.read(file, int(content_length) if content_length and content_length.isdigit()
+                                     else None)
+    if defer:
+        job_id = await avatar_service.defer(current_user)
+        background_tasks.add_task(avatar_service.run_job, job_id, current_user, data, file.content_type)
+        status_url = str(request.url_for("read_avatar_job", job_id=job_id))
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, headers={"Location": status_url},
+                            content=AvatarJob(id=job_id, status="pending", status_url=status_url).model_dump())
+    try:
+        src_url = await avatar_service.store(current_user, data, file.content_type)
+    except WorkerPoolBusy:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Too many uploads in progress, try again later", headers={"Retry-After": "5"})
+    except InvalidImage as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+    except AvatarStorageError:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Avatar storage failed")
     user = await repository_users.update_avatar(current_user.email, src_url, db)
     return user
+
+
+@router.get('/avatar/jobs/{job_id}', response_model=AvatarJob)
+async def read_avatar_job(request: Request, job_id: str, current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Reports the status of a deferred avatar upload: ``pending``, ``done`` with the new avatar URL,
+    or ``failed`` with the reason.
+
+    :param request: The incoming request.
+    :type request: Request
+    :param job_id: The job ID from the 202 response.
+    :type job_id: str
+    :param current_user: The currently authenticated user.
+    :type current_user: User
+    :return: The job.
+    :rtype: AvatarJob
+    :raises HTTPException: If the job does not exist, expired or belongs to another user (404).
+    """
+    job = await avatar_service.jobs.get(job_id)
+    if job is None or job["user_id"] != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return AvatarJob(id=job_id, status=job["status"], status_url=str(request.url), avatar=job.get("avatar"),
+                     detail=job.get("detail"))
+
+
+@router.get('/avatars/placeholder.svg', include_in_schema=False)
+async def read_avatar_placeholder():
+    """
+    Serves the avatar new users have until their Gravatar is resolved in the background.
+
+    :return: The placeholder image.
+    :rtype: Response
+    """
+    return Response(content=PLACEHOLDER_SVG, media_type="image/svg+xml",
+                    headers={"Cache-Control": "public, max-age=86400"})
+
+
+@router.get('/avatars/{name}', include_in_schema=False)
+async def read_avatar_file(request: Request, name: str = Path(pattern=r"^[0-9a-f]{32}_\d+\.webp$")):
+    """
+    Serves an avatar thumbnail stored by the local storage backend. The names are content-addressed,
+    so responses may be cached for a year and revalidation is answered with 304.
+
+    :param request: The incoming request, checked for ``If-None-Match``.
+    :type request: Request
+    :param name: The file name from the avatar URL.
+    :type name: str
+    :return: The image.
+    :rtype: Response
+    :raises HTTPException: If there is no such avatar (404).
+    """
+    storage = avatar_service.storage
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{name}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    data = await storage.read(name) if isinstance(storage, LocalStorage) else None
+    if data is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Avatar not found")
+    return Response(content=data, media_type=THUMBNAIL_MEDIA_TYPE, headers=headers)
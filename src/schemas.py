@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import Annotated, List, Literal, Optional, Union
 from pydantic import BaseModel, Field
 from pydantic import EmailStr
 from pydantic_extra_types.phone_numbers import PhoneNumber
@@ -30,6 +30,74 @@ class ContactResponse(ContactBase):
     id: int
 
 
+class ContactChanges(BaseModel):
+    updated: List[ContactResponse]
+    deleted: List[int]
+    next_token: str
+    has_more: bool = False
+
+
+class ContactSuggestion(BaseModel):
+    id: int
+    name: str
+    surname: str
+
+
+class ContactCreateOperation(BaseModel):
+    op: Literal["create"]
+    data: ContactModel
+
+
+class ContactUpdateOperation(BaseModel):
+    op: Literal["update"]
+    id: int
+    data: ContactUpdate
+
+
+class ContactDeleteOperation(BaseModel):
+    op: Literal["delete"]
+    id: int
+
+
+ContactOperation = Annotated[Union[ContactCreateOperation, ContactUpdateOperation, ContactDeleteOperation],
+                             Field(discriminator="op")]
+
+
+class ContactBatch(BaseModel):
+    operations: List[ContactOperation] = Field(min_length=1, max_length=500)
+
+
+class ContactBatchResult(BaseModel):
+    index: int
+    op: str
+    status: int
+    id: Optional[int] = None
+    contact: Optional[ContactResponse] = None
+    error: Optional[str] = None
+
+
+class ContactBatchResponse(BaseModel):
+    results: List[ContactBatchResult]
+
+
+class ContactImportError(BaseModel):
+    row: int
+    error: str
+
+
+class ContactImportReport(BaseModel):
+    total: int = 0
+    imported: int = 0
+    failed: int = 0
+    errors: List[ContactImportError] = []
+    errors_truncated: bool = False
+
+
+class ContactPage(BaseModel):
+    items: List[ContactResponse]
+    next_cursor: Optional[str] = None
+
+
 class UserModel(BaseModel):
     username: str = Field(min_length=5, max_length=16)
     email: str
@@ -47,6 +115,14 @@ class UserDb(BaseModel):
         from_attributes = True
 
 
+class AvatarJob(BaseModel):
+    id: str
+    status: str
+    status_url: Optional[str] = None
+    avatar: Optional[str] = None
+    detail: Optional[str] = None
+
+
 class UserResponse(BaseModel):
     user: UserDb
     detail: str = "User successfully created"
@@ -1,4 +1,3 @@
-import redis
 from typing import Optional
 from jose import JWTError, jwt
 
@@ -6,23 +5,46 @@ from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf.config import settings
 from src.database.db import get_db
 from src.repository import users as repository_users
+from src.services.cache import user_cache
+from src.services.workers import BoundedExecutor, WorkerPoolBusy
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+# Module-level so they can be pickled when the hashing pool is a process pool
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def _hash_password(password: str) -> str:
+    return pwd_context.hash(password)
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = pwd_context
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    hash_executor = BoundedExecutor("bcrypt", max_workers=settings.password_hash_workers,
+                                    max_pending=settings.password_hash_max_pending,
+                                    kind=settings.password_hash_executor)
 
-    def verify_password(self, plain_password, hashed_password):
+    async def _run_hashing(self, fn, *args):
+        try:
+            return await self.hash_executor.run(fn, *args)
+        except WorkerPoolBusy:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Too many concurrent authentication requests", headers={"Retry-After": "1"})
+
+    async def verify_password(self, plain_password, hashed_password):
         """
         Verifies if the provided plain password matches the hashed password.
+        The bcrypt check runs in the bounded hashing pool, so it does not block the event loop.
 
         :param plain_password: The plain text password provided by the user.
         :type plain_password: str
@@ -30,19 +52,21 @@ class Auth:
         :type hashed_password: str
         :return: `True` if the passwords match, `False` otherwise.
         :rtype: bool
+        :raises HTTPException: If the hashing pool is saturated (503 Service Unavailable).
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await self._run_hashing(_verify_password, plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
+    async def get_password_hash(self, password: str):
         """
-        Hashes the provided plain text password.
+        Hashes the provided plain text password in the bounded hashing pool.
 
         :param password: The plain text password to be hashed.
         :type password: str
         :return: The hashed version of the provided password.
         :rtype: str
+        :raises HTTPException: If the hashing pool is saturated (503 Service Unavailable).
         """
-        return self.pwd_context.hash(password)
+        return await self._run_hashing(_hash_password, password)
 
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
         """
@@ -105,14 +129,15 @@ class Auth:
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
         """
         Retrieves the current authenticated user based on the provided access token.
+        The user is served from the user cache when possible, so most requests do not touch the database.
 
         :param token: The access token used for authentication.
         :type token: str
         :param db: The database session used to query user information.
-        :type db: Session
+        :type db: AsyncSession
         :return: The user associated with the token if valid.
         :rtype: User
         :raises HTTPException: If the token is invalid or the user does not exist.
@@ -135,9 +160,13 @@ class Auth:
         except JWTError as e:
             raise credentials_exception
 
-        user = await repository_users.get_user_by_email(email, db)
+        user = await user_cache.get(email)
         if user is None:
-            raise credentials_exception
+            generation = await user_cache.generation(email)
+            user = await repository_users.get_user_by_email(email, db)
+            if user is None:
+                raise credentials_exception
+            await user_cache.set(user, generation)
         return user
 
     def create_email_token(self, data: dict):
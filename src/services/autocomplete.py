@@ -0,0 +1,192 @@
+import sys
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
+
+from src.conf.config import settings
+
+ContactName = Tuple[int, str, str]
+# approximate bytes of a list slot plus its (token, id) tuple, and of a names entry
+ENTRY_OVERHEAD = 64
+NAME_SIZE = 160
+
+
+class UserIndex:
+    """
+    Prefix index over the contact names of one user: a sorted list of ``(token, contact id)`` pairs,
+    where the tokens of a contact are its lower-cased name, surname, "name surname" and each word of
+    multi-word names, so "anne" finds "Mary Anne".
+    A lookup is a binary search followed by a scan over the matching range.
+    """
+
+    def __init__(self, contacts: Iterable[ContactName]):
+        self.names: dict[int, Tuple[str, str]] = {}
+        entries = []
+        for contact_id, name, surname in contacts:
+            self.names[contact_id] = (name, surname)
+            entries.extend((token, contact_id) for token in self._tokens(name, surname))
+        entries.sort()
+        self.entries: List[Tuple[str, int]] = entries
+        self.bytes = sum(self._entry_size(token) for token, _ in entries) + NAME_SIZE * len(self.names)
+        self.built_at = time.monotonic()
+
+    @staticmethod
+    def _tokens(name: str, surname: str) -> set[str]:
+        name, surname = name.lower(), surname.lower()
+        return {name, surname, f"{name} {surname}", *name.split(), *surname.split()}
+
+    @staticmethod
+    def _entry_size(token: str) -> int:
+        return sys.getsizeof(token) + ENTRY_OVERHEAD
+
+    def add(self, contact_id: int, name: str, surname: str) -> None:
+        self.remove(contact_id)
+        self.names[contact_id] = (name, surname)
+        self.bytes += NAME_SIZE
+        for token in self._tokens(name, surname):
+            insort(self.entries, (token, contact_id))
+            self.bytes += self._entry_size(token)
+
+    def remove(self, contact_id: int) -> None:
+        names = self.names.pop(contact_id, None)
+        if names is None:
+            return
+        self.bytes -= NAME_SIZE
+        for token in self._tokens(*names):
+            i = bisect_left(self.entries, (token, contact_id))
+            if i < len(self.entries) and self.entries[i] == (token, contact_id):
+                del self.entries[i]
+                self.bytes -= self._entry_size(token)
+
+    def search(self, prefix: str, limit: int) -> List[ContactName]:
+        prefix = prefix.lower()
+        result, seen = [], set()
+        for i in range(bisect_left(self.entries, (prefix, -1)), len(self.entries)):
+            token, contact_id = self.entries[i]
+            if not token.startswith(prefix):
+                break
+            if contact_id not in seen:
+                seen.add(contact_id)
+                result.append((contact_id, *self.names[contact_id]))
+                if len(result) >= limit:
+                    break
+        return result
+
+    @property
+    def size(self) -> int:
+        """
+        Approximate memory footprint in bytes, kept up to date by :meth:`add` and :meth:`remove`.
+        """
+        return self.bytes
+
+
+class AutocompleteIndex:
+    """
+    Per-worker cache of :class:`UserIndex` objects, built lazily on the first lookup of a user.
+
+    Users are evicted least recently used first whenever ``max_bytes`` is exceeded, after a build or after
+    a loaded index grew, and an index older than ``ttl`` seconds is rebuilt, which bounds staleness caused by
+    writes handled by other workers. The contacts repository keeps loaded indexes current through :meth:`add`,
+    :meth:`remove` and :meth:`discard`; an index whose load overlapped such a write is used for that lookup
+    only and not kept.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.total_bytes = 0
+        self.users: OrderedDict[int, Tuple[UserIndex, int]] = OrderedDict()
+        # user id -> [loads in flight, writes seen since the first of them started]
+        self.loading: Dict[int, List[int]] = {}
+
+    async def search(self, user_id: int, prefix: str, limit: int,
+                     loader: Callable[[], Awaitable[Iterable[ContactName]]]) -> List[ContactName]:
+        """
+        Returns up to ``limit`` contacts of a user whose name, surname or full name starts with ``prefix``.
+
+        :param user_id: The owner of the contacts.
+        :type user_id: int
+        :param prefix: The typed prefix.
+        :type prefix: str
+        :param limit: The maximum number of suggestions.
+        :type limit: int
+        :param loader: Loads ``(id, name, surname)`` of all the user's contacts when the index must be built.
+        :type loader: Callable[[], Awaitable[Iterable[ContactName]]]
+        :return: ``(id, name, surname)`` of the matching contacts, ordered by the matched token.
+        :rtype: List[ContactName]
+        """
+        item = self.users.get(user_id)
+        if item is None or time.monotonic() - item[0].built_at > self.ttl:
+            state = self.loading.setdefault(user_id, [0, 0])
+            state[0] += 1
+            writes = state[1]
+            try:
+                index = UserIndex(await loader())
+            finally:
+                state[0] -= 1
+                if not state[0]:
+                    del self.loading[user_id]
+            if state[1] == writes:
+                self._store(user_id, index)
+        else:
+            index = item[0]
+            self.users.move_to_end(user_id)
+        return index.search(prefix, limit)
+
+    def _store(self, user_id: int, index: UserIndex) -> None:
+        self._drop(user_id)
+        size = index.size
+        self.users[user_id] = (index, size)
+        self.total_bytes += size
+        self._evict()
+
+    def _recharge(self, user_id: int, index: UserIndex, charged: int) -> None:
+        self.users[user_id] = (index, index.size)
+        self.total_bytes += index.size - charged
+        self._evict()
+
+    def _evict(self) -> None:
+        # least recently used first; an index larger than the whole cap is not kept either
+        while self.total_bytes > self.max_bytes and self.users:
+            self._drop(next(iter(self.users)))
+
+    def _written(self, user_id: int) -> None:
+        state = self.loading.get(user_id)
+        if state is not None:
+            state[1] += 1
+
+    def add(self, user_id: int, contact_id: int, name: str, surname: str) -> None:
+        """
+        Adds or replaces a contact in the user's index if it is loaded.
+        """
+        self._written(user_id)
+        item = self.users.get(user_id)
+        if item is not None:
+            item[0].add(contact_id, name, surname)
+            self._recharge(user_id, *item)
+
+    def remove(self, user_id: int, contact_id: int) -> None:
+        """
+        Removes a contact from the user's index if it is loaded.
+        """
+        self._written(user_id)
+        item = self.users.get(user_id)
+        if item is not None:
+            item[0].remove(contact_id)
+            self._recharge(user_id, *item)
+
+    def discard(self, user_id: int) -> None:
+        """
+        Drops the user's index, e.g. after a bulk change; it is rebuilt on the next lookup.
+        """
+        self._written(user_id)
+        self._drop(user_id)
+
+    def _drop(self, user_id: int) -> None:
+        item = self.users.pop(user_id, None)
+        if item is not None:
+            self.total_bytes -= item[1]
+
+
+autocomplete_index = AutocompleteIndex(max_bytes=settings.autocomplete_max_bytes, ttl=settings.autocomplete_ttl)
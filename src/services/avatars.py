@@ -0,0 +1,336 @@
+import hashlib
+import json
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Dict, Sequence
+
+import cloudinary
+import cloudinary.exceptions
+import cloudinary.uploader
+from fastapi import HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.db import AsyncSessionLocal
+from src.database.models import User
+from src.repository import users as repository_users
+from src.services.cache import LRUCache
+from src.services.images import THUMBNAIL_EXTENSION, make_thumbnails
+from src.services.workers import BoundedExecutor
+
+AVATAR_CONTENT_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
+CHUNK_SIZE = 64 * 1024
+PLACEHOLDER_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 256 256" width="256" height="256">'
+    '<rect width="256" height="256" fill="#d5d9de"/>'
+    '<circle cx="128" cy="100" r="48" fill="#f4f5f7"/>'
+    '<path d="M40 232c0-52 40-80 88-80s88 28 88 80z" fill="#f4f5f7"/>'
+    '</svg>'
+)
+
+
+class AvatarStorageError(Exception):
+    """
+    Raised when a storage backend fails to store an avatar.
+    """
+
+
+class AvatarStorage(ABC):
+    """
+    Base class of avatar storage backends; a backend that does not implement :meth:`save` cannot be created.
+    """
+
+    @abstractmethod
+    async def save(self, owner: str, data: bytes, content_type: str) -> str:
+        """
+        Stores the avatar of ``owner``.
+
+        :param owner: The username of the owner.
+        :type owner: str
+        :param data: The uploaded image.
+        :type data: bytes
+        :param content_type: The MIME type of the image.
+        :type content_type: str
+        :return: The public URL of the avatar.
+        :rtype: str
+        :raises AvatarStorageError: If the avatar could not be stored.
+        :raises InvalidImage: If the backend decodes the image and it is not valid.
+        :raises WorkerPoolBusy: If too many uploads are in flight.
+        """
+
+
+class CloudinaryStorage(AvatarStorage):
+    """
+    Uploads avatars to Cloudinary, in a worker thread, and serves them resized to 250x250.
+    The SDK is configured once, when the storage is created.
+    """
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str, executor: BoundedExecutor):
+        cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+        self.executor = executor
+
+    def _upload(self, owner: str, data: bytes) -> str:
+        public_id = f'NotesApp/{owner}'
+        try:
+            r = cloudinary.uploader.upload(BytesIO(data), public_id=public_id, overwrite=True)
+        except cloudinary.exceptions.Error as e:
+            raise AvatarStorageError(str(e)) from e
+        return cloudinary.CloudinaryImage(public_id).build_url(width=250, height=250, crop='fill',
+                                                               version=r.get('version'))
+
+    async def save(self, owner: str, data: bytes, content_type: str) -> str:
+        return await self.executor.run(self._upload, owner, data)
+
+
+class DerivativeCache:
+    """
+    In-process LRU of avatar files bounded by their total size in bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[str, bytes] = OrderedDict()
+
+    def get(self, name: str) -> bytes | None:
+        data = self._data.get(name)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(name)
+        return data
+
+    def set(self, name: str, data: bytes) -> None:
+        if len(data) > self.max_bytes or name in self._data:
+            return
+        self._data[name] = data
+        self.total_bytes += len(data)
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+    def snapshot(self) -> dict:
+        return {"entries": len(self._data), "bytes": self.total_bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+
+class LocalStorage(AvatarStorage):
+    """
+    Keeps avatars on the local filesystem as content-addressed WebP thumbnails.
+
+    An upload is decoded once and rendered in every size of ``sizes`` in a process pool. The files are named
+    after the SHA-256 of the upload and the size (``<digest>_<size>.webp``), so a name always denotes the same
+    bytes: identical uploads share files and the files can be cached by clients forever. They are served by
+    ``GET /api/users/avatars/{name}`` through an in-memory LRU of hot files, and the avatar URL of a user
+    points to the ``default_size`` thumbnail.
+    """
+
+    def __init__(self, root: str | Path, base_url: str, executor: BoundedExecutor, image_executor: BoundedExecutor,
+                 sizes: Sequence[int] = (64, 128, 256), default_size: int = 256, max_pixels: int = 40_000_000,
+                 cache_bytes: int = 32 * 1024 * 1024):
+        if default_size not in sizes:
+            raise ValueError(f"Default avatar size {default_size} is not one of {list(sizes)}")
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+        self.executor = executor
+        self.image_executor = image_executor
+        self.sizes = tuple(sizes)
+        self.default_size = default_size
+        self.max_pixels = max_pixels
+        self.cache = DerivativeCache(cache_bytes)
+
+    @staticmethod
+    def name(digest: str, size: int) -> str:
+        return f"{digest}_{size}{THUMBNAIL_EXTENSION}"
+
+    def _write(self, digest: str, thumbnails: Dict[int, bytes]) -> None:
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            for size, data in thumbnails.items():
+                path = self.root / self.name(digest, size)
+                if path.exists():
+                    continue
+                tmp = self.root / f".{path.name}.{uuid.uuid4().hex}"
+                tmp.write_bytes(data)
+                tmp.replace(path)
+        except OSError as e:
+            raise AvatarStorageError(str(e)) from e
+
+    async def save(self, owner: str, data: bytes, content_type: str) -> str:
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        if not (self.root / self.name(digest, self.default_size)).exists():
+            thumbnails = await self.image_executor.run(make_thumbnails, data, self.sizes, self.max_pixels)
+            await self.executor.run(self._write, digest, thumbnails)
+        return f"{self.base_url}/{self.name(digest, self.default_size)}"
+
+    async def read(self, name: str) -> bytes | None:
+        """
+        Returns a stored avatar file, from memory when it is hot.
+
+        :param name: The file name from the avatar URL.
+        :type name: str
+        :return: The WebP image, or None if there is no such file.
+        :rtype: bytes | None
+        """
+        data = self.cache.get(name)
+        if data is not None:
+            return data
+        path = self.root / name
+        if path.parent != self.root:
+            return None
+        try:
+            data = await run_in_threadpool(path.read_bytes)
+        except FileNotFoundError:
+            return None
+        self.cache.set(name, data)
+        return data
+
+
+def create_storage() -> AvatarStorage:
+    """
+    Creates the storage backend selected by ``avatar_storage``: ``local`` or ``cloudinary``.
+
+    :return: The storage backend.
+    :rtype: AvatarStorage
+    :raises ValueError: If the backend is unknown.
+    """
+    if settings.avatar_storage == "local":
+        return LocalStorage(settings.avatar_local_dir, settings.avatar_local_url, avatar_executor, image_executor,
+                            sizes=settings.avatar_sizes, default_size=settings.avatar_default_size,
+                            max_pixels=settings.avatar_max_pixels, cache_bytes=settings.avatar_cache_bytes)
+    if settings.avatar_storage == "cloudinary":
+        return CloudinaryStorage(settings.cloudinary_name, settings.cloudinary_api_key,
+                                 settings.cloudinary_api_secret, avatar_executor)
+    raise ValueError(f"Unknown avatar storage: {settings.avatar_storage}")
+
+
+class AvatarJobs:
+    """
+    Status of deferred avatar uploads, kept in Redis for ``ttl`` seconds so any worker can report it,
+    or in-process without Redis.
+    """
+
+    prefix = "avatar:job:"
+
+    def __init__(self, redis: Redis | None = None, ttl: int = 3600):
+        self.redis = redis
+        self.ttl = ttl
+        self.local = LRUCache(10_000, ttl)
+
+    async def set(self, job_id: str, job: dict) -> None:
+        """
+        Stores the state of a job: ``user_id``, ``status`` and the resulting ``avatar`` or error ``detail``.
+        """
+        self.local.set(job_id, job)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.prefix + job_id, json.dumps(job), ex=self.ttl)
+            except RedisError:
+                pass
+
+    async def get(self, job_id: str) -> dict | None:
+        """
+        Returns the state of a job, or None if it is unknown or expired.
+        """
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self.prefix + job_id)
+            except RedisError:
+                raw = None
+            if raw is not None:
+                return json.loads(raw)
+        return self.local.get(job_id)
+
+
+class AvatarService:
+    """
+    Avatar upload pipeline: validates and reads the upload with a size cap, hands it to the configured
+    storage backend, which keeps blocking and CPU-bound work off the event loop, and updates the user.
+    Uploads can also be deferred to a background task whose progress is tracked in :class:`AvatarJobs`.
+    """
+
+    def __init__(self, storage: AvatarStorage, jobs: AvatarJobs, max_bytes: int,
+                 session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self.storage = storage
+        self.jobs = jobs
+        self.max_bytes = max_bytes
+        self.session_factory = session_factory
+
+    async def read(self, file: UploadFile, content_length: int | None = None) -> bytes:
+        """
+        Reads an uploaded avatar, rejecting files that are not images or are larger than ``max_bytes``.
+
+        :param file: The uploaded file.
+        :type file: UploadFile
+        :param content_length: The Content-Length of the request, checked before reading anything.
+        :type content_length: int | None
+        :return: The image.
+        :rtype: bytes
+        :raises HTTPException: 415 if the file is not a supported image, 413 if it is too large.
+        """
+        if file.content_type not in AVATAR_CONTENT_TYPES:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                                detail=f"Avatar must be one of: {', '.join(sorted(AVATAR_CONTENT_TYPES))}")
+        too_large = HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                  detail=f"Avatar must not exceed {self.max_bytes} bytes")
+        # multipart framing adds a few hundred bytes around the file
+        if content_length is not None and content_length > self.max_bytes + 16 * 1024:
+            raise too_large
+        data = bytearray()
+        while chunk := await file.read(CHUNK_SIZE):
+            data += chunk
+            if len(data) > self.max_bytes:
+                raise too_large
+        return bytes(data)
+
+    async def store(self, user: User, data: bytes, content_type: str) -> str:
+        """
+        Stores an avatar with the storage backend.
+
+        :return: The public URL of the avatar.
+        :rtype: str
+        :raises AvatarStorageError: If the backend failed.
+        :raises InvalidImage: If the image cannot be decoded.
+        :raises WorkerPoolBusy: If too many uploads are in flight.
+        """
+        return await self.storage.save(user.username, data, content_type)
+
+    async def defer(self, user: User) -> str:
+        """
+        Registers a deferred upload of the user's avatar.
+
+        :return: The job ID.
+        :rtype: str
+        """
+        job_id = uuid.uuid4().hex
+        await self.jobs.set(job_id, {"user_id": user.id, "status": "pending"})
+        return job_id
+
+    async def run_job(self, job_id: str, user: User, data: bytes, content_type: str) -> None:
+        """
+        Stores an avatar and updates the user in the background, recording the outcome of the job.
+        """
+        try:
+            url = await self.store(user, data, content_type)
+            async with self.session_factory() as db:
+                await repository_users.update_avatar(user.email, url, db)
+        except Exception as e:
+            await self.jobs.set(job_id, {"user_id": user.id, "status": "failed", "detail": str(e) or repr(e)})
+        else:
+            await self.jobs.set(job_id, {"user_id": user.id, "status": "done", "avatar": url})
+
+
+avatar_executor = BoundedExecutor("avatar-upload", max_workers=settings.avatar_upload_workers,
+                                  max_pending=settings.avatar_upload_max_pending)
+image_executor = BoundedExecutor("avatar-images", max_workers=settings.avatar_image_workers,
+                                 max_pending=settings.avatar_image_max_pending, kind="process")
+avatar_service = AvatarService(create_storage(), AvatarJobs(), settings.avatar_max_bytes)
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from contextlib import aclosing
+from datetime import date
+from typing import Callable, List
+
+from aiosmtplib import SMTPException
+from redis.exceptions import RedisError
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.repository.contacts import next_birthday, stream_birthdays_by_user
+from src.services.email import EmailQueue, Mailer, make_message, templates
+from src.services.metrics import Histogram
+
+TEMPLATE = "birthday_digest.html"
+SUBJECT = "Upcoming birthdays of your contacts"
+
+
+class BirthdayDigest:
+    """
+    Sends every confirmed user one email listing their contacts with a birthday in the next ``days`` days.
+
+    Users are streamed from a single query and their digests are sent while the query is still being read:
+    at most ``concurrency`` sends are in flight, which also bounds how far reading runs ahead. The template
+    is compiled once per run. Reading stops once ``budget`` seconds have passed; the in-flight sends are
+    finished and ``last_user_id`` tells where the next run should resume. Digests that fail to send are
+    handed to the email queue for retries when one is given.
+    """
+
+    def __init__(self, mailer: Mailer, days: int = 7, concurrency: int = 50, budget: float = 3600,
+                 batch_size: int = 1000, queue: EmailQueue | None = None, progress_interval: float = 10,
+                 report: Callable[[dict], None] | None = None):
+        self.mailer = mailer
+        self.days = days
+        self.concurrency = concurrency
+        self.budget = budget
+        self.batch_size = batch_size
+        self.queue = queue
+        self.progress_interval = progress_interval
+        self.report = report
+        self.template = templates.get_template(TEMPLATE)
+        self.users = 0
+        self.contacts = 0
+        self.sent = 0
+        self.queued = 0
+        self.failed = 0
+        self.last_user_id = 0
+        self.timed_out = False
+        self.started_at = None
+        self.latency = Histogram()
+
+    @staticmethod
+    def context(user: Row, contacts: List[Row], today: date) -> dict:
+        """
+        Returns the JSON-serializable template context of a user's digest.
+
+        :param user: The user's ``id``, ``username`` and ``email``.
+        :type user: Row
+        :param contacts: The ``name``, ``surname`` and ``birthday`` of the contacts.
+        :type contacts: List[Row]
+        :param today: The current date.
+        :type today: date
+        :return: The template context.
+        :rtype: dict
+        """
+        items = []
+        for contact in contacts:
+            upcoming = next_birthday(contact.birthday, today)
+            items.append({"name": contact.name, "surname": contact.surname,
+                          "date": f"{upcoming:%B} {upcoming.day}", "days": (upcoming - today).days})
+        return {"username": user.username, "contacts": items}
+
+    async def _send(self, user: Row, contacts: List[Row], today: date, slots: asyncio.Semaphore) -> None:
+        context = self.context(user, contacts, today)
+        start = time.perf_counter()
+        try:
+            await self.mailer.send(make_message(user.email, SUBJECT, self.template.render(**context)))
+            self.sent += 1
+        except (SMTPException, OSError, asyncio.TimeoutError):
+            await self._retry_later(user, context)
+        finally:
+            self.latency.observe(time.perf_counter() - start)
+            slots.release()
+
+    async def _retry_later(self, user: Row, context: dict) -> None:
+        if self.queue is not None and self.queue.redis is not None:
+            try:
+                await self.queue.enqueue(user.email, SUBJECT, TEMPLATE, context)
+                self.queued += 1
+                return
+            except RedisError:
+                pass
+        self.failed += 1
+
+    async def run(self, db: AsyncSession, today: date | None = None, after_user_id: int = 0) -> dict:
+        """
+        Sends the digests of all users with an ID greater than ``after_user_id``, until done or out of budget.
+
+        :param db: The database session.
+        :type db: AsyncSession
+        :param today: The first day of the window, today by default.
+        :type today: date | None
+        :param after_user_id: The ``last_user_id`` of an interrupted run.
+        :type after_user_id: int
+        :return: The final progress metrics, see :meth:`snapshot`.
+        :rtype: dict
+        """
+        today = today or date.today()
+        self.started_at = time.monotonic()
+        self.last_user_id = after_user_id
+        deadline = self.started_at + self.budget
+        next_report = self.started_at + self.progress_interval
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        rows = stream_birthdays_by_user(today, self.days, db, after_user_id, self.batch_size)
+        async with aclosing(rows):
+            async for user, contacts in rows:
+                await slots.acquire()
+                if time.monotonic() >= deadline:
+                    slots.release()
+                    self.timed_out = True
+                    break
+                task = asyncio.create_task(self._send(user, contacts, today, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                self.users += 1
+                self.contacts += len(contacts)
+                self.last_user_id = user.id
+                if self.report is not None and time.monotonic() >= next_report:
+                    self.report(self.snapshot())
+                    next_report = time.monotonic() + self.progress_interval
+        await asyncio.gather(*tasks)
+        snapshot = self.snapshot()
+        if self.report is not None:
+            self.report(snapshot)
+        return snapshot
+
+    def snapshot(self) -> dict:
+        """
+        Returns the progress of the run: users and contacts read, digests sent, queued for retry and failed,
+        throughput, send latency and whether the run stopped at the time budget.
+
+        :return: Progress metrics.
+        :rtype: dict
+        """
+        elapsed = time.monotonic() - self.started_at if self.started_at is not None else 0.0
+        return {
+            "users": self.users,
+            "contacts": self.contacts,
+            "sent": self.sent,
+            "queued": self.queued,
+            "failed": self.failed,
+            "in_flight": self.users - self.sent - self.queued - self.failed,
+            "last_user_id": self.last_user_id,
+            "timed_out": self.timed_out,
+            "elapsed_seconds": round(elapsed, 3),
+            "users_per_second": round(self.users / elapsed, 1) if elapsed else 0.0,
+            "send_latency_seconds": self.latency.snapshot(),
+        }
@@ -0,0 +1,365 @@
+import hashlib
+import json
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Hashable, Iterable
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from src.conf.config import settings
+from src.database.models import User
+
+# Caches a user only if no invalidation happened since the caller read the generation (KEYS[2]).
+SET_IF_CURRENT_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+class LRUCache:
+    """
+    A small in-process LRU cache whose entries also expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any | None:
+        """
+        Returns the cached value for ``key`` or None if it is missing or expired.
+
+        :param key: The cache key.
+        :type key: Hashable
+        :return: The cached value or None.
+        :rtype: Any | None
+        """
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Stores ``value`` under ``key``, evicting the least recently used entry when full.
+
+        :param key: The cache key.
+        :type key: Hashable
+        :param value: The value to cache.
+        :type value: Any
+        """
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Removes ``key`` from the cache if present.
+
+        :param key: The cache key.
+        :type key: Hashable
+        """
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Removes every entry.
+        """
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class UserCache:
+    """
+    Two-tier cache of authenticated users keyed by email: a short-lived in-process LRU in front of Redis.
+
+    Only public profile columns are cached (never the password hash or the refresh token). The local tier
+    is per worker, so its TTL bounds how long other workers may serve a user after an invalidation.
+    Redis errors are swallowed: the cache then simply misses and the caller falls back to the database.
+
+    Every invalidation advances a per-email generation, in Redis and in the worker. Callers read the
+    :meth:`generation` before loading the user from the database and pass it to :meth:`set`, which skips
+    a tier whose generation moved on meanwhile, so a row read before a write cannot be cached after it.
+    """
+
+    prefix = "user:"
+
+    def __init__(self, redis: Redis | None = None, ttl: int = 300, local_ttl: float = 10, local_maxsize: int = 1024):
+        self.redis = redis
+        self.ttl = ttl
+        self.local = LRUCache(local_maxsize, local_ttl)
+        # email -> number of the last local invalidation, kept as long as a Redis entry may live
+        self.invalidated = LRUCache(local_maxsize, ttl)
+        self.invalidations = 0
+        self._script = None
+        self._script_client = None
+
+    def _generation_key(self, email: str) -> str:
+        return f"{self.prefix}generation:{email}"
+
+    def _set_if_current(self):
+        if self._script is None or self._script_client is not self.redis:
+            self._script = self.redis.register_script(SET_IF_CURRENT_SCRIPT)
+            self._script_client = self.redis
+        return self._script
+
+    @staticmethod
+    def _dump(user: User) -> dict:
+        return {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "created_at": user.created_at.isoformat() if user.created_at else None,
+            "avatar": user.avatar,
+            "confirmed": user.confirmed,
+            "plan": user.plan,
+        }
+
+    @staticmethod
+    def _load(data: dict) -> User:
+        data = dict(data)
+        if data["created_at"]:
+            data["created_at"] = datetime.fromisoformat(data["created_at"])
+        user = User(**data)
+        make_transient_to_detached(user)
+        return user
+
+    async def get(self, email: str) -> User | None:
+        """
+        Returns a detached ``User`` built from the cache, or None on a miss.
+
+        :param email: The email of the user.
+        :type email: str
+        :return: The cached user or None.
+        :rtype: User | None
+        """
+        data = self.local.get(email)
+        if data is None and self.redis is not None:
+            try:
+                raw = await self.redis.get(self.prefix + email)
+            except RedisError:
+                raw = None
+            if raw is not None:
+                data = json.loads(raw)
+                self.local.set(email, data)
+        return self._load(data) if data is not None else None
+
+    async def generation(self, email: str) -> tuple[int, int | None]:
+        """
+        Returns the current invalidation generation of a user; read it before loading the user from the
+        database and pass it to :meth:`set`.
+
+        :param email: The email of the user.
+        :type email: str
+        :return: The local invalidation counter and the Redis generation, or None for the latter when Redis
+            is unavailable.
+        :rtype: tuple[int, int | None]
+        """
+        remote = None
+        if self.redis is not None:
+            try:
+                remote = int(await self.redis.get(self._generation_key(email)) or 0)
+            except RedisError:
+                pass
+        return self.invalidations, remote
+
+    async def set(self, user: User, generation: tuple[int, int | None]) -> None:
+        """
+        Caches the given user in both tiers, skipping each tier in which the user was invalidated after
+        ``generation`` was read.
+
+        :param user: The user loaded from the database.
+        :type user: User
+        :param generation: The result of :meth:`generation` read before the user was loaded.
+        :type generation: tuple[int, int | None]
+        """
+        local, remote = generation
+        data = self._dump(user)
+        if (self.invalidated.get(user.email) or 0) <= local:
+            self.local.set(user.email, data)
+        if self.redis is not None and remote is not None:
+            try:
+                await self._set_if_current()(keys=[self.prefix + user.email, self._generation_key(user.email)],
+                                             args=[remote, json.dumps(data), self.ttl])
+            except RedisError:
+                pass
+
+    async def invalidate(self, email: str) -> None:
+        """
+        Drops the user from both tiers and advances the user's generation; call it after every change to a
+        user row.
+
+        :param email: The email of the user.
+        :type email: str
+        """
+        self.invalidations += 1
+        self.invalidated.set(email, self.invalidations)
+        self.local.delete(email)
+        if self.redis is not None:
+            try:
+                # advance the generation first, so a stale set cannot slip in between
+                await self.redis.incr(self._generation_key(email))
+                await self.redis.expire(self._generation_key(email), self.ttl)
+                await self.redis.delete(self.prefix + email)
+            except RedisError:
+                pass
+
+
+class ResponseCache:
+    """
+    Caches serialized responses of the contact read endpoints in Redis, keyed by user, route, query
+    parameters and the user's contacts version, and answers conditional requests.
+
+    The version is the user's change sequence number (``users.change_seq``), which every write to the user's
+    contacts advances in its own transaction (see ``repository.contacts.next_change_seq``). It is read from
+    the database with a primary key lookup on each request, so a committed write invalidates every cached
+    response and ETag of the user on all workers at once, whether or not Redis is reachable; old entries simply
+    expire after ``ttl`` seconds. The version is read before the response is loaded, so a cached body is never
+    older than its key. Version and parameters yield a weak ETag, so a matching ``If-None-Match`` is answered
+    with 304 before the response is loaded. Without Redis or on a Redis error the response is loaded from the
+    database as if there was no cache. Routes listed in ``disabled`` still get ETags but their bodies are not
+    cached.
+    """
+
+    prefix = "contacts:"
+
+    def __init__(self, redis: Redis | None = None, ttl: int = 300, disabled: Iterable[str] = ()):
+        self.redis = redis
+        self.ttl = ttl
+        self.disabled = set(disabled)
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+        self.not_modified: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+
+    def enabled(self, route: str) -> bool:
+        """
+        Tells whether responses of ``route`` are cached.
+
+        :param route: The route name.
+        :type route: str
+        :return: True if Redis is available and the route is not disabled.
+        :rtype: bool
+        """
+        return self.redis is not None and route not in self.disabled
+
+    @staticmethod
+    async def version(user: User, db: AsyncSession) -> int:
+        """
+        Returns the contacts version of a user: the sequence number of the last committed write.
+
+        :param user: The user.
+        :type user: User
+        :param db: The database session.
+        :type db: AsyncSession
+        :return: The user's change sequence number.
+        :rtype: int
+        """
+        return await db.scalar(select(User.change_seq).filter(User.id == user.id)) or 0
+
+    @staticmethod
+    def _if_none_match(request: Request | None) -> list[str]:
+        header = request.headers.get("if-none-match") if request is not None else None
+        if not header:
+            return []
+        return [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+    async def fetch(self, route: str, user: User, db: AsyncSession, params: dict, load: Callable[[], Awaitable[Any]],
+                    adapter: TypeAdapter, request: Request | None = None) -> Response:
+        """
+        Returns the cached JSON response of a read endpoint, or loads, serializes and caches it on a miss.
+        Responses carry a weak ``ETag``; when ``request`` has a matching ``If-None-Match`` an empty 304 response
+        is returned without calling ``load``. ``If-None-Match: *`` only matches once the response was found in
+        the cache or loaded, i.e. the resource exists.
+        Exceptions raised by ``load`` (e.g. a 404) propagate and nothing is cached.
+
+        :param route: The route name, used in the key, the metrics and the off switch.
+        :type route: str
+        :param user: The current user.
+        :type user: User
+        :param db: The database session, used to read the user's contacts version.
+        :type db: AsyncSession
+        :param params: The query parameters that determine the response.
+        :type params: dict
+        :param load: Produces the response data from the database.
+        :type load: Callable[[], Awaitable[Any]]
+        :param adapter: Validates and serializes the data as the route's response model.
+        :type adapter: TypeAdapter
+        :param request: The incoming request, checked for ``If-None-Match``.
+        :type request: Request | None
+        :return: A JSON or 304 response.
+        :rtype: Response
+        """
+        version = await self.version(user, db)
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        key = f"{self.prefix}{user.id}:{version}:{route}:{digest}"
+        headers = {"ETag": f'W/"{version}-{digest[:16]}"', "Cache-Control": "private, no-cache"}
+        tags = self._if_none_match(request)
+        if headers["ETag"].removeprefix("W/") in tags:
+            self.not_modified[route] += 1
+            return Response(status_code=304, headers=headers)
+        cached = self.enabled(route)
+        if cached:
+            try:
+                raw = await self.redis.get(key)
+            except RedisError:
+                self.errors[route] += 1
+                cached = False
+            else:
+                if raw is not None:
+                    if "*" in tags:
+                        self.not_modified[route] += 1
+                        return Response(status_code=304, headers=headers)
+                    self.hits[route] += 1
+                    return Response(content=raw, media_type="application/json", headers=headers)
+        body = adapter.dump_json(adapter.validate_python(await load(), from_attributes=True))
+        if cached:
+            self.misses[route] += 1
+            try:
+                await self.redis.set(key, body, ex=self.ttl)
+            except RedisError:
+                self.errors[route] += 1
+        if "*" in tags:
+            self.not_modified[route] += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def snapshot(self) -> dict:
+        """
+        Returns hit, miss, 304 and error counters per route.
+
+        :return: Cache statistics.
+        :rtype: dict
+        """
+        routes = set(self.hits) | set(self.misses) | set(self.not_modified) | set(self.errors)
+        return {
+            "enabled": self.redis is not None,
+            "disabled_routes": sorted(self.disabled),
+            "routes": {route: {"hits": self.hits[route], "misses": self.misses[route],
+                               "not_modified": self.not_modified[route], "errors": self.errors[route]}
+                       for route in sorted(routes)},
+        }
+
+
+user_cache = UserCache(ttl=settings.user_cache_ttl, local_ttl=settings.user_cache_local_ttl,
+                       local_maxsize=settings.user_cache_local_size)
+response_cache = ResponseCache(ttl=settings.response_cache_ttl, disabled=settings.response_cache_disabled_routes)
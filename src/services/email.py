@@ -1,30 +1,406 @@
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from email.charset import QP, Charset
+from email.header import Header
+from email.message import Message
+from email.mime.text import MIMEText
+from email.utils import formataddr
 from pathlib import Path
+from typing import Any, Dict, List, Tuple
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+from aiosmtplib import (SMTP, SMTPException, SMTPRecipientsRefused, SMTPResponseException,
+                        SMTPServerDisconnected)
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pydantic import EmailStr
+from redis.asyncio import Redis
+from redis.exceptions import RedisError, ResponseError
 
 from src.conf.config import settings
 from src.services.auth import auth_service
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME="Desired Name",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+logger = logging.getLogger(__name__)
 
+templates = Environment(loader=FileSystemLoader(Path(__file__).parent / 'templates'),
+                        autoescape=select_autoescape(["html"]))
 
-async def send_email(email: EmailStr, username: str, host: str):
+Job = Dict[str, Any]
+
+UTF8 = Charset("utf-8")
+UTF8.body_encoding = QP
+
+# Moves the retries that are due back onto the jobs stream; atomic, so a job is never promoted twice
+# or lost between the two keys when several workers run it at once.
+PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, job in ipairs(due) do
+    redis.call('ZREM', KEYS[1], job)
+    redis.call('XADD', KEYS[2], '*', 'job', job)
+end
+return #due
+"""
+
+
+def make_message(to: str, subject: str, html: str) -> Message:
+    """
+    Builds an HTML message from the configured sender.
+
+    The legacy ``MIMEText`` API is used on purpose: the header parsing of ``EmailMessage`` costs more
+    than rendering the template, which matters when the birthday digest builds millions of messages.
+
+    :param to: The recipient.
+    :type to: str
+    :param subject: The subject line.
+    :type subject: str
+    :param html: The rendered body.
+    :type html: str
+    :return: The message.
+    :rtype: Message
+    """
+    message = MIMEText(html, "html", UTF8)
+    message["From"] = formataddr((settings.mail_from_name, settings.mail_from), charset="utf-8")
+    message["To"] = to
+    message["Subject"] = subject if subject.isascii() else Header(subject, UTF8)
+    return message
+
+
+def build_message(job: Job) -> Message:
+    """
+    Renders the template of an email job into a message.
+
+    :param job: The job: ``to``, ``subject``, ``template`` and the template ``context``.
+    :type job: Job
+    :return: The HTML message.
+    :rtype: Message
+    """
+    return make_message(job["to"], job["subject"], templates.get_template(job["template"]).render(**job["context"]))
+
+
+class Mailer:
+    """
+    A pool of up to ``size`` SMTP connections that stay open between messages.
+
+    Connections are opened on first use and reopened once if the server dropped them while idle;
+    at most ``size`` messages are sent at the same time.
+    """
+
+    def __init__(self, hostname: str, port: int, username: str | None = None, password: str | None = None,
+                 use_tls: bool = False, start_tls: bool = False, timeout: float = 30, size: int = 5):
+        self.options = dict(hostname=hostname, port=port, username=username, password=password,
+                            use_tls=use_tls, start_tls=start_tls, timeout=timeout)
+        self.size = size
+        self.connects = 0
+        self.sent = 0
+        self._idle: asyncio.Queue[SMTP] = asyncio.Queue()
+        for _ in range(size):
+            self._idle.put_nowait(SMTP(**self.options))
+
+    @classmethod
+    def from_settings(cls, size: int | None = None) -> "Mailer":
+        """
+        Creates a mailer for the SMTP server configured in the settings.
+
+        :param size: The number of connections, ``email_queue_concurrency`` by default.
+        :type size: int | None
+        :return: The mailer.
+        :rtype: Mailer
+        """
+        return cls(settings.mail_server, settings.mail_port, settings.mail_username, settings.mail_password,
+                   use_tls=settings.mail_ssl_tls, start_tls=settings.mail_starttls, timeout=settings.mail_timeout,
+                   size=size or settings.email_queue_concurrency)
+
+    async def _connect(self, client: SMTP) -> None:
+        if client.is_connected:
+            client.close()
+        await client.connect()
+        self.connects += 1
+
+    async def send(self, message: Message) -> None:
+        """
+        Sends a message over a pooled connection.
+
+        :param message: The message to send.
+        :type message: Message
+        :raises SMTPException: If the message could not be sent.
+        """
+        client = await self._idle.get()
+        try:
+            if not client.is_connected:
+                await self._connect(client)
+            try:
+                await client.send_message(message)
+            except SMTPServerDisconnected:
+                await self._connect(client)
+                await client.send_message(message)
+            self.sent += 1
+        except (SMTPException, OSError):
+            if client.is_connected:
+                client.close()
+            raise
+        finally:
+            self._idle.put_nowait(client)
+
+    async def close(self) -> None:
+        """
+        Closes every open connection.
+        """
+        while not self._idle.empty():
+            client = self._idle.get_nowait()
+            if client.is_connected:
+                try:
+                    await client.quit()
+                except (SMTPException, OSError):
+                    client.close()
+
+
+class EmailQueue:
+    """
+    Durable queue of email jobs in Redis.
+
+    Jobs are appended to a stream and read by workers through a consumer group, so a job a worker took but
+    never acknowledged (e.g. the worker crashed) is claimed by another worker after ``claim_idle`` seconds.
+    Failed jobs wait in a sorted set scored by their retry time, with exponential backoff and jitter, and
+    after ``max_attempts`` attempts, or on a permanent SMTP error, they are moved to a dead-letter stream.
+    Emails sent directly because Redis was unavailable are only counted, in ``direct_sent`` and
+    ``direct_failed``.
+    """
+
+    stream = "email:jobs"
+    retries = "email:retry"
+    dead = "email:dead"
+    group = "email-workers"
+
+    def __init__(self, redis: Redis | None = None, max_attempts: int = 5, backoff: float = 30,
+                 max_backoff: float = 3600, batch_size: int = 50, claim_idle: float = 300):
+        self.redis = redis
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.batch_size = batch_size
+        self.claim_idle = claim_idle
+        self._promote = None
+        self._promote_client = None
+        self.direct_sent = 0
+        self.direct_failed = 0
+
+    async def enqueue(self, to: str, subject: str, template: str, context: dict) -> str:
+        """
+        Adds an email job to the queue.
+
+        :param to: The recipient.
+        :type to: str
+        :param subject: The subject line.
+        :type subject: str
+        :param template: The template name in ``src/services/templates``.
+        :type template: str
+        :param context: The template variables; must be JSON-serializable.
+        :type context: dict
+        :return: The stream ID of the job.
+        :rtype: str
+        :raises RedisError: If Redis is unavailable.
+        """
+        job = {"id": uuid.uuid4().hex, "to": to, "subject": subject, "template": template,
+               "context": context, "attempts": 0}
+        return await self.redis.xadd(self.stream, {"job": json.dumps(job)})
+
+    async def ensure_group(self) -> None:
+        """
+        Creates the stream and its consumer group unless they exist.
+        """
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def promote_due(self) -> int:
+        """
+        Moves the jobs whose retry time has come back onto the stream.
+
+        :return: The number of jobs moved.
+        :rtype: int
+        """
+        if self._promote is None or self._promote_client is not self.redis:
+            self._promote = self.redis.register_script(PROMOTE_SCRIPT)
+            self._promote_client = self.redis
+        return int(await self._promote(keys=[self.retries, self.stream], args=[time.time(), self.batch_size]))
+
+    async def read_batch(self, consumer: str, block: int = 2000) -> List[Tuple[str, Job]]:
+        """
+        Returns up to ``batch_size`` jobs for a consumer: jobs abandoned by other consumers first, then new ones,
+        waiting up to ``block`` milliseconds for them.
+
+        :param consumer: The unique name of the worker.
+        :type consumer: str
+        :param block: How long to wait for new jobs, in milliseconds.
+        :type block: int
+        :return: ``(stream ID, job)`` pairs.
+        :rtype: List[Tuple[str, Job]]
+        """
+        _, messages, *_ = await self.redis.xautoclaim(self.stream, self.group, consumer,
+                                                      int(self.claim_idle * 1000), count=self.batch_size)
+        if not messages:
+            response = await self.redis.xreadgroup(self.group, consumer, {self.stream: ">"},
+                                                   count=self.batch_size, block=block)
+            messages = [message for _, stream_messages in response for message in stream_messages]
+        return [(message_id, json.loads(fields["job"])) for message_id, fields in messages if fields]
+
+    def backoff_for(self, attempts: int) -> float:
+        """
+        Returns the delay before the next attempt of a job that failed ``attempts`` times.
+
+        :param attempts: The number of failed attempts so far.
+        :type attempts: int
+        :return: The delay in seconds.
+        :rtype: float
+        """
+        delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+        return delay * random.uniform(0.8, 1.2)
+
+    async def complete(self, message_id: str) -> None:
+        """
+        Acknowledges and removes a sent job.
+        """
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(self.stream, self.group, message_id)
+            pipe.xdel(self.stream, message_id)
+            await pipe.execute()
+
+    async def fail(self, message_id: str, job: Job, error: Exception, permanent: bool = False) -> bool:
+        """
+        Schedules a failed job for a retry, or moves it to the dead-letter stream when it is out of attempts
+        or the error is permanent.
+
+        :param message_id: The stream ID of the job.
+        :type message_id: str
+        :param job: The job.
+        :type job: Job
+        :param error: The error of the last attempt.
+        :type error: Exception
+        :param permanent: Whether retrying cannot help.
+        :type permanent: bool
+        :return: True if the job will be retried, False if it was dead-lettered.
+        :rtype: bool
+        """
+        job = {**job, "attempts": job.get("attempts", 0) + 1, "error": repr(error)}
+        retry = not permanent and job["attempts"] < self.max_attempts
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if retry:
+                pipe.zadd(self.retries, {json.dumps(job): time.time() + self.backoff_for(job["attempts"])})
+            else:
+                pipe.xadd(self.dead, {"job": json.dumps(job), "failed_at": int(time.time())},
+                          maxlen=100_000, approximate=True)
+            pipe.xack(self.stream, self.group, message_id)
+            pipe.xdel(self.stream, message_id)
+            await pipe.execute()
+        return retry
+
+    async def stats(self) -> dict:
+        """
+        Returns the number of queued, in-progress, retrying and dead-lettered jobs.
+
+        :return: Queue statistics, or only the direct send counters without Redis.
+        :rtype: dict
+        """
+        direct = {"direct_sent": self.direct_sent, "direct_failed": self.direct_failed}
+        if self.redis is None:
+            return {"enabled": False, **direct}
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.xlen(self.stream)
+                pipe.zcard(self.retries)
+                pipe.xlen(self.dead)
+                queued, retrying, dead = await pipe.execute()
+            try:
+                pending = (await self.redis.xpending(self.stream, self.group))["pending"]
+            except ResponseError:
+                pending = 0
+        except RedisError as e:
+            return {"enabled": True, "error": repr(e), **direct}
+        return {"enabled": True, "queued": queued - pending, "in_progress": pending, "retrying": retrying,
+                "dead": dead, **direct}
+
+
+class EmailWorker:
+    """
+    Sends the jobs of an :class:`EmailQueue` in batches over the pooled connections of a :class:`Mailer`.
+    """
+
+    def __init__(self, queue: EmailQueue, mailer: Mailer):
+        self.queue = queue
+        self.mailer = mailer
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+
+    async def _send(self, message_id: str, job: Job) -> None:
+        try:
+            message = build_message(job)
+        except Exception as e:
+            await self.queue.fail(message_id, job, e, permanent=True)
+            self.dead += 1
+            logger.error("Email job %s is invalid: %r", job.get("id"), e)
+            return
+        try:
+            await self.mailer.send(message)
+        except (SMTPException, OSError, asyncio.TimeoutError) as e:
+            if isinstance(e, SMTPRecipientsRefused):
+                permanent = all(500 <= refused.code < 600 for refused in e.recipients)
+            else:
+                permanent = isinstance(e, SMTPResponseException) and 500 <= e.code < 600
+            if await self.queue.fail(message_id, job, e, permanent):
+                self.retried += 1
+            else:
+                self.dead += 1
+                logger.error("Email to %s dead-lettered: %r", job["to"], e)
+        else:
+            await self.queue.complete(message_id)
+            self.sent += 1
+
+    async def process(self, batch: List[Tuple[str, Job]]) -> None:
+        """
+        Sends a batch of jobs; the mailer bounds how many are sent at once.
+
+        :param batch: ``(stream ID, job)`` pairs from :meth:`EmailQueue.read_batch`.
+        :type batch: List[Tuple[str, Job]]
+        """
+        await asyncio.gather(*(self._send(message_id, job) for message_id, job in batch))
+
+    async def run(self, consumer: str, stop: asyncio.Event) -> None:
+        """
+        Processes jobs until ``stop`` is set; Redis errors are logged and retried after a second.
+
+        :param consumer: The unique name of the worker.
+        :type consumer: str
+        :param stop: Set to finish the current batch and return.
+        :type stop: asyncio.Event
+        """
+        await self.queue.ensure_group()
+        while not stop.is_set():
+            try:
+                await self.queue.promote_due()
+                batch = await self.queue.read_batch(consumer)
+                if batch:
+                    await self.process(batch)
+            except RedisError as e:
+                logger.warning("Email queue error: %r", e)
+                await asyncio.sleep(1)
+
+
+email_queue = EmailQueue(max_attempts=settings.email_queue_max_attempts, backoff=settings.email_queue_backoff,
+                         max_backoff=settings.email_queue_max_backoff, batch_size=settings.email_queue_batch_size,
+                         claim_idle=settings.email_queue_claim_idle)
+
+
+async def send_email(email: EmailStr, username: str, host: str) -> bool:
     """
-    Sends a confirmation email to the user with a verification token.
+    Queues a confirmation email with a verification token for the email worker.
+    Without Redis the email is sent right away over a new connection instead; if that fails too the email
+    is lost, which is logged and counted in ``email_queue.direct_failed``, and the user can request a new
+    confirmation email.
 
     :param email: The email address to which the confirmation email is sent.
     :type email: EmailStr
@@ -32,18 +408,26 @@ async def send_email(email: EmailStr, username: str, host: str):
     :type username: str
     :param host: The base URL of the host used to generate the confirmation link in the email template.
     :type host: str
-    :raises ConnectionErrors: If there is an issue connecting to the email service or sending the email.
+    :return: True if the email was queued or sent, False if it could not be delivered.
+    :rtype: bool
     """
+    token_verification = auth_service.create_email_token({"sub": email})
+    job = dict(to=email, subject="Confirm your email ", template="email_template.html",
+               context={"host": str(host), "username": username, "token": token_verification})
+    if email_queue.redis is not None:
+        try:
+            await email_queue.enqueue(**job)
+            return True
+        except RedisError as e:
+            logger.warning("Could not queue the email to %s, sending it directly: %r", email, e)
+    mailer = Mailer.from_settings(size=1)
     try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
+        await mailer.send(build_message(job))
+    except (SMTPException, OSError, asyncio.TimeoutError) as e:
+        email_queue.direct_failed += 1
+        logger.error("Could not send the email to %s: %r", email, e)
+        return False
+    finally:
+        await mailer.close()
+    email_queue.direct_sent += 1
+    return True
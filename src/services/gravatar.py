@@ -0,0 +1,262 @@
+import asyncio
+import hashlib
+import logging
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.db import AsyncSessionLocal
+from src.database.models import User
+from src.services.avatars import AvatarStorage, AvatarStorageError, avatar_service
+from src.services.cache import LRUCache, user_cache
+from src.services.images import InvalidImage
+from src.services.workers import WorkerPoolBusy
+
+logger = logging.getLogger(__name__)
+
+PendingUser = Tuple[int, str]
+
+
+def gravatar_hash(email: str) -> str:
+    """
+    Returns the Gravatar hash of an email: the MD5 of the trimmed, lower-cased address.
+
+    :param email: The email.
+    :type email: str
+    :return: The hex digest.
+    :rtype: str
+    """
+    return hashlib.md5(email.strip().lower().encode()).hexdigest()
+
+
+class GravatarResolver:
+    """
+    Replaces the placeholder avatar of new users with their Gravatar, outside the signup request.
+
+    Signup only calls :meth:`submit`, which queues the user without waiting. A background task collects queued
+    users into batches of up to ``batch_size`` and downloads the image of each email hash (a GET with ``d=404``,
+    at most ``concurrency`` at a time). Found images go through the avatar ``storage`` like uploads, so with
+    local storage they become content-addressed thumbnails served by this application, and the resulting
+    URLs are stored in a single statement. Answers, the stored URL or no image, are cached by email hash in
+    Redis and in-process for ``ttl`` seconds, so repeated emails never hit Gravatar twice; network and
+    storage errors are not cached. Users whose avatar changed in the meantime keep it. On start, users
+    still holding the placeholder are queued again.
+    """
+
+    prefix = "gravatar:url:"
+    base_url = "https://www.gravatar.com/avatar/"
+
+    def __init__(self, placeholder: str, storage: AvatarStorage, redis: Redis | None = None, batch_size: int = 50,
+                 concurrency: int = 10, interval: float = 1.0, ttl: int = 7 * 86400, timeout: float = 5,
+                 queue_size: int = 10_000, size: int = 256, max_bytes: int = 5 * 1024 * 1024,
+                 session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self.placeholder = placeholder
+        self.storage = storage
+        self.redis = redis
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.interval = interval
+        self.ttl = ttl
+        self.timeout = timeout
+        self.size = size
+        self.max_bytes = max_bytes
+        self.session_factory = session_factory
+        self.queue: asyncio.Queue[PendingUser] = asyncio.Queue(queue_size)
+        self.local = LRUCache(10_000, ttl)
+        self.client: httpx.AsyncClient | None = None
+        self.resolved = 0
+        self.found = 0
+        self.lookups = 0
+        self.errors = 0
+        self.dropped = 0
+        self._task: asyncio.Task | None = None
+
+    def submit(self, user_id: int, email: str) -> None:
+        """
+        Queues a new user for avatar resolution; never blocks. When the queue is full the user is
+        left to the backfill of the next start.
+
+        :param user_id: The ID of the user.
+        :type user_id: int
+        :param email: The email of the user.
+        :type email: str
+        """
+        try:
+            self.queue.put_nowait((user_id, email))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _cached(self, hashes: List[str]) -> Dict[str, str]:
+        found = {}
+        missing = []
+        for email_hash in hashes:
+            value = self.local.get(email_hash)
+            if value is None:
+                missing.append(email_hash)
+            else:
+                found[email_hash] = value
+        if missing and self.redis is not None:
+            try:
+                values = await self.redis.mget([self.prefix + email_hash for email_hash in missing])
+            except RedisError:
+                values = [None] * len(missing)
+            for email_hash, value in zip(missing, values):
+                if value is not None:
+                    found[email_hash] = value
+                    self.local.set(email_hash, found[email_hash])
+        return found
+
+    async def _remember(self, answers: Dict[str, str]) -> None:
+        for email_hash, url in answers.items():
+            self.local.set(email_hash, url)
+        if answers and self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for email_hash, url in answers.items():
+                        pipe.set(self.prefix + email_hash, url, ex=self.ttl)
+                    await pipe.execute()
+            except RedisError:
+                pass
+
+    async def _lookup(self, email_hash: str, slots: asyncio.Semaphore) -> str | None:
+        # "" means Gravatar has no image, None that the answer is unknown
+        async with slots:
+            self.lookups += 1
+            try:
+                response = await self.client.get(f"{self.base_url}{email_hash}",
+                                                 params={"d": "404", "s": str(self.size)})
+            except httpx.HTTPError:
+                self.errors += 1
+                return None
+        if response.status_code == 404:
+            return ""
+        if response.status_code != 200 or len(response.content) > self.max_bytes:
+            self.errors += 1
+            return None
+        content_type = response.headers.get("content-type", "image/jpeg").split(";")[0]
+        try:
+            return await self.storage.save(email_hash, response.content, content_type)
+        except (AvatarStorageError, InvalidImage, WorkerPoolBusy) as e:
+            logger.warning("Gravatar %s could not be stored: %r", email_hash, e)
+            self.errors += 1
+            return None
+
+    async def resolve(self, users: List[PendingUser]) -> int:
+        """
+        Resolves the avatars of a batch of users.
+
+        :param users: ``(user ID, email)`` pairs.
+        :type users: List[PendingUser]
+        :return: The number of users whose avatar was set to their Gravatar.
+        :rtype: int
+        """
+        # the stored email, not the normalized one, keys the user cache
+        gravatars = {user_id: (email, gravatar_hash(email)) for user_id, email in users}
+        hashes = list({digest for _, digest in gravatars.values()})
+        known = await self._cached(hashes)
+        unknown = [email_hash for email_hash in hashes if email_hash not in known]
+        if unknown:
+            if self.client is None:
+                self.client = httpx.AsyncClient(timeout=self.timeout)
+            slots = asyncio.Semaphore(self.concurrency)
+            answers = await asyncio.gather(*(self._lookup(email_hash, slots) for email_hash in unknown))
+            fresh = {digest: url for digest, url in zip(unknown, answers) if url is not None}
+            await self._remember(fresh)
+            known.update(fresh)
+        found = {user_id: (email, known[digest]) for user_id, (email, digest) in gravatars.items()
+                 if known.get(digest)}
+        self.resolved += len(users)
+        if found:
+            stmt = update(User.__table__).where(
+                User.__table__.c.id == bindparam("user_id"), User.__table__.c.avatar == self.placeholder,
+            ).values(avatar=bindparam("url"))
+            params = [{"user_id": user_id, "url": url} for user_id, (_, url) in found.items()]
+            async with self.session_factory() as db:
+                await db.execute(stmt, params)
+                await db.commit()
+            for email, _ in found.values():
+                await user_cache.invalidate(email)
+            self.found += len(found)
+        return len(found)
+
+    async def _next_batch(self) -> List[PendingUser]:
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def backfill(self, limit: int = 10_000) -> None:
+        """
+        Queues users that still have the placeholder avatar, e.g. because the process stopped before
+        resolving them.
+
+        :param limit: The maximum number of users to queue.
+        :type limit: int
+        """
+        async with self.session_factory() as db:
+            rows = await db.execute(select(User.id, User.email).filter(User.avatar == self.placeholder)
+                                    .order_by(User.id.desc()).limit(limit))
+        for user_id, email in rows:
+            self.submit(user_id, email)
+
+    async def _run(self) -> None:
+        try:
+            await self.backfill()
+        except Exception as e:
+            logger.error("Gravatar backfill failed: %r", e)
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self.resolve(batch)
+            except Exception as e:
+                logger.error("Gravatar resolution failed: %r", e)
+
+    def start(self) -> None:
+        """
+        Starts the background resolver; call it from the application lifespan.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stops the background resolver and closes its HTTP client.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def snapshot(self) -> dict:
+        """
+        Returns the queue length and resolution counters.
+
+        :return: Resolver statistics.
+        :rtype: dict
+        """
+        return {"queued": self.queue.qsize(), "resolved": self.resolved, "found": self.found,
+                "lookups": self.lookups, "errors": self.errors, "dropped": self.dropped}
+
+
+gravatar_resolver = GravatarResolver(settings.avatar_placeholder_url, avatar_service.storage,
+                                     batch_size=settings.gravatar_batch_size, concurrency=settings.gravatar_concurrency,
+                                     ttl=settings.gravatar_cache_ttl, timeout=settings.gravatar_timeout,
+                                     size=settings.avatar_default_size, max_bytes=settings.avatar_max_bytes)
@@ -0,0 +1,57 @@
+from io import BytesIO
+from typing import Dict, Sequence
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+THUMBNAIL_FORMAT = "WEBP"
+THUMBNAIL_MEDIA_TYPE = "image/webp"
+THUMBNAIL_EXTENSION = ".webp"
+
+
+class InvalidImage(ValueError):
+    """
+    Raised when an upload cannot be decoded as an image or is too large to process.
+    """
+
+
+def make_thumbnails(data: bytes, sizes: Sequence[int], max_pixels: int = 40_000_000,
+                    quality: int = 85) -> Dict[int, bytes]:
+    """
+    Decodes an image once and renders square thumbnails of every size, cropped to fill like an avatar.
+
+    The image is decoded at the smallest scale that still covers the largest thumbnail (JPEG draft mode),
+    oriented by its EXIF tag, cropped and resized once to the largest size, and each smaller size is scaled
+    down from the previous one. Runs in a worker process, so it only depends on Pillow.
+
+    :param data: The uploaded image.
+    :type data: bytes
+    :param sizes: The thumbnail edge lengths in pixels.
+    :type sizes: Sequence[int]
+    :param max_pixels: Images with more pixels are rejected before decoding.
+    :type max_pixels: int
+    :param quality: The WebP quality.
+    :type quality: int
+    :return: The encoded WebP thumbnails by size.
+    :rtype: Dict[int, bytes]
+    :raises InvalidImage: If the data is not a decodable image or exceeds ``max_pixels``.
+    """
+    sizes = sorted(set(sizes), reverse=True)
+    try:
+        with Image.open(BytesIO(data)) as image:
+            if image.width * image.height > max_pixels:
+                raise InvalidImage(f"Image exceeds {max_pixels} pixels")
+            image.draft("RGB", (sizes[0], sizes[0]))
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise InvalidImage(f"Not a valid image: {e}") from e
+    thumbnail = ImageOps.fit(image, (sizes[0], sizes[0]), Image.Resampling.LANCZOS)
+    thumbnails = {}
+    for size in sizes:
+        if thumbnail.width != size:
+            thumbnail = thumbnail.resize((size, size), Image.Resampling.LANCZOS)
+        out = BytesIO()
+        thumbnail.save(out, THUMBNAIL_FORMAT, quality=quality, method=4)
+        thumbnails[size] = out.getvalue()
+    return thumbnails
@@ -0,0 +1,268 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Iterable, List, Sequence, Tuple
+
+from sqlalchemy import Engine, event
+from starlette.routing import BaseRoute, Route
+
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram in the Prometheus style: bucket counters are allocated once
+    and observing a value is a binary search plus two additions.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Records a single observation.
+
+        :param value: The observed value (seconds for latency histograms).
+        :type value: float
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        """
+        Returns the histogram as cumulative bucket counts.
+
+        :return: A dictionary with cumulative ``buckets`` keyed by upper bound, ``count`` and ``sum``.
+        :rtype: dict
+        """
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {"buckets": buckets, "count": self.count, "sum": round(self.sum, 6)}
+
+    def expose(self, name: str, labels: str = "") -> List[str]:
+        """
+        Returns the histogram as Prometheus ``_bucket``, ``_sum`` and ``_count`` samples.
+
+        :param name: The metric name.
+        :type name: str
+        :param labels: Rendered labels of the series, e.g. ``method="GET",route="/"``.
+        :type labels: str
+        :return: Sample lines of the text exposition format.
+        :rtype: List[str]
+        """
+        prefix = labels + "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+def label(value: str) -> str:
+    """
+    Escapes a label value for the Prometheus text format.
+    """
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def family(name: str, kind: str, help_text: str, samples: Iterable[Tuple[str, float]] = ()) -> List[str]:
+    """
+    Renders the ``HELP`` and ``TYPE`` lines of a metric family followed by its samples.
+
+    :param name: The metric name.
+    :type name: str
+    :param kind: ``counter``, ``gauge`` or ``histogram``.
+    :type kind: str
+    :param help_text: The description of the metric.
+    :type help_text: str
+    :param samples: ``(rendered labels, value)`` pairs.
+    :type samples: Iterable[Tuple[str, float]]
+    :return: Lines of the text exposition format.
+    :rtype: List[str]
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}" for labels, value in samples)
+    return lines
+
+
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+
+class RouteMetrics:
+    """
+    The series of one route, allocated when the route is registered so that recording a request
+    only updates existing counters.
+    """
+
+    __slots__ = ("labels", "latency", "in_flight", "responses", "db_queries", "db_seconds")
+
+    def __init__(self, method: str, path: str):
+        self.labels = f'method="{label(method)}",route="{label(path)}"'
+        self.latency = Histogram()
+        self.in_flight = 0
+        self.responses = [0] * len(STATUS_CLASSES)
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+
+current_route: ContextVar[RouteMetrics | None] = ContextVar("current_route", default=None)
+
+
+class InstrumentedRoute:
+    """
+    Wraps the ASGI app of a matched route: counts the request as in flight, tags the scope for
+    :class:`MetricsMiddleware` and makes the route's series current, so database queries run while
+    handling it are attributed to the route.
+    """
+
+    def __init__(self, app, metrics: RouteMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        scope["route_metrics"] = self.metrics
+        self.metrics.in_flight += 1
+        token = current_route.set(self.metrics)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_route.reset(token)
+            self.metrics.in_flight -= 1
+
+
+class HttpMetrics:
+    """
+    Per-route HTTP and database metrics in the Prometheus style.
+
+    Every route gets a :class:`RouteMetrics` when :meth:`register` is called at startup, labelled with the
+    path template (``/api/contacts/{contact_id}``) rather than the requested URL, so the number of series is
+    fixed. :class:`MetricsMiddleware` times each request and counts its status class; requests that match no
+    route share the ``unmatched`` series. Database queries are counted and timed from the engine's cursor events
+    and charged to the route being handled.
+    """
+
+    def __init__(self):
+        self.routes: List[RouteMetrics] = []
+        self.unmatched = RouteMetrics("", "unmatched")
+        self.in_flight = 0
+        self.db_latency = Histogram()
+
+    def register(self, routes: Iterable[BaseRoute]) -> None:
+        """
+        Allocates the series of every HTTP route and instruments its app. Call it once all routers are included.
+
+        :param routes: The routes of the application, ``app.routes``.
+        :type routes: Iterable[BaseRoute]
+        """
+        for route in routes:
+            if isinstance(route, Route) and not isinstance(route.app, InstrumentedRoute):
+                metrics = RouteMetrics(",".join(sorted(route.methods or ())), route.path)
+                self.routes.append(metrics)
+                route.app = InstrumentedRoute(route.app, metrics)
+
+    def attach(self, engine: Engine) -> None:
+        """
+        Subscribes to the cursor events of the given engine.
+
+        :param engine: The (sync) engine; pass ``async_engine.sync_engine`` for async engines.
+        :type engine: Engine
+        """
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info["metrics_query_start"] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("metrics_query_start", time.perf_counter())
+        self.db_latency.observe(elapsed)
+        route = current_route.get()
+        if route is not None:
+            route.db_queries += 1
+            route.db_seconds += elapsed
+
+    def observe(self, route: RouteMetrics | None, status: int, seconds: float) -> None:
+        """
+        Records a finished request.
+
+        :param route: The series of the matched route, or None.
+        :type route: RouteMetrics | None
+        :param status: The response status code, 500 if the app raised before responding.
+        :type status: int
+        :param seconds: The time taken to handle the request.
+        :type seconds: float
+        """
+        metrics = route if route is not None else self.unmatched
+        metrics.latency.observe(seconds)
+        metrics.responses[min(max(status // 100, 1), 5) - 1] += 1
+
+    def expose(self) -> List[str]:
+        """
+        Returns the HTTP and database metrics in the Prometheus text format.
+
+        :return: Lines of the text exposition format.
+        :rtype: List[str]
+        """
+        series = self.routes + [self.unmatched]
+        lines = family("http_requests_in_flight", "gauge", "Requests being handled.", [("", self.in_flight)])
+        lines += family("http_route_requests_in_flight", "gauge", "Requests being handled by a route.",
+                        [(m.labels, m.in_flight) for m in series])
+        lines += family("http_responses_total", "counter", "Responses by route and status class.",
+                        [(f'{m.labels},status="{status}"', count) for m in series
+                         for status, count in zip(STATUS_CLASSES, m.responses)])
+        lines += ["# HELP http_request_duration_seconds Time taken to handle a request.",
+                  "# TYPE http_request_duration_seconds histogram"]
+        for m in series:
+            lines += m.latency.expose("http_request_duration_seconds", m.labels)
+        lines += family("http_db_queries_total", "counter", "Database queries run while handling a route.",
+                        [(m.labels, m.db_queries) for m in series])
+        lines += family("http_db_query_seconds_total", "counter", "Time spent in database queries by route.",
+                        [(m.labels, m.db_seconds) for m in series])
+        lines += ["# HELP db_query_duration_seconds Duration of database queries.",
+                  "# TYPE db_query_duration_seconds histogram"]
+        lines += self.db_latency.expose("db_query_duration_seconds")
+        return lines
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request and counting its response status per route.
+    """
+
+    def __init__(self, app, metrics: HttpMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.metrics.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.in_flight -= 1
+            self.metrics.observe(scope.get("route_metrics"), status, time.perf_counter() - start)
+
+
+http_metrics = HttpMetrics()
@@ -0,0 +1,405 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Dict, List, NamedTuple
+
+from fastapi import Depends, HTTPException, Request, status
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.models import User
+from src.services.auth import auth_service
+from src.services.cache import LRUCache
+from src.services.metrics import family, label
+
+# Generic cell rate algorithm: the bucket stores the theoretical arrival time (TAT) of the next request in
+# milliseconds of Redis server time. A request is allowed if it would not push the TAT further than
+# ``limit`` emission intervals ahead of now. One EVALSHA per request, atomic, and clock-skew free.
+# ARGV[3] is the number of requests to count (default 1); with ARGV[4] == '1' they are counted even over
+# the limit, which is how requests admitted by the local fallback are reconciled.
+GCRA_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = now_parts[1] * 1000 + math.floor(now_parts[2] / 1000)
+local interval = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3] or 1)
+local force = ARGV[4] == '1'
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval * cost
+local allow_at = new_tat - interval * limit
+if allow_at > now and not force then
+    return {0, 0, allow_at - now, tat - now}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return {1, math.max(math.floor((now + interval * limit - new_tat) / interval), 0), 0, new_tat - now}
+"""
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class Limit(NamedTuple):
+    times: int
+    seconds: int
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: Limit
+    remaining: int
+    reset: float
+    retry_after: float
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """
+        The ``RateLimit-*`` response headers describing this result, plus ``Retry-After`` when rejected.
+        """
+        headers = {
+            "RateLimit-Limit": str(self.limit.times),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(max(int(self.reset + 0.999), 0)),
+            "RateLimit-Policy": f"{self.limit.times};w={self.limit.seconds}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(int(self.retry_after + 0.999), 1))
+        return headers
+
+
+def parse_limit(value: str) -> Limit:
+    """
+    Parses a limit written as ``<times>/<period>``, e.g. ``10/minute``.
+
+    :param value: The limit string; the period is ``second``, ``minute``, ``hour`` or ``day``.
+    :type value: str
+    :return: The parsed limit.
+    :rtype: Limit
+    :raises ValueError: If the string is malformed.
+    """
+    times, _, period = value.partition("/")
+    if period.strip() not in PERIODS or not times.strip().isdigit() or int(times) < 1:
+        raise ValueError(f"Invalid rate limit: {value!r}")
+    return Limit(int(times), PERIODS[period.strip()])
+
+
+class TokenBucket:
+    """
+    In-process token bucket holding a worker's share of a limit, used while Redis cannot be asked.
+    """
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, rate: float, now: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        """
+        Refills the bucket up to ``now`` and takes one token if available.
+
+        :param now: The current monotonic time.
+        :type now: float
+        :return: True if a token was taken.
+        :rtype: bool
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class RateLimiter:
+    """
+    Per-user rate limiter for API routes backed by a GCRA Lua script in Redis.
+
+    Routes are grouped into rules (``read``, ``write``, ...), and the limit of a rule depends on the plan
+    of the user, as configured in ``rate_limit_plans``. Once Redis rejects a user, the rejection is remembered
+    in-process until the user may retry, so a client hammering an exhausted limit costs no Redis round-trips.
+
+    Redis calls are bounded by ``timeout`` seconds. A Redis error or a slow call opens a circuit breaker for
+    ``cooldown`` seconds, during which decisions are made by per-worker token buckets holding ``1 / workers``
+    of each limit; the first request after the cooldown probes Redis again. Requests admitted locally are
+    counted in Redis by :meth:`reconcile`, which runs every ``reconcile_interval`` seconds once :meth:`start`
+    has been called, so a user does not get a fresh allowance when Redis comes back.
+    """
+
+    prefix = "rate_limit:"
+
+    def __init__(self, plans: Dict[str, Dict[str, str]], default_plan: str, redis: Redis | None = None,
+                 local_maxsize: int = 10_000, workers: int = 1, timeout: float = 0.05, cooldown: float = 5,
+                 reconcile_interval: float = 5):
+        self.plans = {plan: {rule: parse_limit(limit) for rule, limit in rules.items()}
+                      for plan, rules in plans.items()}
+        self.default_plan = default_plan
+        self.redis = redis
+        self.workers = max(workers, 1)
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self.reconcile_interval = reconcile_interval
+        longest = max((limit.seconds for rules in self.plans.values() for limit in rules.values()), default=60)
+        self.blocked = LRUCache(local_maxsize, longest)
+        self.buckets = LRUCache(local_maxsize, longest)
+        self.pending: Dict[tuple[str, int], tuple[int, Limit]] = {}
+        self.open_until = 0.0
+        self.trips = 0
+        self.allowed: Counter[str] = Counter()
+        self.rejected: Counter[str] = Counter()
+        self.rejected_locally: Counter[str] = Counter()
+        self.decided_locally: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self._script = None
+        self._script_client = None
+        self._task: asyncio.Task | None = None
+
+    def limit_for(self, rule: str, plan: str | None) -> Limit:
+        """
+        Returns the limit of a rule for a plan, falling back to the default plan.
+
+        :param rule: The rule name.
+        :type rule: str
+        :param plan: The plan of the user.
+        :type plan: str | None
+        :return: The limit.
+        :rtype: Limit
+        :raises KeyError: If the rule is not configured for the default plan.
+        """
+        rules = self.plans.get(plan or self.default_plan, self.plans[self.default_plan])
+        return rules.get(rule) or self.plans[self.default_plan][rule]
+
+    def _gcra(self):
+        if self._script is None or self._script_client is not self.redis:
+            self._script = self.redis.register_script(GCRA_SCRIPT)
+            self._script_client = self.redis
+        return self._script
+
+    def _key(self, rule: str, user_id: int) -> str:
+        return f"{self.prefix}{rule}:{user_id}"
+
+    @staticmethod
+    def _interval(limit: Limit) -> int:
+        return limit.seconds * 1000 // limit.times
+
+    @property
+    def circuit_open(self) -> bool:
+        """
+        True while Redis is skipped after a failure.
+        """
+        return time.monotonic() < self.open_until
+
+    def trip(self) -> None:
+        """
+        Opens the circuit breaker: Redis is skipped for ``cooldown`` seconds.
+        """
+        self.open_until = time.monotonic() + self.cooldown
+        self.trips += 1
+
+    async def _call(self, *args) -> list:
+        return await asyncio.wait_for(self._gcra()(keys=[args[0]], args=list(args[1:])), self.timeout)
+
+    async def check(self, rule: str, user: User) -> RateLimitResult:
+        """
+        Counts a request of a user against a rule, in Redis or, when Redis is unavailable or slow,
+        in the local token buckets.
+
+        :param rule: The rule name.
+        :type rule: str
+        :param user: The authenticated user.
+        :type user: User
+        :return: The decision.
+        :rtype: RateLimitResult
+        """
+        limit = self.limit_for(rule, user.plan)
+        key = (rule, user.id)
+        blocked = self.blocked.get(key)
+        now = time.monotonic()
+        if blocked is not None and blocked[0] > now:
+            self.rejected_locally[rule] += 1
+            self.rejected[rule] += 1
+            return RateLimitResult(False, limit, 0, blocked[1] - now, blocked[0] - now)
+        if self.redis is not None and now >= self.open_until:
+            try:
+                allowed, remaining, retry_after, reset = await self._call(
+                    self._key(rule, user.id), self._interval(limit), limit.times)
+            except (RedisError, asyncio.TimeoutError):
+                self.errors[rule] += 1
+                self.trip()
+            else:
+                result = RateLimitResult(bool(allowed), limit, int(remaining), int(reset) / 1000,
+                                         int(retry_after) / 1000)
+                self._count(rule, key, result, now)
+                return result
+        return self._check_locally(rule, key, limit, now)
+
+    def _check_locally(self, rule: str, key: tuple[str, int], limit: Limit, now: float) -> RateLimitResult:
+        self.decided_locally[rule] += 1
+        capacity = max(limit.times / self.workers, 1)
+        rate = capacity / limit.seconds
+        bucket = self.buckets.get(key)
+        if bucket is None or bucket.capacity != capacity:
+            bucket = TokenBucket(capacity, rate, now)
+            self.buckets.set(key, bucket)
+        allowed = bucket.take(now)
+        result = RateLimitResult(allowed, limit, int(bucket.tokens), (capacity - bucket.tokens) / rate,
+                                 0 if allowed else (1 - bucket.tokens) / rate)
+        if allowed and self.redis is not None:
+            hits, _ = self.pending.get(key, (0, limit))
+            self.pending[key] = (hits + 1, limit)
+        self._count(rule, key, result, now)
+        return result
+
+    def _count(self, rule: str, key: tuple[str, int], result: RateLimitResult, now: float) -> None:
+        if result.allowed:
+            self.allowed[rule] += 1
+        else:
+            self.rejected[rule] += 1
+            self.blocked.set(key, (now + result.retry_after, now + result.reset))
+
+    async def reconcile(self) -> int:
+        """
+        Counts the requests admitted by the local buckets in Redis. Does nothing while the circuit is open;
+        on a failure the remaining requests are kept for the next run and the circuit opens.
+
+        :return: The number of requests reconciled.
+        :rtype: int
+        """
+        if self.redis is None or not self.pending or self.circuit_open:
+            return 0
+        pending, self.pending = self.pending, {}
+        done = 0
+        items = list(pending.items())
+        for i, ((rule, user_id), (hits, limit)) in enumerate(items):
+            try:
+                await self._call(self._key(rule, user_id), self._interval(limit), limit.times, hits, 1)
+            except (RedisError, asyncio.TimeoutError):
+                self.errors["reconcile"] += 1
+                self.trip()
+                for key, (more, limit) in items[i:]:
+                    hits, _ = self.pending.get(key, (0, limit))
+                    self.pending[key] = (hits + more, limit)
+                break
+            done += hits
+        return done
+
+    async def _reconcile_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            await self.reconcile()
+
+    def start(self) -> None:
+        """
+        Starts the periodic reconciliation task; call it from the application lifespan.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._reconcile_forever())
+
+    async def stop(self) -> None:
+        """
+        Stops the reconciliation task after a last reconciliation attempt.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.reconcile()
+
+    def snapshot(self) -> dict:
+        """
+        Returns the circuit breaker state and allowed, rejected, local and error counters per rule.
+
+        :return: Rate limiter statistics.
+        :rtype: dict
+        """
+        rules = set(self.allowed) | set(self.rejected) | set(self.errors)
+        return {
+            "redis": self.redis is not None,
+            "circuit_open": self.circuit_open,
+            "trips": self.trips,
+            "blocked_users": len(self.blocked),
+            "local_buckets": len(self.buckets),
+            "pending_reconciliation": sum(hits for hits, _ in self.pending.values()),
+            "rules": {rule: {"allowed": self.allowed[rule], "rejected": self.rejected[rule],
+                             "rejected_locally": self.rejected_locally[rule],
+                             "decided_locally": self.decided_locally[rule], "errors": self.errors[rule]}
+                      for rule in sorted(rules)},
+        }
+
+    def expose(self) -> List[str]:
+        """
+        Returns the decisions per rule and the circuit breaker state in the Prometheus text format.
+
+        :return: Lines of the text exposition format.
+        :rtype: List[str]
+        """
+        rules = sorted(set(self.allowed) | set(self.rejected) | set(self.errors))
+        lines = family("rate_limit_decisions_total", "counter", "Rate limit decisions, by rule and result.",
+                       [(f'rule="{label(rule)}",result="{result}"', counter[rule]) for rule in rules
+                        for result, counter in (("allowed", self.allowed), ("rejected", self.rejected))])
+        lines += family("rate_limit_rejected_locally_total", "counter",
+                        "Rejections answered from the in-process block cache, by rule.",
+                        [(f'rule="{label(rule)}"', self.rejected_locally[rule]) for rule in rules])
+        lines += family("rate_limit_decided_locally_total", "counter",
+                        "Decisions made by the local fallback while Redis was unavailable, by rule.",
+                        [(f'rule="{label(rule)}"', self.decided_locally[rule]) for rule in rules])
+        lines += family("rate_limit_circuit_open", "gauge", "Whether Redis is bypassed after failures.",
+                        [("", int(self.circuit_open))])
+        lines += family("rate_limit_circuit_trips_total", "counter", "Times the circuit breaker opened.",
+                        [("", self.trips)])
+        return lines
+
+
+rate_limiter = RateLimiter(settings.rate_limit_plans, settings.rate_limit_default_plan,
+                           workers=settings.rate_limit_workers, timeout=settings.rate_limit_redis_timeout,
+                           cooldown=settings.rate_limit_breaker_cooldown,
+                           reconcile_interval=settings.rate_limit_reconcile_interval)
+
+
+class RateLimit:
+    """
+    Route dependency enforcing a rate limit rule for the current user: ``Depends(RateLimit("read"))``.
+
+    Rejected requests get 429 Too Many Requests; allowed ones get ``RateLimit-*`` headers added by
+    :class:`RateLimitHeadersMiddleware`.
+    """
+
+    def __init__(self, rule: str):
+        self.rule = rule
+
+    async def __call__(self, request: Request, user: User = Depends(auth_service.get_current_user)):
+        result = await rate_limiter.check(self.rule, user)
+        if not result.allowed:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too Many Requests",
+                                headers=result.headers)
+        request.state.rate_limit_headers = result.headers
+
+
+class RateLimitHeadersMiddleware:
+    """
+    ASGI middleware copying the headers stored by :class:`RateLimit` onto the response, including responses
+    returned directly by route handlers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_with_headers(message):
+            headers = scope.get("state", {}).get("rate_limit_headers")
+            if message["type"] == "http.response.start" and headers:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,137 @@
+import time
+
+from typing import Dict, List
+
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.services.metrics import Histogram, family, label
+
+
+class InstrumentedRedisPool(BlockingConnectionPool):
+    """
+    A blocking Redis connection pool that records how long callers wait to acquire a connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.acquire_latency = Histogram()
+        self.acquired = 0
+
+    async def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().get_connection(*args, **kwargs)
+        finally:
+            self.acquire_latency.observe(time.perf_counter() - start)
+            self.acquired += 1
+
+
+class InstrumentedRedis(Redis):
+    """
+    A Redis client counting the commands it sends by name, and the ones that failed.
+    A pipeline is counted once, as ``PIPELINE``, whatever the number of commands it batches.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls: Dict[str, int] = {}
+        self.errors = 0
+
+    async def execute_command(self, *args, **options):
+        name = args[0]
+        self.calls[name] = self.calls.get(name, 0) + 1
+        try:
+            return await super().execute_command(*args, **options)
+        except RedisError:
+            self.errors += 1
+            raise
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None):
+        self.calls["PIPELINE"] = self.calls.get("PIPELINE", 0) + 1
+        return super().pipeline(transaction, shard_hint)
+
+
+class RedisManager:
+    """
+    Owns the single async Redis connection pool of the process.
+
+    The pool is created in the application lifespan and the same client is handed to the rate limiter
+    and every cache, so connections are reused and no Redis call blocks the event loop.
+    """
+
+    def __init__(self):
+        self.pool: InstrumentedRedisPool | None = None
+        self.client: InstrumentedRedis | None = None
+
+    def connect(self) -> Redis:
+        """
+        Creates the connection pool and the client bound to it. Connections are opened lazily.
+
+        :return: The shared Redis client.
+        :rtype: Redis
+        """
+        self.pool = InstrumentedRedisPool(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=0,
+            encoding="utf-8",
+            decode_responses=True,
+            max_connections=settings.redis_max_connections,
+            timeout=settings.redis_pool_timeout,
+            socket_timeout=settings.redis_socket_timeout,
+        )
+        self.client = InstrumentedRedis(connection_pool=self.pool)
+        return self.client
+
+    async def close(self) -> None:
+        """
+        Closes the client and disconnects every pooled connection.
+        """
+        if self.client is not None:
+            await self.client.aclose()
+            await self.pool.disconnect()
+        self.client = None
+        self.pool = None
+
+    def snapshot(self) -> dict:
+        """
+        Returns connection pool usage and the acquire wait-time histogram.
+
+        :return: Pool statistics, or ``{"initialized": False}`` before :meth:`connect`.
+        :rtype: dict
+        """
+        if self.pool is None:
+            return {"initialized": False}
+        return {
+            "initialized": True,
+            "max_connections": self.pool.max_connections,
+            "in_use": len(getattr(self.pool, "_in_use_connections", ())),
+            "idle": len(getattr(self.pool, "_available_connections", ())),
+            "acquired": self.pool.acquired,
+            "acquire_latency_seconds": self.pool.acquire_latency.snapshot(),
+        }
+
+    def expose(self) -> List[str]:
+        """
+        Returns the Redis command counters and pool usage in the Prometheus text format.
+
+        :return: Lines of the text exposition format; none before :meth:`connect`.
+        :rtype: List[str]
+        """
+        if self.client is None:
+            return []
+        lines = family("redis_commands_total", "counter", "Redis commands sent, by command.",
+                       [(f'command="{label(name)}"', count) for name, count in sorted(self.client.calls.items())])
+        lines += family("redis_command_errors_total", "counter", "Redis commands that failed.",
+                        [("", self.client.errors)])
+        lines += family("redis_connections_in_use", "gauge", "Pooled Redis connections in use.",
+                        [("", len(getattr(self.pool, "_in_use_connections", ())))])
+        lines += ["# HELP redis_pool_acquire_seconds Time waited for a pooled Redis connection.",
+                  "# TYPE redis_pool_acquire_seconds histogram"]
+        lines += self.pool.acquire_latency.expose("redis_pool_acquire_seconds")
+        return lines
+
+
+redis_manager = RedisManager()
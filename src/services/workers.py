@@ -0,0 +1,166 @@
+import asyncio
+import contextlib
+import functools
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Iterator
+
+from src.services.metrics import Histogram
+
+
+class WorkerPoolBusy(Exception):
+    """
+    Raised when a :class:`BoundedExecutor` already has ``max_pending`` calls in flight or reserved.
+    """
+
+
+class Reservation:
+    """
+    Pool capacity held by :meth:`BoundedExecutor.reserve`; calls made through it are never rejected.
+    """
+
+    def __init__(self, executor: "BoundedExecutor", slots: int):
+        self.executor = executor
+        self.slots = slots
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Executes ``fn(*args, **kwargs)`` in the pool on the reserved capacity and waits for the result.
+        Keep at most ``slots`` calls in flight through one reservation.
+
+        :param fn: The callable to run; it must be picklable for process pools.
+        :type fn: Callable
+        :return: The result of the call.
+        :rtype: Any
+        """
+        return await self.executor._execute(fn, *args, **kwargs)
+
+
+class BoundedExecutor:
+    """
+    Runs blocking or CPU-bound callables off the event loop in a thread or process pool.
+
+    At most ``max_workers`` calls execute at once; further calls wait in the pool queue, and once
+    ``max_pending`` calls are in flight new ones are rejected with :class:`WorkerPoolBusy` instead of
+    queueing without bound. Callers that must not be rejected halfway through a job take a
+    :meth:`reserve` up front. The pool is created lazily, so importing this module starts no workers.
+    Process pools use the ``spawn`` start method: forking a process that runs an event loop and holds
+    connection pools and threads can copy locks in a held state.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int, kind: str = "thread"):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.in_flight = 0
+        # unreserved calls in flight plus reserved slots, bounded by max_pending
+        self.claimed = 0
+        self.reserved = 0
+        self.max_queue_depth = 0
+        self.completed = 0
+        self.rejected = 0
+        self.latency = Histogram()
+        self._executor: Executor | None = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        The number of calls waiting for a free worker.
+        """
+        return max(self.in_flight - self.max_workers, 0)
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Executes ``fn(*args, **kwargs)`` in the pool and waits for the result.
+
+        :param fn: The callable to run; it must be picklable for process pools.
+        :type fn: Callable
+        :return: The result of the call.
+        :rtype: Any
+        :raises WorkerPoolBusy: If ``max_pending`` calls are already in flight or reserved.
+        """
+        if self.claimed >= self.max_pending:
+            self.rejected += 1
+            raise WorkerPoolBusy(self.name)
+        self.claimed += 1
+        try:
+            return await self._execute(fn, *args, **kwargs)
+        finally:
+            self.claimed -= 1
+
+    @contextlib.contextmanager
+    def reserve(self, slots: int) -> Iterator[Reservation]:
+        """
+        Holds capacity for ``slots`` concurrent calls until the block exits, so a multi-step job is either
+        rejected before its first step or runs to the end.
+
+        :param slots: The number of calls the job keeps in flight at most.
+        :type slots: int
+        :return: The reservation to run the calls through.
+        :rtype: Iterator[Reservation]
+        :raises WorkerPoolBusy: If the capacity is not available.
+        """
+        if self.claimed + slots > self.max_pending:
+            self.rejected += 1
+            raise WorkerPoolBusy(self.name)
+        self.claimed += slots
+        self.reserved += slots
+        try:
+            yield Reservation(self, slots)
+        finally:
+            self.claimed -= slots
+            self.reserved -= slots
+
+    async def _execute(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self.latency.observe(time.perf_counter() - start)
+
+    def shutdown(self) -> None:
+        """
+        Stops the pool; it is recreated on the next call.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def snapshot(self) -> dict:
+        """
+        Returns the pool configuration, current load and the call latency histogram.
+
+        :return: Executor statistics.
+        :rtype: dict
+        """
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            "reserved": self.reserved,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "latency_seconds": self.latency.snapshot(),
+        }
@@ -1,11 +1,14 @@
 from unittest.mock import MagicMock
 
+from src.conf.config import settings
 from src.database.models import User
 
 
 def test_create_user(client, user, monkeypatch):
     mock_send_email = MagicMock()
+    mock_submit = MagicMock()
     monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+    monkeypatch.setattr("src.routes.auth.gravatar_resolver.submit", mock_submit)
     response = client.post(
         "/api/auth/signup",
         json=user,
@@ -14,6 +17,8 @@ def test_create_user(client, user, monkeypatch):
     data = response.json()
     assert data["user"]["email"] == user.get("email")
     assert "id" in data["user"]
+    assert data["user"]["avatar"] == settings.avatar_placeholder_url
+    mock_submit.assert_called_once_with(data["user"]["id"], user.get("email"))
 
 def test_repeat_create_user(client, user):
     response = client.post(
@@ -1,25 +1,253 @@
-from unittest.mock import MagicMock
+import json
+from unittest.mock import AsyncMock, patch
+
 import pytest
-from fastapi.testclient import TestClient
+
 from src.database.models import User
-from main import app
-
-
-# def test_create_contact(client, contact_data, monkeypatch):
-#     mock_init = MagicMock()
-#     monkeypatch.setattr("fastapi_limiter.FastAPILimiter.init", mock_init)
-#     mock_create_contact = MagicMock()
-#     monkeypatch.setattr("src.repository.contacts.create_contact", mock_create_contact)
-#     auth_token = "test-token"
-#     headers = {"Authorization": f"Bearer {auth_token}"}
-#     response = client.post("/api/contacts/", json=contact_data, headers=headers)
-#     assert response.status_code == 201
-#     data = response.json()
-#     assert data["name"] == contact_data["name"]
-#     assert data["surname"] == contact_data["surname"]
-#     assert "id" in data
-#
-#     mock_create_contact.assert_called_once_with(contact_data)
-#     mock_init.assert_called_once()
-
-# TODO: Finish the implementation later
\ No newline at end of file
+from src.services.contacts_io import import_executor
+from src.services.rate_limit import Limit, RateLimitResult
+
+CONTACT = {
+    "name": "John",
+    "surname": "Doe",
+    "email": "john.doe@example.com",
+    "phone": "+380501234567",
+    "birthday": "1990-01-01",
+    "description": "Friend",
+}
+
+
+@pytest.fixture(scope="module")
+def headers(client, session, user):
+    with patch("src.routes.auth.send_email"):
+        client.post("/api/auth/signup", json=user)
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    current_user.confirmed = True
+    session.commit()
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def unlimited():
+    # the bulk endpoints allow 2 requests per minute on the free plan
+    result = RateLimitResult(True, Limit(2, 60), 1, 30, 0)
+    with patch("src.services.rate_limit.rate_limiter.check", AsyncMock(return_value=result)):
+        yield
+
+
+@pytest.fixture(scope="module")
+def contact(client, headers):
+    response = client.post("/api/contacts/", json=CONTACT, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def test_create_contact(contact):
+    assert contact["name"] == CONTACT["name"]
+    assert contact["email"] == CONTACT["email"]
+    assert "id" in contact
+
+
+def test_read_contacts(client, headers, contact):
+    response = client.get("/api/contacts/", headers=headers)
+    assert response.status_code == 200, response.text
+    assert [item["id"] for item in response.json()] == [contact["id"]]
+    assert response.headers["ratelimit-limit"] == "10"
+
+
+def test_read_contact_not_found(client, headers):
+    response = client.get("/api/contacts/999", headers=headers)
+    assert response.status_code == 404, response.text
+    assert response.json()["detail"] == "Contact not found"
+
+
+def test_update_contact_partial(client, headers, contact):
+    response = client.put(f"/api/contacts/{contact['id']}", json={"name": None, "surname": "Smith"}, headers=headers)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["name"] == "John"
+    assert data["surname"] == "Smith"
+
+
+def test_autocomplete(client, headers, contact):
+    response = client.get("/api/contacts/autocomplete", params={"q": "jo"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json() == [{"id": contact["id"], "name": "John", "surname": "Smith"}]
+
+
+def test_rate_limit_headers(client, headers, contact):
+    result = RateLimitResult(True, Limit(10, 60), 7, 18.5, 0)
+    with patch("src.services.rate_limit.rate_limiter.check", AsyncMock(return_value=result)):
+        response = client.get(f"/api/contacts/{contact['id']}", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["ratelimit-limit"] == "10"
+    assert response.headers["ratelimit-remaining"] == "7"
+    assert response.headers["ratelimit-reset"] == "19"
+
+
+def test_rate_limit_rejected(client, headers):
+    result = RateLimitResult(False, Limit(10, 60), 0, 30, 4.2)
+    with patch("src.services.rate_limit.rate_limiter.check", AsyncMock(return_value=result)):
+        response = client.get("/api/contacts/", headers=headers)
+    assert response.status_code == 429, response.text
+    assert response.headers["retry-after"] == "5"
+    assert response.headers["ratelimit-remaining"] == "0"
+
+
+def test_batch(client, headers, contact):
+    response = client.post("/api/contacts/batch", headers=headers, json={"operations": [
+        {"op": "create", "data": {**CONTACT, "email": "jane@example.com", "name": "Jane"}},
+        {"op": "create", "data": CONTACT},
+        {"op": "delete", "id": 999},
+    ]})
+    assert response.status_code == 200, response.text
+    assert [result["status"] for result in response.json()["results"]] == [201, 409, 404]
+
+
+def test_changes(client, headers, contact):
+    response = client.get("/api/contacts/changes", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["ratelimit-limit"] == "120"
+    data = response.json()
+    assert {item["email"] for item in data["updated"]} == {"john.doe@example.com", "jane@example.com"}
+    assert data["deleted"] == []
+    assert data["has_more"] is False
+
+    response = client.delete(f"/api/contacts/{contact['id']}", headers=headers)
+    assert response.status_code == 200, response.text
+    response = client.get("/api/contacts/changes", params={"since": data["next_token"]}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert contact["id"] in response.json()["deleted"]
+
+
+def test_changes_invalid_token(client, headers):
+    response = client.get("/api/contacts/changes", params={"since": "not-a-token"}, headers=headers)
+    assert response.status_code == 400, response.text
+
+
+def test_import_csv(client, headers, unlimited):
+    body = ("name,surname,email,phone,birthday\n"
+            "Ann,Lee,ann@example.com,+380501234561,1991-02-03\n"
+            "Jane,Doe,jane@example.com,+380501234562,\n"
+            "Bad,Row,not-an-email,+380501234563,\n"
+            "Ann,Again,ann@example.com,+380501234564,\n")
+    response = client.post("/api/contacts/import", content=body, headers={**headers, "Content-Type": "text/csv"})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert (data["total"], data["imported"], data["failed"]) == (4, 1, 3)
+    assert {error["row"]: error["error"] for error in data["errors"] if error["row"] != 3} == {
+        2: "Contact with this email already exists",
+        4: "Duplicate email in the import",
+    }
+    assert data["errors"][1]["error"].startswith("email:")
+    response = client.get("/api/contacts/search/", params={"email": "ann@example.com"}, headers=headers)
+    assert [item["surname"] for item in response.json()] == ["Lee"]
+
+
+def test_import_ndjson_with_format_parameter(client, headers, unlimited):
+    body = '{"name": "Bob", "surname": "Ray", "email": "bob@example.com", "phone": "+380501234565"}\nnot json\n'
+    response = client.post("/api/contacts/import", params={"format": "ndjson"}, content=body,
+                           headers={**headers, "Content-Type": "application/octet-stream"})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert (data["total"], data["imported"], data["failed"]) == (2, 1, 1)
+    assert data["errors"][0]["row"] == 2
+
+
+def test_import_unknown_format(client, headers, unlimited):
+    response = client.post("/api/contacts/import", content="x", headers={**headers, "Content-Type": "text/plain"})
+    assert response.status_code == 415, response.text
+
+
+def test_import_busy_inserts_nothing(client, headers, unlimited):
+    body = "name,surname,email,phone\nCat,Stone,cat@example.com,+380501234566\n"
+    with import_executor.reserve(import_executor.max_pending):
+        response = client.post("/api/contacts/import", content=body, headers={**headers, "Content-Type": "text/csv"})
+    assert response.status_code == 503, response.text
+    assert response.headers["retry-after"] == "5"
+    response = client.get("/api/contacts/search/", params={"email": "cat@example.com"}, headers=headers)
+    assert response.json() == []
+
+
+@pytest.fixture(scope="module")
+def other_headers(client, session):
+    other = {"username": "wolverine", "email": "wolverine@example.com", "password": "123456789"}
+    with patch("src.routes.auth.send_email"):
+        client.post("/api/auth/signup", json=other)
+    other_user: User = session.query(User).filter(User.email == other["email"]).first()
+    other_user.confirmed = True
+    session.commit()
+    response = client.post("/api/auth/login", data={"username": other["email"], "password": other["password"]})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_export_csv(client, headers, unlimited):
+    response = client.get("/api/contacts/export", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == 'attachment; filename="contacts.csv"'
+    lines = response.text.splitlines()
+    assert lines[0] == "name,surname,email,phone,birthday,description"
+    assert {line.split(",")[2] for line in lines[1:]} == {"jane@example.com", "ann@example.com", "bob@example.com"}
+
+
+def test_export_ndjson(client, headers, unlimited):
+    response = client.get("/api/contacts/export", params={"format": "ndjson"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.headers["content-disposition"] == 'attachment; filename="contacts.ndjson"'
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert {row["email"] for row in rows} == {"jane@example.com", "ann@example.com", "bob@example.com"}
+    assert next(row for row in rows if row["email"] == "ann@example.com")["birthday"] == "1991-02-03"
+
+
+def test_export_vcard(client, headers, unlimited):
+    response = client.get("/api/contacts/export", params={"format": "vcard"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/vcard")
+    assert response.headers["content-disposition"] == 'attachment; filename="contacts.vcf"'
+    assert response.text.count("BEGIN:VCARD") == 3
+    assert "EMAIL;TYPE=INTERNET:ann@example.com\r\n" in response.text
+
+
+def test_export_is_scoped_to_the_user(client, headers, other_headers, unlimited):
+    for format in ("csv", "ndjson", "vcard"):
+        response = client.get("/api/contacts/export", params={"format": format}, headers=other_headers)
+        assert response.status_code == 200, response.text
+        assert "@example.com" not in response.text
+    assert client.get("/api/contacts/export", headers=other_headers).text.splitlines() == [
+        "name,surname,email,phone,birthday,description"]
+    assert client.get("/api/contacts/export", params={"format": "ndjson"}, headers=other_headers).text == ""
+
+    response = client.post("/api/contacts/", json={**CONTACT, "email": "logan@example.com"}, headers=other_headers)
+    assert response.status_code == 201, response.text
+    response = client.get("/api/contacts/export", params={"format": "ndjson"}, headers=other_headers)
+    assert [json.loads(line)["email"] for line in response.text.splitlines()] == ["logan@example.com"]
+
+
+def test_export_unknown_format(client, headers, unlimited):
+    response = client.get("/api/contacts/export", params={"format": "xml"}, headers=headers)
+    assert response.status_code == 422, response.text
+
+
+def test_etag_follows_writes(client, headers, unlimited):
+    response = client.post("/api/contacts/", json={**CONTACT, "email": "etag@example.com"}, headers=headers)
+    contact_id = response.json()["id"]
+    etag = client.get(f"/api/contacts/{contact_id}", headers=headers).headers["etag"]
+    response = client.get(f"/api/contacts/{contact_id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304, response.text
+
+    client.put(f"/api/contacts/{contact_id}", json={"name": "Changed"}, headers=headers)
+    response = client.get(f"/api/contacts/{contact_id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200, response.text
+    assert response.json()["name"] == "Changed"
+    assert response.headers["etag"] != etag
+
+
+def test_if_none_match_wildcard_needs_an_existing_contact(client, headers, unlimited):
+    response = client.get("/api/contacts/999", headers={**headers, "If-None-Match": "*"})
+    assert response.status_code == 404, response.text
@@ -0,0 +1,28 @@
+import pytest
+
+from src.conf.config import settings
+
+
+@pytest.fixture
+def token(monkeypatch):
+    monkeypatch.setattr(settings, "internal_token", "s3cret")
+    return "s3cret"
+
+
+def test_internal_disabled_by_default(client, monkeypatch):
+    monkeypatch.setattr(settings, "internal_token", None)
+    response = client.get("/api/_internal/pool", headers={"X-Internal-Token": ""})
+    assert response.status_code == 404, response.text
+
+
+def test_internal_requires_token(client, token):
+    response = client.get("/api/_internal/pool")
+    assert response.status_code == 401, response.text
+    response = client.get("/api/_internal/pool", headers={"X-Internal-Token": "wrong"})
+    assert response.status_code == 401, response.text
+
+
+def test_internal_with_token(client, token):
+    response = client.get("/api/_internal/workers", headers={"X-Internal-Token": token})
+    assert response.status_code == 200, response.text
+    assert "password_hashing" in response.json()
@@ -0,0 +1,32 @@
+import pytest
+
+from src.conf.config import settings
+
+
+@pytest.fixture
+def token(monkeypatch):
+    monkeypatch.setattr(settings, "internal_token", "s3cret")
+    return "s3cret"
+
+
+def test_metrics(client, token):
+    client.get("/")
+    response = client.get("/metrics", headers={"X-Internal-Token": token})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_responses_total{method="GET",route="/",status="2xx"}' in response.text
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
+    assert "# TYPE rate_limit_decisions_total counter" in response.text
+
+
+def test_metrics_disabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "internal_token", None)
+    response = client.get("/metrics")
+    assert response.status_code == 404, response.text
+
+
+def test_metrics_requires_token(client, token):
+    response = client.get("/metrics")
+    assert response.status_code == 401, response.text
+    response = client.get("/metrics", headers={"X-Internal-Token": "wrong"})
+    assert response.status_code == 401, response.text
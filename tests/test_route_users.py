@@ -0,0 +1,103 @@
+from contextlib import asynccontextmanager
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from main import app
+from src.database.db import get_db
+from src.database.models import User
+from src.services.avatars import LocalStorage, avatar_executor, avatar_service, image_executor
+
+
+def png() -> bytes:
+    out = BytesIO()
+    Image.new("RGB", (300, 200), "red").save(out, "PNG")
+    return out.getvalue()
+
+
+PNG = png()
+
+
+@pytest.fixture(scope="module")
+def headers(client, session, user):
+    with patch("src.routes.auth.send_email"):
+        client.post("/api/auth/signup", json=user)
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    current_user.confirmed = True
+    session.commit()
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(autouse=True)
+def local_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(avatar_service, "storage", LocalStorage(tmp_path, "/api/users/avatars", avatar_executor,
+                                                                image_executor))
+    monkeypatch.setattr(avatar_service, "session_factory", asynccontextmanager(app.dependency_overrides[get_db]))
+
+
+def test_update_avatar(client, headers):
+    response = client.patch("/api/users/avatar", files={"file": ("avatar.png", PNG, "image/png")}, headers=headers)
+    assert response.status_code == 200, response.text
+    avatar = response.json()["avatar"]
+    assert avatar.startswith("/api/users/avatars/")
+
+    response = client.get(avatar)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "image/webp"
+    assert "immutable" in response.headers["cache-control"]
+
+    response = client.get(avatar, headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304, response.text
+
+
+def test_update_avatar_too_large(client, headers, monkeypatch):
+    monkeypatch.setattr(avatar_service, "max_bytes", 10)
+    response = client.patch("/api/users/avatar", files={"file": ("avatar.png", PNG, "image/png")}, headers=headers)
+    assert response.status_code == 413, response.text
+
+
+def test_update_avatar_not_an_image(client, headers):
+    response = client.patch("/api/users/avatar", files={"file": ("a.txt", b"text", "text/plain")}, headers=headers)
+    assert response.status_code == 415, response.text
+    response = client.patch("/api/users/avatar", files={"file": ("a.png", b"text", "image/png")}, headers=headers)
+    assert response.status_code == 415, response.text
+
+
+def test_avatar_file_not_found(client):
+    response = client.get(f"/api/users/avatars/{'0' * 32}_256.webp")
+    assert response.status_code == 404, response.text
+
+
+def test_update_avatar_deferred(client, headers):
+    response = client.patch("/api/users/avatar", params={"defer": True},
+                            files={"file": ("avatar.png", PNG, "image/png")}, headers=headers)
+    assert response.status_code == 202, response.text
+    assert response.json()["status"] == "pending"
+    status_url = response.headers["location"]
+
+    response = client.get(status_url, headers=headers)
+    assert response.status_code == 200, response.text
+    job = response.json()
+    assert job["status"] == "done", job
+    assert client.get(job["avatar"]).status_code == 200
+
+    response = client.get("/api/users/profile/", headers=headers)
+    assert response.json()["avatar"] == job["avatar"]
+
+
+def test_avatar_job_not_found(client, headers):
+    response = client.get("/api/users/avatar/jobs/unknown", headers=headers)
+    assert response.status_code == 404, response.text
+
+
+def test_avatar_placeholder(client):
+    response = client.get("/api/users/avatars/placeholder.svg")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "image/svg+xml"
+    assert response.text.startswith("<svg")
@@ -0,0 +1,58 @@
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.database.pool import InstrumentedAsyncPool, PoolMonitor
+
+
+class TestPoolMonitor(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.monitor = PoolMonitor()
+        monitor = patch("src.database.pool.pool_monitor", self.monitor)
+        monitor.start()
+        self.addCleanup(monitor.stop)
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=InstrumentedAsyncPool,
+                                          pool_size=1, max_overflow=1, pool_timeout=0.1)
+        self.monitor.attach(self.engine.sync_engine)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_checkout_reuses_pooled_connection(self):
+        for _ in range(3):
+            async with self.engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        stats = self.monitor.snapshot()
+        self.assertEqual(stats["checkouts"], 3)
+        self.assertEqual(stats["checkins"], 3)
+        self.assertEqual(stats["connects"], 1)
+        self.assertEqual(stats["max_checked_out"], 1)
+        self.assertEqual(stats["connect_latency_seconds"]["count"], 1)
+        self.assertEqual(stats["checkout_latency_seconds"]["count"], 3)
+        self.assertEqual(stats["timeouts"], 0)
+
+    async def test_overflow_is_counted(self):
+        async with self.engine.connect() as first, self.engine.connect() as second:
+            await first.execute(text("SELECT 1"))
+            await second.execute(text("SELECT 1"))
+            stats = self.monitor.snapshot()
+            self.assertEqual(stats["checked_out"], 2)
+            self.assertEqual(stats["overflow"], 1)
+        stats = self.monitor.snapshot()
+        self.assertEqual(stats["max_checked_out"], 2)
+        self.assertEqual(stats["connects"], 2)
+        self.assertEqual(stats["connect_latency_seconds"]["count"], 2)
+
+    async def test_timeout_is_counted(self):
+        async with self.engine.connect(), self.engine.connect():
+            with self.assertRaises(PoolTimeoutError):
+                async with self.engine.connect():
+                    pass
+        stats = self.monitor.snapshot()
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertGreaterEqual(stats["checkout_latency_seconds"]["sum"], 0.1)
+        self.assertEqual(stats["connects"], 2)
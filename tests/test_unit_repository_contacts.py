@@ -1,46 +1,99 @@
 import unittest
-from datetime import datetime, timedelta
-from unittest.mock import MagicMock
+from datetime import date, datetime, timedelta
+from unittest.mock import MagicMock, patch
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.pool import StaticPool
 
-from src.database.models import User, Contact
-from src.schemas import ContactModel, ContactUpdate
+from src.database.models import Base, User, Contact, ContactTombstone
+from src.schemas import ContactModel, ContactUpdate, ContactBatch
 from src.repository.contacts import (
     read_contacts,
+    read_contacts_page,
+    encode_cursor,
+    decode_cursor,
+    encode_sync_token,
+    decode_sync_token,
+    read_changes,
     create_contact,
+    contact_values,
+    import_contacts,
+    next_change_seq,
     get_contact,
     update_contact,
     remove_contact,
+    apply_batch,
     search_contacts,
+    fuzzy_search_contacts,
     read_birthdays,
+    birthday_key_ranges,
+    next_birthday,
 )
 
 
 class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
         self.user = User(id=1)
 
+    def mock_result(self, rows=None, row=None):
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = rows
+        result.scalar_one_or_none.return_value = row
+        self.session.execute.return_value = result
+        return result
+
     def tearDown(self):
         self.user = None
         self.session = None
 
     async def test_get_contacts(self):
         contacts = [Contact(), Contact(), Contact()]
-        self.session.query().filter().offset().limit().all.return_value = contacts
+        self.mock_result(rows=contacts)
         result = await read_contacts(skip=0, limit=10, user=self.user, db=self.session)
         self.assertEqual(result, contacts)
 
+    async def test_get_contacts_page(self):
+        contacts = [Contact(id=1), Contact(id=2), Contact(id=3)]
+        self.mock_result(rows=contacts)
+        result, next_cursor = await read_contacts_page(cursor=None, limit=2, user=self.user, db=self.session)
+        self.assertEqual(result, contacts[:2])
+        self.assertEqual(decode_cursor(next_cursor), 2)
+
+    async def test_get_contacts_last_page(self):
+        contacts = [Contact(id=4)]
+        self.mock_result(rows=contacts)
+        result, next_cursor = await read_contacts_page(cursor=encode_cursor(3), limit=2, user=self.user,
+                                                       db=self.session)
+        self.assertEqual(result, contacts)
+        self.assertIsNone(next_cursor)
+
+    async def test_get_contacts_page_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            await read_contacts_page(cursor="not-a-cursor", limit=2, user=self.user, db=self.session)
+
+    def test_sync_token_round_trip(self):
+        self.assertEqual(decode_sync_token(encode_sync_token(42, 7)), (42, 7))
+        with self.assertRaises(ValueError):
+            decode_sync_token("not-a-token")
+        with self.assertRaises(ValueError):
+            decode_sync_token("eyJ0IjogIjIwMjUtMDMtMDFUMTI6MzA6MTUiLCAiaWQiOiA3fQ")
+
+    async def test_read_changes_invalid_token(self):
+        with self.assertRaises(ValueError):
+            await read_changes(since="not-a-token", limit=10, user=self.user, db=self.session)
+
     async def test_get_contact_found(self):
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        self.mock_result(row=contact)
         result = await get_contact(contact_id=1, user=self.user, db=self.session)
         self.assertEqual(result, contact)
 
     async def test_get_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.mock_result(row=None)
         result = await get_contact(contact_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
 
@@ -53,17 +106,19 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             birthday="1999-01-01",
             description="test1"
         )
+        self.session.scalar.return_value = Contact(id=1, name=body.name, surname=body.surname, email=body.email,
+                                                   phone=body.phone, birthday=body.birthday, user_id=self.user.id)
         result = await create_contact(body, self.user, self.session)
-        self.assertEqual(result.name, body.name)
-        self.assertEqual(result.surname, body.surname)
-        self.assertEqual(result.email, body.email)
-        self.assertEqual(result.phone, body.phone)
-        self.assertEqual(result.birthday, body.birthday)
-        self.assertEqual(result.description, body.description)
-        self.assertEqual(result.user_id, self.user.id)
-        self.session.add.assert_called_once_with(result)
-        self.session.commit.assert_called_once()
-        self.assertTrue(hasattr(result, "id"))
+        self.assertIs(result, self.session.scalar.return_value)
+        params = self.session.scalar.await_args.args[0].compile().params
+        self.assertEqual(params["name"], body.name)
+        self.assertEqual(params["email"], body.email)
+        self.assertEqual(params["birthday_key"], 101)
+        self.assertEqual(params["description"], body.description)
+        self.assertEqual(params["user_id"], self.user.id)
+        self.session.add.assert_not_called()
+        self.session.refresh.assert_not_awaited()
+        self.session.commit.assert_awaited_once()
 
     async def test_update_contact_found(self):
         body = ContactUpdate(name="Test2",
@@ -72,16 +127,41 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
                              description="test2",
                              phone="+380990000002",
                              )
-
-        self.session.query().filter().first.return_value = self.session.query().filter().first()
-        self.session.commit.return_value = None
+        contact = Contact(id=1, user_id=self.user.id, name="Test2", surname="User2")
+        self.session.scalar.return_value = contact
 
         result = await update_contact(contact_id=1, body=body, user=self.user, db=self.session)
 
-        self.assertEqual(result.name, body.name)
-        self.assertEqual(result.surname, body.surname)
-        self.assertEqual(result.email, body.email)
-        self.assertEqual(result.description, body.description)
+        self.assertIs(result, contact)
+        params = self.session.scalar.await_args.args[0].compile().params
+        self.assertEqual(params["name"], body.name)
+        self.assertEqual(params["surname"], body.surname)
+        self.assertEqual(params["email"], body.email)
+        self.assertEqual(params["description"], body.description)
+        self.session.execute.assert_not_awaited()
+        self.session.commit.assert_awaited_once()
+
+    async def test_update_contact_partial(self):
+        body = ContactUpdate(name=None, description=None, birthday=datetime(1990, 12, 31))
+        self.session.scalar.return_value = Contact(id=1, user_id=self.user.id, name="Test", surname="User")
+
+        await update_contact(contact_id=1, body=body, user=self.user, db=self.session)
+
+        params = self.session.scalar.await_args.args[0].compile().params
+        self.assertNotIn("name", params)
+        self.assertNotIn("surname", params)
+        self.assertIsNone(params["description"])
+        self.assertEqual(params["birthday_key"], 1231)
+
+    async def test_update_contact_nothing_to_update(self):
+        contact = Contact(id=1, user_id=self.user.id)
+        self.mock_result(row=contact)
+
+        result = await update_contact(contact_id=1, body=ContactUpdate(name=None), user=self.user, db=self.session)
+
+        self.assertIs(result, contact)
+        self.session.scalar.assert_not_awaited()
+        self.session.commit.assert_not_awaited()
 
     async def test_update_contact_not_found(self):
         body = ContactUpdate(name="Test2",
@@ -89,23 +169,43 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
                              email="test2@gmail.com",
                              phone="+380990000002",
                              description="test2")
-        self.session.query().filter().first.return_value = None
-        self.session.commit.return_value = None
+        self.session.scalar.return_value = None
 
         result = await update_contact(contact_id=1, body=body, user=self.user, db=self.session)
 
         self.assertIsNone(result)
+        self.session.commit.assert_not_awaited()
 
     async def test_remove_contact_found(self):
-        contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        contact = Contact(id=1, user_id=self.user.id)
+        self.session.scalar.return_value = contact
         result = await remove_contact(contact_id=1, user=self.user, db=self.session)
         self.assertEqual(result, contact)
+        self.session.delete.assert_not_awaited()
+        tombstone = self.session.add.call_args.args[0]
+        self.assertIsInstance(tombstone, ContactTombstone)
+        self.assertEqual(tombstone.contact_id, contact.id)
+        self.assertEqual(tombstone.user_id, self.user.id)
+        self.session.commit.assert_awaited_once()
 
     async def test_remove_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.scalar.return_value = None
         result = await remove_contact(contact_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
+        self.session.add.assert_not_called()
+
+    async def test_apply_batch_rejects_unknown_and_repeated_contacts(self):
+        self.mock_result(rows=[])
+        batch = ContactBatch.model_validate({"operations": [
+            {"op": "delete", "id": 1},
+            {"op": "delete", "id": 2},
+            {"op": "delete", "id": 2},
+        ]})
+        results = await apply_batch(batch.operations, user=self.user, db=self.session)
+        self.assertEqual([result["status"] for result in results], [404, 409, 409])
+        self.assertEqual([result["index"] for result in results], [0, 1, 2])
+        self.session.execute.assert_awaited_once()
+        self.session.commit.assert_not_awaited()
 
     async def test_search_contacts(self):
         user = self.user
@@ -114,12 +214,31 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             Contact(id=3, user_id=user.id, name="Jane", surname="Doe", email="jane@example.com", phone="+380990000003")
         ]
 
-        self.session.query().filter().all.return_value = contacts
+        self.mock_result(rows=contacts)
 
         result = await search_contacts(user=user, db=self.session, name="John", surname=None, email=None)
 
         self.assertEqual(result, contacts)
-        self.session.query().filter.assert_called()
+        self.session.execute.assert_awaited_once()
+
+    async def test_fuzzy_search_contacts(self):
+        contacts = [
+            Contact(id=1, name="John", surname="Doe", email="john@example.com", phone="+380990000004"),
+            Contact(id=2, name="Jane", surname="Johnson", email="jane@example.com", phone="+380990000003"),
+            Contact(id=3, name="Alice", surname="Smith", email="alice@example.com", phone="+380990000005",
+                    description="met at Jhon's party"),
+            Contact(id=4, name="Bob", surname="Brown", email="bob@example.com", phone="+380990000006"),
+        ]
+        self.mock_result(rows=contacts)
+
+        result = await fuzzy_search_contacts(user=self.user, db=self.session, q="John")
+        self.assertEqual([contact.id for contact in result], [1, 2, 3])
+
+        result = await fuzzy_search_contacts(user=self.user, db=self.session, q="smth")
+        self.assertEqual([contact.id for contact in result], [3])
+
+        result = await fuzzy_search_contacts(user=self.user, db=self.session, q="zzz")
+        self.assertEqual(result, [])
 
     async def test_read_birthdays(self):
         user = self.user
@@ -132,12 +251,134 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
                     birthday=end_date)
         ]
 
-        self.session.query().filter().all.return_value = contacts
+        self.mock_result(rows=contacts)
 
         result = await read_birthdays(db=self.session, user=user, days=7)
 
         self.assertEqual(result, contacts)
-        self.session.query().filter.assert_called()
+        self.session.execute.assert_awaited_once()
+
+
+    def test_birthday_key_ranges(self):
+        self.assertEqual(birthday_key_ranges(date(2025, 6, 10), 7), [(610, 617)])
+
+    def test_birthday_key_ranges_year_wrap(self):
+        self.assertEqual(birthday_key_ranges(date(2025, 12, 28), 7), [(1228, 1231), (101, 104)])
+
+    def test_birthday_key_ranges_leap_day(self):
+        self.assertEqual(birthday_key_ranges(date(2025, 3, 1), 3), [(229, 304)])
+        self.assertEqual(birthday_key_ranges(date(2024, 3, 1), 3), [(301, 304)])
+        self.assertEqual(birthday_key_ranges(date(2025, 2, 25), 7), [(225, 304)])
+
+    def test_next_birthday(self):
+        self.assertEqual(next_birthday(datetime(1990, 1, 2), date(2025, 12, 29)), date(2026, 1, 2))
+        self.assertEqual(next_birthday(date(1990, 12, 29), date(2025, 12, 29)), date(2025, 12, 29))
+        self.assertEqual(next_birthday(date(2000, 2, 29), date(2025, 2, 1)), date(2025, 3, 1))
+        self.assertEqual(next_birthday(date(2000, 2, 29), date(2028, 2, 1)), date(2028, 2, 29))
+
+    def test_birthday_key_ranges_whole_year(self):
+        self.assertEqual(birthday_key_ranges(date(2025, 6, 10), 365), [(101, 1231)])
+
+
+class TestContactsDatabase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with self.sessions() as db:
+            db.add_all([User(id=1, username="a", email="a@example.com", password="x"),
+                        User(id=2, username="b", email="b@example.com", password="x"),
+                        Contact(name="Old", surname="Doe", email="taken@example.com", phone="+380501234567",
+                                user_id=2)])
+            await db.commit()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    def values(self, name, email):
+        body = ContactModel(name=name, surname="Doe", email=email, phone="+380501234567", birthday=date(1990, 1, 2))
+        return contact_values(body, 1)
+
+    async def test_existing_emails_are_skipped(self):
+        async with self.sessions() as db:
+            inserted = await import_contacts([self.values("John", "john@example.com"),
+                                              self.values("Taken", "taken@example.com")], db)
+        self.assertEqual(inserted, {"john@example.com"})
+        async with self.sessions() as db:
+            rows = (await db.execute(select(Contact.email, Contact.name, Contact.user_id)
+                                     .order_by(Contact.email))).all()
+        self.assertEqual(rows, [("john@example.com", "John", 1), ("taken@example.com", "Old", 2)])
+
+    async def test_all_conflicting_inserts_nothing(self):
+        async with self.sessions() as db:
+            self.assertEqual(await import_contacts([self.values("Taken", "taken@example.com")], db), set())
+
+    async def test_apply_batch_updates_partial_rows(self):
+        async with self.sessions() as db:
+            first = await create_contact(ContactModel(**self.values("A", "a@example.com")), User(id=1), db)
+            second = await create_contact(ContactModel(**self.values("B", "b@example.com")), User(id=1), db)
+            batch = ContactBatch.model_validate({"operations": [
+                {"op": "update", "id": first.id, "data": {"name": "A2"}},
+                {"op": "update", "id": second.id, "data": {"surname": "Roe", "description": "moved"}},
+            ]})
+            results = await apply_batch(batch.operations, User(id=1), db)
+        self.assertEqual([result["status"] for result in results], [200, 200])
+        self.assertEqual((results[0]["contact"].name, results[0]["contact"].surname), ("A2", "Doe"))
+        self.assertEqual((results[1]["contact"].name, results[1]["contact"].surname), ("B", "Roe"))
+
+    async def test_apply_batch_update_checks_owner(self):
+        async with self.sessions() as db:
+            contact_id = (await create_contact(ContactModel(**self.values("A", "a@example.com")), User(id=1), db)).id
+            execute = db.execute
+            moved = []
+
+            async def execute_and_move(stmt, *args, **kwargs):
+                result = await execute(stmt, *args, **kwargs)
+                if not moved:
+                    # another transaction hands the contact over right after the ownership check
+                    moved.append(contact_id)
+                    await execute(update(Contact).where(Contact.id == contact_id).values(user_id=2))
+                return result
+
+            batch = ContactBatch.model_validate({"operations": [
+                {"op": "update", "id": contact_id, "data": {"name": "Stolen"}}]})
+            with patch.object(db, "execute", side_effect=execute_and_move):
+                with self.assertRaises(StaleDataError):
+                    await apply_batch(batch.operations, User(id=1), db)
+        async with self.sessions() as db:
+            self.assertEqual(await db.scalar(select(Contact.name).filter(Contact.id == contact_id)), "A")
+
+    async def sync(self, since=None, limit=10):
+        async with self.sessions() as db:
+            updated, deleted, token, has_more = await read_changes(since, limit, User(id=1), db)
+        return [contact.email for contact in updated], deleted, token, has_more
+
+    async def test_next_change_seq_counts_per_user(self):
+        async with self.sessions() as db:
+            self.assertEqual([await next_change_seq(1, db), await next_change_seq(1, db),
+                              await next_change_seq(2, db)], [1, 2, 1])
+            await db.rollback()
+            self.assertEqual(await next_change_seq(1, db), 1)
+
+    async def test_changes_follow_the_change_sequence(self):
+        async with self.sessions() as db:
+            first = await create_contact(ContactModel(**self.values("A", "a@example.com")), User(id=1), db)
+            await create_contact(ContactModel(**self.values("B", "b@example.com")), User(id=1), db)
+        self.assertEqual((await self.sync())[:2], (["a@example.com", "b@example.com"], []))
+        _, _, token, _ = await self.sync(limit=1)
+        self.assertEqual(decode_sync_token(token), (1, first.id))
+        self.assertEqual((await self.sync(token))[0], ["b@example.com"])
+
+        _, _, token, _ = await self.sync()
+        async with self.sessions() as db:
+            await update_contact(first.id, ContactUpdate(name="A2"), User(id=1), db)
+            await remove_contact(first.id, User(id=1), db)
+            self.assertIsNone(await remove_contact(first.id, User(id=1), db))
+        emails, deleted, token, has_more = await self.sync(token)
+        self.assertEqual((emails, deleted, has_more), ([], [first.id], False))
+        self.assertEqual((await self.sync(token))[:2], ([], []))
 
 
 if __name__ == '__main__':
@@ -9,13 +9,14 @@ from src.repository.users import (
 )
 from src.database.models import User
 from src.schemas import UserModel
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
 class TestUsers(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
 
         self.user_data = UserModel(
             username="test_user",
@@ -39,50 +40,44 @@ class TestUsers(unittest.IsolatedAsyncioTestCase):
         self.existing_user = None
 
     async def test_get_user_by_email(self):
-        self.session.query.return_value.filter.return_value.first.return_value = self.existing_user
+        self.session.execute.return_value.scalar_one_or_none.return_value = self.existing_user
 
         result = await get_user_by_email("test@example.com", self.session)
         self.assertEqual(result, self.existing_user)
         self.assertEqual(result.email, "test@example.com")
-        self.session.query.assert_called_once_with(User)
-        self.session.query().filter.assert_called_once()
-        self.session.query().filter().first.assert_called_once()
-
-    @patch('src.repository.users.Gravatar')
-    async def test_create_user(self, mock_gravatar):
-        mock_gravatar.return_value.get_image.return_value = "new_avatar_url"
-        self.session.add = MagicMock()
-        self.session.commit = MagicMock()
-        self.session.refresh = MagicMock()
+        self.session.execute.assert_awaited_once()
+        self.session.execute.return_value.scalar_one_or_none.assert_called_once()
 
+    @patch('src.repository.users.settings')
+    async def test_create_user(self, mock_settings):
+        mock_settings.avatar_placeholder_url = "placeholder_url"
         result = await create_user(self.user_data, self.session)
         self.assertIsInstance(result, User)
         self.assertEqual(result.email, "test@example.com")
-        self.assertEqual(result.avatar, "new_avatar_url")
+        self.assertEqual(result.avatar, "placeholder_url")
         self.session.add.assert_called_once_with(result)
-        self.session.commit.assert_called_once()
-        self.session.refresh.assert_called_once_with(result)
+        self.session.commit.assert_awaited_once()
+        self.session.refresh.assert_awaited_once_with(result)
 
     async def test_update_token(self):
         new_token = "new_refresh_token"
-        self.session.commit = MagicMock()
         await update_token(self.existing_user, new_token, self.session)
         self.assertEqual(self.existing_user.refresh_token, new_token)
-        self.session.commit.assert_called_once()
+        self.session.commit.assert_awaited_once()
 
     async def test_confirmed_email(self):
-        self.session.query.return_value.filter.return_value.first.return_value = self.existing_user
+        self.session.execute.return_value.scalar_one_or_none.return_value = self.existing_user
         self.existing_user.confirmed = False
         await confirmed_email("test@example.com", self.session)
         self.assertTrue(self.existing_user.confirmed)
-        self.session.commit.assert_called_once()
+        self.session.commit.assert_awaited_once()
 
     async def test_update_avatar(self):
         new_avatar_url = "new_avatar_url"
-        self.session.query.return_value.filter.return_value.first.return_value = self.existing_user
+        self.session.execute.return_value.scalar_one_or_none.return_value = self.existing_user
         result = await update_avatar("test@example.com", new_avatar_url, self.session)
         self.assertEqual(result.avatar, new_avatar_url)
-        self.session.commit.assert_called_once()
+        self.session.commit.assert_awaited_once()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,113 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from src.services.autocomplete import AutocompleteIndex, UserIndex
+
+
+class TestUserIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = UserIndex([(1, "John", "Doe"), (2, "Jane", "Dowson"), (3, "Bob", "Johnson")])
+
+    def test_search_matches_name_surname_and_full_name(self):
+        self.assertEqual(self.index.search("jo", 10), [(1, "John", "Doe"), (3, "Bob", "Johnson")])
+        self.assertEqual(self.index.search("DO", 10), [(1, "John", "Doe"), (2, "Jane", "Dowson")])
+        self.assertEqual(self.index.search("john d", 10), [(1, "John", "Doe")])
+        self.assertEqual(self.index.search("x", 10), [])
+
+    def test_search_matches_each_word(self):
+        self.index.add(4, "Mary Anne", "Van Dyke")
+        self.assertEqual(self.index.search("anne", 10), [(4, "Mary Anne", "Van Dyke")])
+        self.assertEqual(self.index.search("dy", 10), [(4, "Mary Anne", "Van Dyke")])
+        self.assertEqual(self.index.search("mary anne v", 10), [(4, "Mary Anne", "Van Dyke")])
+        self.index.remove(4)
+        self.assertEqual(self.index.search("anne", 10), [])
+        self.assertEqual(len(self.index.entries), 9)
+
+    def test_search_respects_limit(self):
+        self.assertEqual(len(self.index.search("j", 1)), 1)
+
+    def test_add_replaces_and_remove_deletes(self):
+        self.index.add(1, "Jack", "Smith")
+        self.assertEqual(self.index.search("john", 10), [(3, "Bob", "Johnson")])
+        self.assertEqual(self.index.search("sm", 10), [(1, "Jack", "Smith")])
+        self.index.remove(1)
+        self.assertEqual(self.index.search("sm", 10), [])
+        self.assertEqual(len(self.index.entries), 6)
+
+    def test_size_follows_writes(self):
+        built = UserIndex([(2, "Jane", "Dowson"), (3, "Bob", "Johnson")]).size
+        self.index.add(4, "Alice", "Smith")
+        self.index.remove(4)
+        self.index.remove(1)
+        self.assertEqual(self.index.size, built)
+
+
+class TestAutocompleteIndex(unittest.IsolatedAsyncioTestCase):
+
+    async def test_builds_lazily_once(self):
+        index = AutocompleteIndex(max_bytes=1 << 20, ttl=60)
+        loader = AsyncMock(return_value=[(1, "John", "Doe")])
+        await index.search(1, "jo", 10, loader)
+        result = await index.search(1, "do", 10, loader)
+        self.assertEqual(result, [(1, "John", "Doe")])
+        loader.assert_awaited_once()
+
+    async def test_hooks_update_loaded_index_only(self):
+        index = AutocompleteIndex(max_bytes=1 << 20, ttl=60)
+        index.add(1, 2, "Jane", "Roe")
+        self.assertNotIn(1, index.users)
+        await index.search(1, "jo", 10, AsyncMock(return_value=[(1, "John", "Doe")]))
+        index.add(1, 2, "Jane", "Roe")
+        index.remove(1, 1)
+        self.assertEqual(await index.search(1, "j", 10, AsyncMock()), [(2, "Jane", "Roe")])
+
+    async def test_rebuilds_after_ttl(self):
+        index = AutocompleteIndex(max_bytes=1 << 20, ttl=60)
+        loader = AsyncMock(return_value=[(1, "John", "Doe")])
+        with patch("src.services.autocomplete.time.monotonic", return_value=100):
+            await index.search(1, "jo", 10, loader)
+        with patch("src.services.autocomplete.time.monotonic", return_value=161):
+            await index.search(1, "jo", 10, loader)
+        self.assertEqual(loader.await_count, 2)
+
+    async def test_evicts_least_recently_used_over_memory_cap(self):
+        contacts = [(i, f"Name{i}", f"Surname{i}") for i in range(50)]
+        size = UserIndex(contacts).size
+        index = AutocompleteIndex(max_bytes=size * 2, ttl=60)
+        for user_id in (1, 2):
+            await index.search(user_id, "n", 10, AsyncMock(return_value=contacts))
+        await index.search(1, "n", 10, AsyncMock())
+        await index.search(3, "n", 10, AsyncMock(return_value=contacts))
+        self.assertEqual(list(index.users), [1, 3])
+        self.assertEqual(index.total_bytes, size * 2)
+
+    async def test_growth_counts_against_memory_cap(self):
+        contacts = [(i, f"Name{i}", f"Surname{i}") for i in range(50)]
+        size = UserIndex(contacts).size
+        index = AutocompleteIndex(max_bytes=size * 2, ttl=60)
+        for user_id in (1, 2):
+            await index.search(user_id, "n", 10, AsyncMock(return_value=contacts))
+        for contact_id in range(50, 60):
+            index.add(2, contact_id, f"Name{contact_id}", f"Surname{contact_id}")
+        self.assertEqual(list(index.users), [2])
+        self.assertEqual(index.total_bytes, index.users[2][0].size)
+        self.assertGreater(index.total_bytes, size)
+
+    async def test_write_during_load_is_not_lost(self):
+        index = AutocompleteIndex(max_bytes=1 << 20, ttl=60)
+
+        async def loader():
+            index.add(1, 2, "Jane", "Roe")
+            return [(1, "John", "Doe")]
+
+        await index.search(1, "jo", 10, loader)
+        self.assertNotIn(1, index.users)
+        self.assertEqual(index.loading, {})
+        fresh = AsyncMock(return_value=[(1, "John", "Doe"), (2, "Jane", "Roe")])
+        self.assertEqual(await index.search(1, "ja", 10, fresh), [(2, "Jane", "Roe")])
+        self.assertIn(1, index.users)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+from starlette.datastructures import Headers
+
+from src.database.models import User
+from src.services.avatars import (AvatarJobs, AvatarService, AvatarStorage, AvatarStorageError, DerivativeCache,
+                                  LocalStorage)
+from src.services.images import InvalidImage, make_thumbnails
+from src.services.workers import BoundedExecutor
+
+
+def upload(data: bytes, content_type: str = "image/png") -> UploadFile:
+    return UploadFile(BytesIO(data), filename="avatar", headers=Headers({"content-type": content_type}))
+
+
+def image(size=(400, 300), mode="RGB", color="red") -> bytes:
+    out = BytesIO()
+    Image.new(mode, size, color).save(out, "PNG")
+    return out.getvalue()
+
+
+class TestAvatarStorage(unittest.TestCase):
+
+    def test_backend_must_implement_save(self):
+        class Incomplete(AvatarStorage):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+class TestMakeThumbnails(unittest.TestCase):
+
+    def test_square_thumbnails(self):
+        thumbnails = make_thumbnails(image(), [64, 256, 128])
+        self.assertEqual(list(thumbnails), [256, 128, 64])
+        for size, data in thumbnails.items():
+            with Image.open(BytesIO(data)) as thumbnail:
+                self.assertEqual((thumbnail.format, thumbnail.size), ("WEBP", (size, size)))
+
+    def test_keeps_transparency(self):
+        thumbnails = make_thumbnails(image(mode="RGBA", color=(255, 0, 0, 0)), [64])
+        with Image.open(BytesIO(thumbnails[64])) as thumbnail:
+            self.assertEqual(thumbnail.mode, "RGBA")
+
+    def test_invalid_image(self):
+        with self.assertRaises(InvalidImage):
+            make_thumbnails(b"not an image", [64])
+        with self.assertRaises(InvalidImage):
+            make_thumbnails(image(), [64], max_pixels=1000)
+
+
+class TestDerivativeCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used_over_budget(self):
+        cache = DerivativeCache(max_bytes=10)
+        cache.set("a", b"1234")
+        cache.set("b", b"1234")
+        cache.get("a")
+        cache.set("c", b"1234")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (b"1234", b"1234"))
+        self.assertEqual(cache.total_bytes, 8)
+
+
+class TestLocalStorage(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.executor = BoundedExecutor("test-avatars", max_workers=1, max_pending=4)
+        self.storage = LocalStorage(self.tmp.name, "/api/users/avatars/", self.executor, self.executor,
+                                    sizes=(64, 128), default_size=128)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.tmp.cleanup()
+
+    async def test_save_is_content_addressed(self):
+        url = await self.storage.save("deadpool", image(), "image/png")
+        self.assertRegex(url, r"^/api/users/avatars/[0-9a-f]{32}_128\.webp$")
+        self.assertEqual(await self.storage.save("wolverine", image(), "image/png"), url)
+        self.assertEqual(len(list(Path(self.tmp.name).iterdir())), 2)
+        self.assertNotEqual(await self.storage.save("deadpool", image((50, 50)), "image/png"), url)
+
+    async def test_read_uses_memory_cache(self):
+        name = (await self.storage.save("deadpool", image(), "image/png")).rsplit("/", 1)[1]
+        data = await self.storage.read(name)
+        (Path(self.tmp.name) / name).unlink()
+        self.assertEqual(await self.storage.read(name), data)
+        self.assertEqual(self.storage.cache.hits, 1)
+
+    async def test_read_missing(self):
+        self.assertIsNone(await self.storage.read("0" * 32 + "_64.webp"))
+        self.assertIsNone(await self.storage.read("../secret.webp"))
+
+
+class TestAvatarService(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.storage = MagicMock(save=AsyncMock(return_value="http://avatars/1.webp"))
+        self.service = AvatarService(self.storage, AvatarJobs(), max_bytes=10)
+        self.user = User(id=1, username="deadpool", email="deadpool@example.com")
+
+    async def test_read(self):
+        self.assertEqual(await self.service.read(upload(b"0123456789")), b"0123456789")
+
+    async def test_read_too_large(self):
+        with self.assertRaises(HTTPException) as e:
+            await self.service.read(upload(b"01234567890"))
+        self.assertEqual(e.exception.status_code, 413)
+        with self.assertRaises(HTTPException) as e:
+            await self.service.read(upload(b""), content_length=1 << 20)
+        self.assertEqual(e.exception.status_code, 413)
+
+    async def test_read_not_an_image(self):
+        with self.assertRaises(HTTPException) as e:
+            await self.service.read(upload(b"text", "text/plain"))
+        self.assertEqual(e.exception.status_code, 415)
+
+    async def test_store(self):
+        self.assertEqual(await self.service.store(self.user, b"png", "image/png"), "http://avatars/1.webp")
+        self.storage.save.assert_awaited_once_with("deadpool", b"png", "image/png")
+
+    async def test_run_job_records_failure(self):
+        self.storage.save.side_effect = AvatarStorageError("upload failed")
+        job_id = await self.service.defer(self.user)
+        self.assertEqual((await self.service.jobs.get(job_id))["status"], "pending")
+        await self.service.run_job(job_id, self.user, b"png", "image/png")
+        self.assertEqual(await self.service.jobs.get(job_id),
+                         {"user_id": 1, "status": "failed", "detail": "upload failed"})
+
+    async def test_run_job_updates_user(self):
+        session = AsyncMock()
+        self.service.session_factory = MagicMock(return_value=session)
+        session.__aenter__.return_value = session
+        repository = AsyncMock()
+        with patch("src.services.avatars.repository_users.update_avatar", repository):
+            await self.service.run_job("job", self.user, b"png", "image/png")
+        repository.assert_awaited_once_with("deadpool@example.com", "http://avatars/1.webp", session)
+        self.assertEqual((await self.service.jobs.get("job"))["avatar"], "http://avatars/1.webp")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+from collections import namedtuple
+from datetime import date, datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from aiosmtplib import SMTPResponseException
+
+from src.services.birthday_digest import BirthdayDigest
+
+UserRow = namedtuple("UserRow", "id username email")
+ContactRow = namedtuple("ContactRow", "name surname birthday")
+TODAY = date(2025, 12, 29)
+
+
+def rows(count: int):
+    async def stream(*args, **kwargs):
+        for user_id in range(1, count + 1):
+            yield (UserRow(user_id, f"user{user_id}", f"user{user_id}@example.com"),
+                   [ContactRow("John", "Doe", datetime(1990, 1, 2))])
+    return stream
+
+
+class TestBirthdayDigest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.mailer = MagicMock(send=AsyncMock())
+
+    def test_context(self):
+        context = BirthdayDigest.context(UserRow(1, "user", "user@example.com"),
+                                         [ContactRow("John", "Doe", datetime(1990, 1, 2))], TODAY)
+        self.assertEqual(context, {"username": "user", "contacts": [
+            {"name": "John", "surname": "Doe", "date": "January 2", "days": 4}]})
+
+    async def test_sends_one_digest_per_user(self):
+        digest = BirthdayDigest(self.mailer)
+        with patch("src.services.birthday_digest.stream_birthdays_by_user", rows(3)):
+            result = await digest.run(MagicMock(), today=TODAY)
+        self.assertEqual((result["users"], result["sent"], result["last_user_id"]), (3, 3, 3))
+        message = self.mailer.send.await_args.args[0]
+        self.assertEqual(message["To"], "user3@example.com")
+        self.assertIn("John Doe", message.get_payload(decode=True).decode())
+
+    async def test_bounded_concurrency(self):
+        in_flight = peak = 0
+
+        async def send(message):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.001)
+            in_flight -= 1
+
+        self.mailer.send.side_effect = send
+        digest = BirthdayDigest(self.mailer, concurrency=4)
+        with patch("src.services.birthday_digest.stream_birthdays_by_user", rows(20)):
+            result = await digest.run(MagicMock(), today=TODAY)
+        self.assertEqual(result["sent"], 20)
+        self.assertEqual(peak, 4)
+
+    async def test_stops_at_budget(self):
+        digest = BirthdayDigest(self.mailer, budget=0)
+        with patch("src.services.birthday_digest.stream_birthdays_by_user", rows(3)):
+            result = await digest.run(MagicMock(), today=TODAY, after_user_id=7)
+        self.assertTrue(result["timed_out"])
+        self.assertEqual((result["users"], result["last_user_id"]), (0, 7))
+
+    async def test_failed_digest_is_queued(self):
+        self.mailer.send.side_effect = SMTPResponseException(451, "try again later")
+        queue = MagicMock(redis=MagicMock(), enqueue=AsyncMock())
+        digest = BirthdayDigest(self.mailer, queue=queue)
+        with patch("src.services.birthday_digest.stream_birthdays_by_user", rows(1)):
+            result = await digest.run(MagicMock(), today=TODAY)
+        self.assertEqual((result["sent"], result["queued"], result["failed"]), (0, 1, 0))
+        self.assertEqual(queue.enqueue.await_args.args[2], "birthday_digest.html")
+
+    async def test_failed_digest_without_queue(self):
+        self.mailer.send.side_effect = ConnectionRefusedError()
+        digest = BirthdayDigest(self.mailer)
+        with patch("src.services.birthday_digest.stream_birthdays_by_user", rows(2)):
+            result = await digest.run(MagicMock(), today=TODAY)
+        self.assertEqual(result["failed"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
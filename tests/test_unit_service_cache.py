@@ -0,0 +1,224 @@
+import json
+import unittest
+from datetime import datetime
+from importlib.util import find_spec
+from typing import List
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+from pydantic import TypeAdapter
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from src.database.models import Contact, User
+from src.schemas import ContactResponse
+from src.services.cache import LRUCache, ResponseCache, UserCache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_expires_entries(self):
+        cache = LRUCache(maxsize=2, ttl=10)
+        with patch("src.services.cache.time.monotonic", return_value=100):
+            cache.set("a", 1)
+        with patch("src.services.cache.time.monotonic", return_value=111):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+
+class TestUserCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = AsyncMock()
+        self.redis.get.return_value = None
+        self.script = AsyncMock(return_value=1)
+        self.redis.register_script = MagicMock(return_value=self.script)
+        self.cache = UserCache(redis=self.redis, ttl=300, local_ttl=10, local_maxsize=10)
+        self.user = User(id=1, username="deadpool", email="deadpool@example.com", password="hash",
+                         refresh_token="token", avatar="avatar_url", confirmed=True,
+                         created_at=datetime(2025, 2, 20, 12, 0))
+
+    def tearDown(self):
+        self.redis = None
+        self.cache = None
+        self.user = None
+
+    async def test_set_and_get_local(self):
+        await self.cache.set(self.user, await self.cache.generation(self.user.email))
+        self.redis.get.reset_mock()
+        result = await self.cache.get(self.user.email)
+        self.assertEqual(result.id, self.user.id)
+        self.assertEqual(result.created_at, self.user.created_at)
+        self.assertNotIn("password", result.__dict__)
+        self.assertNotIn("refresh_token", result.__dict__)
+        self.redis.get.assert_not_awaited()
+        self.assertEqual(self.script.await_args.kwargs["keys"],
+                         ["user:deadpool@example.com", "user:generation:deadpool@example.com"])
+        generation, stored, ttl = self.script.await_args.kwargs["args"]
+        self.assertEqual((generation, ttl), (0, 300))
+        self.assertNotIn("password", json.loads(stored))
+
+    async def test_get_from_redis(self):
+        self.redis.get.return_value = json.dumps(UserCache._dump(self.user))
+        result = await self.cache.get(self.user.email)
+        self.assertEqual(result.email, self.user.email)
+        self.redis.get.assert_awaited_once_with("user:deadpool@example.com")
+
+    async def test_invalidate(self):
+        await self.cache.set(self.user, await self.cache.generation(self.user.email))
+        await self.cache.invalidate(self.user.email)
+        self.assertIsNone(await self.cache.get(self.user.email))
+        self.redis.incr.assert_awaited_once_with("user:generation:deadpool@example.com")
+        self.redis.delete.assert_awaited_once_with("user:deadpool@example.com")
+
+    async def test_set_after_invalidation_keeps_local_tier_empty(self):
+        generation = await self.cache.generation(self.user.email)
+        await self.cache.invalidate(self.user.email)
+        await self.cache.set(self.user, generation)
+        self.assertIsNone(self.cache.local.get(self.user.email))
+        await self.cache.set(self.user, await self.cache.generation(self.user.email))
+        self.assertIsNotNone(self.cache.local.get(self.user.email))
+
+    async def test_set_skips_redis_when_generation_is_unknown(self):
+        self.redis.get.side_effect = RedisConnectionError()
+        await self.cache.set(self.user, await self.cache.generation(self.user.email))
+        self.script.assert_not_awaited()
+        self.assertIsNotNone(self.cache.local.get(self.user.email))
+
+    async def test_redis_errors_are_misses(self):
+        self.redis.get.side_effect = RedisConnectionError()
+        self.assertIsNone(await self.cache.get(self.user.email))
+
+
+@unittest.skipUnless(find_spec("fakeredis") and find_spec("lupa"), "fakeredis and lupa are required")
+class TestUserCacheGenerations(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        from fakeredis import FakeAsyncRedis
+
+        self.redis = FakeAsyncRedis(decode_responses=True)
+        self.user = User(id=1, username="deadpool", email="deadpool@example.com", avatar="old", confirmed=True)
+
+    async def asyncTearDown(self):
+        await self.redis.aclose()
+
+    async def test_stale_row_is_not_cached_after_invalidation_by_another_worker(self):
+        reader = UserCache(redis=self.redis)
+        writer = UserCache(redis=self.redis)
+        generation = await reader.generation(self.user.email)
+        await writer.invalidate(self.user.email)
+        await reader.set(self.user, generation)
+        self.assertIsNone(await writer.get(self.user.email))
+        await reader.set(self.user, await reader.generation(self.user.email))
+        self.assertEqual((await writer.get(self.user.email)).avatar, "old")
+
+
+class FakeRedis:
+    """
+    Just enough of the Redis client for ResponseCache.
+    """
+
+    def __init__(self):
+        self.store = {}
+        self.get = AsyncMock(side_effect=lambda key: self.store.get(key))
+        self.set = AsyncMock(side_effect=lambda key, value, ex=None: self.store.__setitem__(key, value))
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.cache = ResponseCache(redis=self.redis, ttl=300, disabled=["search_contacts"])
+        self.adapter = TypeAdapter(List[ContactResponse])
+        self.load = AsyncMock(return_value=[Contact(id=1, name="John", surname="Doe", email="john@example.com",
+                                                    phone="+380501234567")])
+        # the session only serves the version lookup, users.change_seq of the user
+        self.db = MagicMock(scalar=AsyncMock(return_value=3))
+
+    async def fetch(self, route="read_contacts", params=None, request=None):
+        return await self.cache.fetch(route, User(id=1), self.db, params or {"skip": 0}, self.load, self.adapter,
+                                      request)
+
+    async def test_miss_then_hit(self):
+        first = await self.fetch()
+        second = await self.fetch()
+        self.assertEqual(first.body, second.body)
+        self.assertEqual(json.loads(second.body)[0]["email"], "john@example.com")
+        self.load.assert_awaited_once()
+        self.assertEqual(self.cache.snapshot()["routes"]["read_contacts"],
+                         {"hits": 1, "misses": 1, "not_modified": 0, "errors": 0})
+        self.assertTrue(all(key.startswith("contacts:1:3:read_contacts:") for key in self.redis.store))
+
+    async def test_params_are_part_of_the_key(self):
+        await self.fetch(params={"skip": 0})
+        await self.fetch(params={"skip": 10})
+        self.assertEqual(self.load.await_count, 2)
+
+    async def test_write_invalidates_user(self):
+        await self.fetch()
+        self.db.scalar.return_value = 4
+        await self.fetch()
+        self.assertEqual(self.load.await_count, 2)
+
+    async def test_if_none_match_returns_304_without_loading(self):
+        first = await self.fetch()
+        etag = first.headers["etag"]
+        self.assertRegex(etag, r'^W/"3-[0-9a-f]{16}"$')
+        self.redis.get.reset_mock()
+        request = MagicMock(headers={"if-none-match": f'"other", {etag}'})
+        response = await self.fetch(request=request)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["etag"], etag)
+        self.redis.get.assert_not_awaited()
+        self.load.assert_awaited_once()
+
+    async def test_wildcard_matches_only_existing_responses(self):
+        request = MagicMock(headers={"if-none-match": "*"})
+        self.assertEqual((await self.fetch(request=request)).status_code, 304)
+        self.load.assert_awaited_once()
+        self.load.side_effect = HTTPException(status_code=404, detail="Contact not found")
+        with self.assertRaises(HTTPException):
+            await self.fetch(params={"contact_id": 2}, request=request)
+
+    async def test_etag_changes_after_write(self):
+        etag = (await self.fetch()).headers["etag"]
+        self.db.scalar.return_value = 4
+        response = await self.fetch(request=MagicMock(headers={"if-none-match": etag}))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["etag"], etag)
+
+    async def test_disabled_route_gets_etag_but_is_not_cached(self):
+        await self.fetch(route="search_contacts")
+        response = await self.fetch(route="search_contacts")
+        self.assertIn("etag", response.headers)
+        self.assertEqual(self.load.await_count, 2)
+        self.redis.set.assert_not_awaited()
+
+    async def test_no_redis_still_answers_conditional_requests(self):
+        self.cache.redis = None
+        etag = (await self.fetch()).headers["etag"]
+        response = await self.fetch(request=MagicMock(headers={"if-none-match": etag}))
+        self.assertEqual(response.status_code, 304)
+        await self.fetch()
+        self.assertEqual(self.load.await_count, 2)
+
+    async def test_redis_errors_fall_back_to_load(self):
+        self.redis.get = AsyncMock(side_effect=RedisConnectionError())
+        response = await self.fetch()
+        self.assertEqual(json.loads(response.body)[0]["email"], "john@example.com")
+        self.assertEqual(self.cache.errors["read_contacts"], 1)
+        self.redis.set.assert_not_awaited()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from datetime import datetime
+
+from src.services.contacts_io import (
+    RowError,
+    parse_csv,
+    parse_ndjson,
+    validate_rows,
+    export_csv,
+    export_ndjson,
+    export_vcard,
+)
+from src.services.workers import BoundedExecutor, WorkerPoolBusy
+
+
+async def stream(data: bytes, size: int = 5):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def collect(rows):
+    return [row async for row in rows]
+
+
+class TestContactsIO(unittest.IsolatedAsyncioTestCase):
+
+    async def test_parse_csv(self):
+        data = ('﻿Name,Surname,Email,Phone,Birthday,Description\r\n'
+                'John,Doe,john@example.com,+380990000001,1990-01-02,"first line\nsecond, line"\r\n'
+                'Jane,Doe,jane@example.com,+380990000002,,\r\n').encode()
+        rows = await collect(parse_csv(stream(data)))
+        self.assertEqual(rows[0], (1, {"name": "John", "surname": "Doe", "email": "john@example.com",
+                                       "phone": "+380990000001", "birthday": "1990-01-02",
+                                       "description": "first line\nsecond, line"}))
+        self.assertEqual(rows[1], (2, {"name": "Jane", "surname": "Doe", "email": "jane@example.com",
+                                       "phone": "+380990000002"}))
+
+    async def test_parse_csv_bad_rows(self):
+        data = b'name,surname,email,phone\nJohn,Doe\nJane,Doe,jane@example.com,"+380\n'
+        rows = await collect(parse_csv(stream(data)))
+        self.assertIsInstance(rows[0][1], RowError)
+        self.assertEqual(str(rows[0][1]), "Expected 4 columns, got 2")
+        self.assertEqual(rows[1][0], 2)
+        self.assertEqual(str(rows[1][1]), "Unterminated quoted field")
+
+    async def test_parse_ndjson(self):
+        data = b'{"name": "John"}\n\nnot json\n[1, 2]\n{"name": "Jane"}'
+        rows = await collect(parse_ndjson(stream(data)))
+        self.assertEqual(rows[0], (1, {"name": "John"}))
+        self.assertTrue(str(rows[1][1]).startswith("Invalid JSON"))
+        self.assertEqual(str(rows[2][1]), "Expected a JSON object")
+        self.assertEqual(rows[3], (4, {"name": "Jane"}))
+
+    def test_validate_rows(self):
+        rows = [
+            (1, {"name": "John", "surname": "Doe", "email": "john@example.com", "phone": "+380990000001",
+                 "birthday": "1990-01-02"}),
+            (2, {"name": "Jane", "surname": "Doe", "email": "jane", "phone": "+380990000002"}),
+        ]
+        valid, errors = validate_rows(rows, user_id=1)
+        self.assertEqual(len(valid), 1)
+        self.assertEqual(valid[0][0], 1)
+        self.assertEqual(valid[0][1]["user_id"], 1)
+        self.assertEqual(valid[0][1]["birthday_key"], 102)
+        self.assertEqual(errors[0][0], 2)
+        self.assertTrue(errors[0][1].startswith("email:"))
+
+
+    async def test_exports(self):
+        async def batches():
+            yield [("John", "Doe, Jr", "john@example.com", "tel:+380-99-000-0001", datetime(1990, 1, 2), "a\nb")]
+            yield [("Jane", "Doe", "jane@example.com", "tel:+380-99-000-0002", None, None)]
+
+        csv_text = "".join(await collect(export_csv(batches())))
+        self.assertEqual(csv_text, 'name,surname,email,phone,birthday,description\r\n'
+                                   'John,"Doe, Jr",john@example.com,tel:+380-99-000-0001,1990-01-02,"a\nb"\r\n'
+                                   'Jane,Doe,jane@example.com,tel:+380-99-000-0002,,\r\n')
+        ndjson_lines = "".join(await collect(export_ndjson(batches()))).splitlines()
+        self.assertEqual(len(ndjson_lines), 2)
+        self.assertIn('"birthday": null', ndjson_lines[1])
+        vcard = "".join(await collect(export_vcard(batches())))
+        self.assertIn("N:Doe\\, Jr;John;;;\r\n", vcard)
+        self.assertIn("TEL:+380-99-000-0001\r\n", vcard)
+        self.assertIn("BDAY:1990-01-02\r\n", vcard)
+        self.assertIn("NOTE:a\\nb\r\n", vcard)
+        self.assertEqual(vcard.count("BEGIN:VCARD"), 2)
+
+
+class TestReservation(unittest.IsolatedAsyncioTestCase):
+
+    async def test_reserved_capacity_is_not_given_to_other_calls(self):
+        executor = BoundedExecutor("test-import", max_workers=2, max_pending=3)
+        self.addCleanup(executor.shutdown)
+        with executor.reserve(2) as workers:
+            self.assertEqual(await workers.run(sum, [1, 2]), 3)
+            self.assertEqual(await executor.run(sum, [3]), 3)
+            with self.assertRaises(WorkerPoolBusy):
+                executor.reserve(2).__enter__()
+            self.assertEqual(executor.snapshot()["reserved"], 2)
+        self.assertEqual(executor.snapshot()["reserved"], 0)
+        self.assertEqual(executor.rejected, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import asyncio
+import socket
+import unittest
+from importlib.util import find_spec
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from aiosmtplib import SMTPResponseException
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from src.services.email import EmailQueue, EmailWorker, Mailer, build_message, send_email
+
+JOB = {"id": "1", "to": "user@example.com", "subject": "Confirm your email ", "template": "email_template.html",
+       "context": {"host": "http://test/", "username": "user", "token": "abc"}, "attempts": 0}
+
+HAS_SMTP_STAND_IN = find_spec("aiosmtpd") is not None and find_spec("fakeredis") is not None
+
+
+class TestBuildMessage(unittest.TestCase):
+
+    def test_renders_template(self):
+        message = build_message(JOB)
+        self.assertEqual(message["To"], "user@example.com")
+        self.assertIn("http://test/api/auth/confirmed_email/abc", message.get_payload(decode=True).decode())
+
+
+class TestEmailQueue(unittest.TestCase):
+
+    def test_backoff_grows_and_is_capped(self):
+        queue = EmailQueue(backoff=10, max_backoff=100)
+        with patch("src.services.email.random.uniform", return_value=1):
+            self.assertEqual([queue.backoff_for(attempts) for attempts in (1, 2, 3, 5)], [10, 20, 40, 100])
+
+
+class TestEmailWorker(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.queue = MagicMock(complete=AsyncMock(), fail=AsyncMock(return_value=True))
+        self.mailer = MagicMock(send=AsyncMock())
+        self.worker = EmailWorker(self.queue, self.mailer)
+
+    async def test_sent_jobs_are_completed(self):
+        await self.worker.process([("1-0", JOB), ("2-0", JOB)])
+        self.assertEqual(self.mailer.send.await_count, 2)
+        self.assertEqual(self.queue.complete.await_count, 2)
+        self.assertEqual(self.worker.sent, 2)
+
+    async def test_transient_error_is_retried(self):
+        error = SMTPResponseException(451, "try again later")
+        self.mailer.send.side_effect = error
+        await self.worker.process([("1-0", JOB)])
+        self.queue.fail.assert_awaited_once_with("1-0", JOB, error, False)
+        self.assertEqual(self.worker.retried, 1)
+
+    async def test_permanent_error_is_dead_lettered(self):
+        self.mailer.send.side_effect = SMTPResponseException(550, "no such user")
+        self.queue.fail.return_value = False
+        await self.worker.process([("1-0", JOB)])
+        self.assertTrue(self.queue.fail.await_args.args[3])
+        self.assertEqual(self.worker.dead, 1)
+
+    async def test_invalid_job_is_dead_lettered(self):
+        await self.worker.process([("1-0", {**JOB, "template": "missing.html"})])
+        self.mailer.send.assert_not_awaited()
+        self.assertTrue(self.queue.fail.await_args.kwargs["permanent"])
+
+
+class TestSendEmail(unittest.IsolatedAsyncioTestCase):
+
+    async def test_enqueues_job(self):
+        with patch("src.services.email.email_queue") as queue:
+            queue.enqueue = AsyncMock()
+            self.assertTrue(await send_email("user@example.com", "user", "http://test/"))
+        job = queue.enqueue.await_args.kwargs
+        self.assertEqual(job["to"], "user@example.com")
+        self.assertEqual(job["context"]["host"], "http://test/")
+        self.assertIn("token", job["context"])
+
+    async def test_sends_directly_without_redis(self):
+        queue = EmailQueue()
+        mailer = MagicMock(send=AsyncMock(), close=AsyncMock())
+        with patch("src.services.email.email_queue", queue), \
+                patch("src.services.email.Mailer.from_settings", return_value=mailer):
+            self.assertTrue(await send_email("user@example.com", "user", "http://test/"))
+        mailer.send.assert_awaited_once()
+        mailer.close.assert_awaited_once()
+        self.assertEqual((await queue.stats())["direct_sent"], 1)
+
+    async def test_direct_send_failure_is_reported(self):
+        queue = EmailQueue(redis=MagicMock(xadd=AsyncMock(side_effect=RedisConnectionError())))
+        mailer = MagicMock(send=AsyncMock(side_effect=OSError("connection refused")), close=AsyncMock())
+        with patch("src.services.email.email_queue", queue), \
+                patch("src.services.email.Mailer.from_settings", return_value=mailer), \
+                self.assertLogs("src.services.email", level="WARNING") as logs:
+            self.assertFalse(await send_email("user@example.com", "user", "http://test/"))
+        self.assertEqual(queue.direct_failed, 1)
+        self.assertEqual([record.levelname for record in logs.records], ["WARNING", "ERROR"])
+        mailer.close.assert_awaited_once()
+
+
+@unittest.skipUnless(HAS_SMTP_STAND_IN, "aiosmtpd and fakeredis are required")
+class TestEmailQueueEndToEnd(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        from aiosmtpd.controller import Controller
+        from fakeredis import FakeAsyncRedis
+
+        class Handler:
+            def __init__(self):
+                self.messages = []
+                self.refuse = None
+
+            async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+                if self.refuse:
+                    return self.refuse
+                envelope.rcpt_tos.append(address)
+                return "250 OK"
+
+            async def handle_DATA(self, server, session, envelope):
+                self.messages.append(envelope)
+                return "250 OK"
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        self.handler = Handler()
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=port)
+        self.controller.start()
+        self.redis = FakeAsyncRedis(decode_responses=True)
+        self.queue = EmailQueue(self.redis, max_attempts=2, backoff=0, batch_size=10)
+        self.mailer = Mailer("127.0.0.1", self.controller.port, size=2)
+        self.worker = EmailWorker(self.queue, self.mailer)
+        await self.queue.ensure_group()
+
+    async def asyncTearDown(self):
+        await self.mailer.close()
+        self.controller.stop()
+        await self.redis.aclose()
+
+    async def enqueue(self, count: int) -> None:
+        for i in range(count):
+            await self.queue.enqueue(f"user{i}@example.com", "Hi", "email_template.html", JOB["context"])
+
+    async def test_sends_batch_over_reused_connections(self):
+        await self.enqueue(5)
+        await self.worker.process(await self.queue.read_batch("worker", block=10))
+        self.assertEqual(len(self.handler.messages), 5)
+        self.assertLessEqual(self.mailer.connects, 2)
+        self.assertEqual(await self.queue.stats(),
+                         {"enabled": True, "queued": 0, "in_progress": 0, "retrying": 0, "dead": 0,
+                          "direct_sent": 0, "direct_failed": 0})
+
+    async def test_retries_then_dead_letters(self):
+        self.handler.refuse = "451 try again later"
+        await self.enqueue(1)
+        await self.worker.process(await self.queue.read_batch("worker", block=10))
+        self.assertEqual((await self.queue.stats())["retrying"], 1)
+        await asyncio.sleep(0.01)
+        self.assertEqual(await self.queue.promote_due(), 1)
+        await self.worker.process(await self.queue.read_batch("worker", block=10))
+        stats = await self.queue.stats()
+        self.assertEqual((stats["retrying"], stats["dead"]), (0, 1))
+
+    async def test_refused_recipient_is_dead_lettered_at_once(self):
+        self.handler.refuse = "550 no such user"
+        await self.enqueue(1)
+        await self.worker.process(await self.queue.read_batch("worker", block=10))
+        stats = await self.queue.stats()
+        self.assertEqual((stats["retrying"], stats["dead"]), (0, 1))
+
+    async def test_abandoned_jobs_are_claimed(self):
+        self.queue.claim_idle = 0
+        await self.enqueue(1)
+        self.assertEqual(len(await self.queue.read_batch("crashed", block=10)), 1)
+        batch = await self.queue.read_batch("worker", block=10)
+        self.assertEqual(len(batch), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
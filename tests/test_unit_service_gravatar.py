@@ -0,0 +1,134 @@
+import asyncio
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, User
+from src.services.avatars import LocalStorage
+from src.services.gravatar import GravatarResolver, gravatar_hash
+from src.services.workers import BoundedExecutor
+
+PLACEHOLDER = "/placeholder.svg"
+
+
+def jpeg() -> bytes:
+    out = BytesIO()
+    Image.new("RGB", (256, 256), "blue").save(out, "JPEG")
+    return out.getvalue()
+
+
+class TestGravatarHash(unittest.TestCase):
+
+    def test_hash_of_normalized_email(self):
+        self.assertEqual(gravatar_hash(" MyEmailAddress@example.com "), "0bc83cb571cd1c50ba6f3e8a78ef1346")
+
+
+class TestGravatarResolver(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with self.sessions() as db:
+            db.add_all([
+                User(id=1, username="a", email="known@example.com", password="x", avatar=PLACEHOLDER),
+                User(id=2, username="b", email="unknown@example.com", password="x", avatar=PLACEHOLDER),
+                User(id=3, username="c", email="changed@example.com", password="x", avatar="/custom.webp"),
+            ])
+            await db.commit()
+        self.existing = {gravatar_hash("known@example.com"), gravatar_hash("changed@example.com")}
+        self.requests = []
+        self.tmp = tempfile.TemporaryDirectory()
+        self.executor = BoundedExecutor("test-gravatar", max_workers=1, max_pending=16)
+        self.storage = LocalStorage(self.tmp.name, "/api/users/avatars", self.executor, self.executor,
+                                    sizes=(64, 256), default_size=256)
+        self.resolver = GravatarResolver(PLACEHOLDER, self.storage, interval=0.01, session_factory=self.sessions)
+        self.resolver.client = httpx.AsyncClient(transport=httpx.MockTransport(self.gravatar))
+        invalidate = patch("src.services.gravatar.user_cache.invalidate", new_callable=AsyncMock)
+        self.invalidate = invalidate.start()
+        self.addCleanup(invalidate.stop)
+
+    async def asyncTearDown(self):
+        await self.resolver.stop()
+        await self.engine.dispose()
+        self.executor.shutdown()
+        self.tmp.cleanup()
+
+    def gravatar(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        email_hash = request.url.path.rsplit("/", 1)[-1]
+        if email_hash not in self.existing:
+            return httpx.Response(404)
+        return httpx.Response(200, content=jpeg(), headers={"content-type": "image/jpeg"})
+
+    async def avatars(self) -> dict:
+        async with self.sessions() as db:
+            return dict((await db.execute(select(User.id, User.avatar))).all())
+
+    async def test_resolve_stores_found_gravatars_locally(self):
+        found = await self.resolver.resolve([(1, "known@example.com"), (2, "unknown@example.com"),
+                                             (3, "changed@example.com")])
+        avatars = await self.avatars()
+        self.assertEqual(found, 2)
+        self.assertRegex(avatars[1], r"^/api/users/avatars/[0-9a-f]{32}_256\.webp$")
+        self.assertTrue((Path(self.tmp.name) / avatars[1].rsplit("/", 1)[-1]).exists())
+        self.assertEqual(avatars[2], PLACEHOLDER)
+        self.assertEqual(avatars[3], "/custom.webp")
+        self.assertEqual(self.requests[0].method, "GET")
+        self.assertEqual(self.requests[0].url.params["d"], "404")
+        self.assertEqual(self.requests[0].url.params["s"], "256")
+        self.invalidate.assert_any_await("known@example.com")
+
+    async def test_invalid_images_are_not_stored(self):
+        self.resolver.client = httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, content=b"not an image", headers={"content-type": "image/png"})))
+        self.assertEqual(await self.resolver.resolve([(1, "known@example.com")]), 0)
+        self.assertEqual(self.resolver.snapshot()["errors"], 1)
+        self.assertEqual((await self.avatars())[1], PLACEHOLDER)
+        self.assertEqual(list(Path(self.tmp.name).iterdir()), [])
+
+    async def test_invalidates_user_cache_with_stored_email(self):
+        async with self.sessions() as db:
+            db.add(User(id=4, username="d", email="Known@Example.com", password="x", avatar=PLACEHOLDER))
+            await db.commit()
+        self.existing.add(gravatar_hash("Known@Example.com"))
+        self.assertEqual(await self.resolver.resolve([(4, "Known@Example.com")]), 1)
+        self.invalidate.assert_awaited_once_with("Known@Example.com")
+
+    async def test_answers_are_cached_by_hash(self):
+        await self.resolver.resolve([(1, "known@example.com"), (2, "unknown@example.com")])
+        await self.resolver.resolve([(1, "known@example.com"), (2, "unknown@example.com")])
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.resolver.snapshot()["lookups"], 2)
+
+    async def test_errors_are_not_cached(self):
+        self.resolver.client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(503)))
+        self.assertEqual(await self.resolver.resolve([(1, "known@example.com")]), 0)
+        self.assertEqual(self.resolver.snapshot()["errors"], 1)
+        self.resolver.client = httpx.AsyncClient(transport=httpx.MockTransport(self.gravatar))
+        self.assertEqual(await self.resolver.resolve([(1, "known@example.com")]), 1)
+
+    async def test_submit_never_blocks(self):
+        resolver = GravatarResolver(PLACEHOLDER, self.storage, queue_size=1)
+        resolver.submit(1, "known@example.com")
+        resolver.submit(2, "unknown@example.com")
+        self.assertEqual(resolver.snapshot()["queued"], 1)
+        self.assertEqual(resolver.snapshot()["dropped"], 1)
+
+    async def test_background_run_batches_and_backfills(self):
+        self.resolver.start()
+        for _ in range(100):
+            if self.resolver.resolved:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.resolver.snapshot()["resolved"], 2)
+        self.assertRegex((await self.avatars())[1], r"^/api/users/avatars/[0-9a-f]{32}_256\.webp$")
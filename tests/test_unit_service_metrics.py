@@ -0,0 +1,107 @@
+import unittest
+from importlib.util import find_spec
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from redis.asyncio import ConnectionPool
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.services.metrics import Histogram, HttpMetrics, MetricsMiddleware, family, label
+from src.services.redis_pool import InstrumentedRedis
+
+
+class TestExposition(unittest.TestCase):
+
+    def test_histogram_expose(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        self.assertEqual(histogram.expose("latency", 'route="/"'), [
+            'latency_bucket{route="/",le="0.1"} 1',
+            'latency_bucket{route="/",le="1.0"} 2',
+            'latency_bucket{route="/",le="+Inf"} 3',
+            'latency_sum{route="/"} 5.55',
+            'latency_count{route="/"} 3',
+        ])
+
+    def test_family(self):
+        self.assertEqual(family("up", "gauge", "Up.", [("", 1), ('job="a"', 0)]),
+                         ["# HELP up Up.", "# TYPE up gauge", "up 1", 'up{job="a"} 0'])
+
+    def test_label_escaping(self):
+        self.assertEqual(label('a"b\\c\nd'), 'a\\"b\\\\c\\nd')
+
+
+class TestHttpMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = HttpMetrics()
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        self.metrics.attach(self.engine.sync_engine)
+        app = FastAPI()
+
+        @app.get("/items/{item_id}")
+        async def read_item(item_id: int):
+            async with self.engine.connect() as conn:
+                await conn.execute(text("select 1"))
+                await conn.execute(text("select 2"))
+            if item_id == 0:
+                raise HTTPException(status_code=404)
+            return {"in_flight": self.metrics.in_flight, "route_in_flight": route.in_flight}
+
+        app.add_middleware(MetricsMiddleware, metrics=self.metrics)
+        self.metrics.register(app.routes)
+        route = self.route = next(m for m in self.metrics.routes if 'route="/items/{item_id}"' in m.labels)
+        self.client = TestClient(app)
+
+    def test_records_templated_route(self):
+        response = self.client.get("/items/1")
+        self.assertEqual(response.json(), {"in_flight": 1, "route_in_flight": 1})
+        self.client.get("/items/0")
+        self.client.get("/missing")
+        self.assertEqual(self.route.labels, 'method="GET",route="/items/{item_id}"')
+        self.assertEqual(self.route.latency.count, 2)
+        self.assertEqual(self.route.responses, [0, 1, 0, 1, 0])
+        self.assertEqual(self.route.in_flight, 0)
+        self.assertEqual(self.metrics.unmatched.responses, [0, 0, 0, 1, 0])
+        self.assertEqual(self.metrics.in_flight, 0)
+
+    def test_counts_queries_per_route(self):
+        self.client.get("/items/1")
+        self.assertEqual(self.route.db_queries, 2)
+        self.assertGreater(self.route.db_seconds, 0)
+        self.assertEqual(self.metrics.db_latency.count, 2)
+        self.assertEqual(self.metrics.unmatched.db_queries, 0)
+
+    def test_expose(self):
+        self.client.get("/items/1")
+        lines = self.metrics.expose()
+        self.assertIn('http_responses_total{method="GET",route="/items/{item_id}",status="2xx"} 1', lines)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/items/{item_id}"} 1', lines)
+        self.assertIn('http_db_queries_total{method="GET",route="/items/{item_id}"} 2', lines)
+        self.assertIn("# TYPE db_query_duration_seconds histogram", lines)
+
+
+@unittest.skipUnless(find_spec("fakeredis") is not None, "fakeredis is required")
+class TestInstrumentedRedis(unittest.IsolatedAsyncioTestCase):
+
+    async def test_counts_commands(self):
+        from fakeredis import FakeServer
+        from fakeredis.aioredis import FakeAsyncRedisConnection
+
+        pool = ConnectionPool(connection_class=FakeAsyncRedisConnection, server=FakeServer(), decode_responses=True)
+        redis = InstrumentedRedis(connection_pool=pool)
+        await redis.set("key", "1")
+        await redis.get("key")
+        async with redis.pipeline() as pipe:
+            pipe.incr("key")
+            pipe.incr("key")
+            await pipe.execute()
+        with self.assertRaises(RedisError):
+            await redis.lpush("key", "x")
+        self.assertEqual(redis.calls, {"SET": 1, "GET": 1, "PIPELINE": 1, "LPUSH": 1})
+        self.assertEqual(redis.errors, 1)
+        await redis.aclose()
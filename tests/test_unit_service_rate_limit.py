@@ -0,0 +1,149 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from src.database.models import User
+from src.services.rate_limit import Limit, RateLimiter, RateLimitResult, parse_limit
+
+PLANS = {
+    "free": {"read": "10/minute", "write": "5/minute"},
+    "pro": {"read": "100/minute"},
+}
+
+
+class TestParseLimit(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(parse_limit("10/minute"), Limit(10, 60))
+        self.assertEqual(parse_limit("2 / hour"), Limit(2, 3600))
+
+    def test_invalid(self):
+        for value in ("10", "ten/minute", "0/minute", "10/week"):
+            with self.assertRaises(ValueError):
+                parse_limit(value)
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.script = AsyncMock(return_value=[1, 9, 0, 6000])
+        self.redis = MagicMock()
+        self.redis.register_script.return_value = self.script
+        self.limiter = RateLimiter(PLANS, "free", redis=self.redis)
+        self.user = User(id=1, plan="free")
+
+    def test_limit_for_plan(self):
+        self.assertEqual(self.limiter.limit_for("read", "pro"), Limit(100, 60))
+        self.assertEqual(self.limiter.limit_for("write", "pro"), Limit(5, 60))
+        self.assertEqual(self.limiter.limit_for("read", "unknown"), Limit(10, 60))
+        self.assertEqual(self.limiter.limit_for("read", None), Limit(10, 60))
+
+    async def test_allowed(self):
+        result = await self.limiter.check("read", self.user)
+        self.assertTrue(result.allowed)
+        self.assertEqual(result.remaining, 9)
+        self.script.assert_awaited_once_with(keys=["rate_limit:read:1"], args=[6000, 10])
+        self.assertEqual(result.headers["RateLimit-Limit"], "10")
+        self.assertEqual(result.headers["RateLimit-Reset"], "6")
+        self.assertNotIn("Retry-After", result.headers)
+
+    async def test_rejection_is_cached_locally(self):
+        self.script.return_value = [0, 0, 2500, 60000]
+        result = await self.limiter.check("read", self.user)
+        self.assertFalse(result.allowed)
+        self.assertEqual(result.headers["Retry-After"], "3")
+        result = await self.limiter.check("read", self.user)
+        self.assertFalse(result.allowed)
+        self.script.assert_awaited_once()
+        self.assertEqual(self.limiter.snapshot()["rules"]["read"]["rejected_locally"], 1)
+
+    async def test_expose(self):
+        self.script.return_value = [0, 0, 2500, 60000]
+        await self.limiter.check("read", self.user)
+        await self.limiter.check("read", self.user)
+        lines = self.limiter.expose()
+        self.assertIn('rate_limit_decisions_total{rule="read",result="rejected"} 2', lines)
+        self.assertIn('rate_limit_decisions_total{rule="read",result="allowed"} 0', lines)
+        self.assertIn('rate_limit_rejected_locally_total{rule="read"} 1', lines)
+        self.assertIn("rate_limit_circuit_open 0", lines)
+
+    async def test_without_redis_local_buckets(self):
+        self.limiter.redis = None
+        results = [await self.limiter.check("write", self.user) for _ in range(6)]
+        self.assertEqual([result.allowed for result in results], [True] * 5 + [False])
+        self.assertEqual(results[0].remaining, 4)
+        self.assertEqual(results[-1].headers["Retry-After"], "12")
+        self.assertEqual(self.limiter.pending, {})
+
+    async def test_local_buckets_share_limit_between_workers(self):
+        limiter = RateLimiter(PLANS, "free", workers=4)
+        results = [await limiter.check("read", self.user) for _ in range(3)]
+        self.assertEqual([result.allowed for result in results], [True, True, False])
+
+    async def test_redis_error_opens_circuit(self):
+        self.script.side_effect = RedisConnectionError()
+        result = await self.limiter.check("read", self.user)
+        self.assertTrue(result.allowed)
+        self.assertEqual(self.limiter.errors["read"], 1)
+        self.assertTrue(self.limiter.circuit_open)
+        await self.limiter.check("read", self.user)
+        self.script.assert_awaited_once()
+        self.assertEqual(self.limiter.decided_locally["read"], 2)
+
+    async def test_slow_redis_opens_circuit(self):
+        async def slow(**kwargs):
+            await asyncio.sleep(1)
+
+        self.script.side_effect = slow
+        self.limiter.timeout = 0.01
+        result = await self.limiter.check("read", self.user)
+        self.assertTrue(result.allowed)
+        self.assertTrue(self.limiter.circuit_open)
+
+    async def test_circuit_closes_after_cooldown(self):
+        self.script.side_effect = RedisConnectionError()
+        with patch("src.services.rate_limit.time.monotonic", return_value=100):
+            await self.limiter.check("read", self.user)
+        self.script.side_effect = None
+        with patch("src.services.rate_limit.time.monotonic", return_value=106):
+            result = await self.limiter.check("read", self.user)
+        self.assertEqual(result.remaining, 9)
+        self.assertEqual(self.script.await_count, 2)
+
+    async def test_reconcile_counts_local_requests_in_redis(self):
+        self.limiter.trip()
+        for _ in range(3):
+            await self.limiter.check("read", self.user)
+        self.assertEqual(await self.limiter.reconcile(), 0)
+        self.limiter.open_until = 0
+        self.assertEqual(await self.limiter.reconcile(), 3)
+        self.script.assert_awaited_once_with(keys=["rate_limit:read:1"], args=[6000, 10, 3, 1])
+        self.assertEqual(self.limiter.pending, {})
+
+    async def test_reconcile_keeps_pending_on_error(self):
+        self.limiter.trip()
+        await self.limiter.check("read", self.user)
+        self.limiter.open_until = 0
+        self.script.side_effect = RedisConnectionError()
+        self.assertEqual(await self.limiter.reconcile(), 0)
+        self.assertEqual(self.limiter.snapshot()["pending_reconciliation"], 1)
+        self.assertTrue(self.limiter.circuit_open)
+
+
+class TestRateLimitResult(unittest.TestCase):
+
+    def test_headers(self):
+        result = RateLimitResult(False, Limit(5, 60), 0, 11.2, 0.1)
+        self.assertEqual(result.headers, {
+            "RateLimit-Limit": "5",
+            "RateLimit-Remaining": "0",
+            "RateLimit-Reset": "12",
+            "RateLimit-Policy": "5;w=60",
+            "Retry-After": "1",
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()